@@ -1,19 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, WebSocket, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from starlette.requests import ClientDisconnect
 from contextlib import contextmanager
 from contextlib import asynccontextmanager
+import asyncio
 import time
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, Iterable, List, Optional, Union
 
 from ..config.settings import settings
 from ..models.schemas import (
-    DetectionMethod, MLDetectionResponse, SensorData, DetectionResponse, HealthResponse, ErrorResponse
+    BatchDetectionResponse, BatchMLDetectionResponse, CombinedDetectionResponse, DetectionMethod, MLDetectionResponse, SensorData, DetectionResponse, HealthResponse, ErrorResponse
 )
 from ..services.anomaly_service import anomaly_service
 from ..utils.logging import setup_logging, get_logger
+from ..utils.redis_pool import pool_stats
 
 # Setup logging
 setup_logging()
@@ -31,6 +36,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down anomaly detection API")
+    await anomaly_service.ashutdown()
 
 # Create FastAPI app
 app = FastAPI(
@@ -67,7 +73,7 @@ def global_exception_handler(request, exc):
     )
 
 @app.get("/health", tags=["Health"])
-def health_check():
+async def health_check():
     """Health check endpoint."""
     try:
         system_health = anomaly_service.get_system_health()
@@ -85,14 +91,18 @@ def health_check():
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 @app.post("/detect/heuristic", response_model=DetectionResponse, tags=["Detection"])
-def detect_heuristic_anomalies(sensor_data: SensorData):
+async def detect_heuristic_anomalies(sensor_data: SensorData, deferred: bool = False):
     """
     Detect anomalies using heuristic method only.
+    With `deferred`, alarms are returned before their LLM context; fetch it from /results/{result_id}.
     """
     try:
         logger.info("Processing heuristic detection request", timestamp=sensor_data.timestamp)
         
-        heuristic_result = anomaly_service.detect_heuristic_anomalies(sensor_data)
+        if deferred:
+            heuristic_result = await anomaly_service.adetect_heuristic_deferred(sensor_data)
+        else:
+            heuristic_result = await anomaly_service.adetect_heuristic_anomalies(sensor_data)
         
         logger.info("Heuristic detection completed", 
                    processing_time=heuristic_result.processing_time_ms)
@@ -103,15 +113,38 @@ def detect_heuristic_anomalies(sensor_data: SensorData):
         logger.error("Heuristic detection failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Heuristic detection failed: {str(e)}")
 
+@app.post("/detect/heuristic/batch", response_model=BatchDetectionResponse, tags=["Detection"])
+async def detect_heuristic_batch(records: List[SensorData]):
+    """
+    Detect anomalies in a batch of records using heuristic method only.
+    """
+    try:
+        logger.info("Processing heuristic batch detection request", records=len(records))
+
+        batch_result = await anomaly_service.adetect_heuristic_batch(records)
+
+        logger.info("Heuristic batch detection completed",
+                   processing_time=batch_result.processing_time_ms)
+
+        return batch_result
+
+    except Exception as e:
+        logger.error("Heuristic batch detection failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Heuristic batch detection failed: {str(e)}")
+
 @app.post("/detect/statistical", response_model=DetectionResponse, tags=["Detection"])
-def detect_statistical_anomalies(sensor_data: SensorData):
+async def detect_statistical_anomalies(sensor_data: SensorData, deferred: bool = False):
     """
     Detect anomalies using statistical method only.
+    With `deferred`, alarms are returned before their LLM context; fetch it from /results/{result_id}.
     """
     try:
         logger.info("Processing statistical detection request", timestamp=sensor_data.timestamp)
         
-        statistical_result = anomaly_service.detect_statistical_anomalies(sensor_data)
+        if deferred:
+            statistical_result = await anomaly_service.adetect_statistical_deferred(sensor_data)
+        else:
+            statistical_result = await anomaly_service.adetect_statistical_anomalies(sensor_data)
         
         logger.info("Statistical detection completed", 
                    processing_time=statistical_result.processing_time_ms)
@@ -123,14 +156,14 @@ def detect_statistical_anomalies(sensor_data: SensorData):
         raise HTTPException(status_code=500, detail=f"Statistical detection failed: {str(e)}")
     
 @app.post("/detect/ml", response_model=MLDetectionResponse, tags=["Detection"])
-def detect_ml_anomalies(sensor_data: SensorData) -> MLDetectionResponse:
+async def detect_ml_anomalies(sensor_data: SensorData) -> MLDetectionResponse:
 
     """Run only ML detection."""
     
     try:
         logger.info("Processing ML detection request", timestamp=sensor_data.timestamp)
         
-        result = anomaly_service.detect_ml_anomalies(sensor_data)
+        result = await anomaly_service.adetect_ml_anomalies(sensor_data)
         
         logger.info("ML detection completed", 
                    processing_time=result.processing_time_ms)
@@ -140,20 +173,313 @@ def detect_ml_anomalies(sensor_data: SensorData) -> MLDetectionResponse:
     except Exception as e:
         logger.error("ML detection failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"ML detection failed: {str(e)}")
+@app.post("/detect/ml/batch", response_model=BatchMLDetectionResponse, tags=["Detection"])
+async def detect_ml_batch(records: List[SensorData]):
+    """
+    Detect anomalies in a batch of records using ML method only.
+    Each record reports its status, reconstruction error and the model threshold.
+    """
+    try:
+        logger.info("Processing ML batch detection request", records=len(records))
+
+        batch_result = await anomaly_service.adetect_ml_batch(records)
+
+        logger.info("ML batch detection completed",
+                   processing_time=batch_result.processing_time_ms)
 
+        return batch_result
 
+    except Exception as e:
+        logger.error("ML batch detection failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"ML batch detection failed: {str(e)}")
+
+
+@app.post("/detect/all", response_model=CombinedDetectionResponse, tags=["Detection"])
+async def detect_all_anomalies(sensor_data: SensorData):
+    """
+    Detect anomalies with the heuristic, statistical and ML methods concurrently.
+    Each method reports its own processing time; alarms raised by both the heuristic and the
+    statistical method share their LLM context.
+    """
+    try:
+        logger.info("Processing combined detection request", timestamp=sensor_data.timestamp)
+
+        result = await anomaly_service.adetect_all_anomalies(sensor_data)
+
+        logger.info("Combined detection completed",
+                   processing_time=result.processing_time_ms,
+                   heuristic_time=result.heuristic.processing_time_ms,
+                   statistical_time=result.statistical.processing_time_ms,
+                   ml_time=result.ml.processing_time_ms)
+
+        return result
+
+    except Exception as e:
+        logger.error("Combined detection failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Combined detection failed: {str(e)}")
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Streams results while the request body is still being read. StreamingResponse listens for
+    the client disconnecting on the request's receive channel, which would swallow the body.
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+_RECORDS = TypeAdapter(List[SensorData])
+_MAX_LINE_BYTES = 1 << 20
+
+async def _iterate(records: Iterable[SensorData]) -> AsyncIterator[SensorData]:
+    for record in records:
+        yield record
+
+async def _ndjson_records(request: Request, errors: List[str]) -> AsyncIterator[SensorData]:
+    """Records of an NDJSON body as its chunks arrive; stops at the first invalid line, noted in `errors`"""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        if not chunk and buffer:
+            # End of the body: the last line has no newline
+            lines.append(buffer)
+            buffer = b""
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                yield SensorData.model_validate_json(line)
+            except ValidationError as e:
+                errors.append(f"Invalid record on line {line_number}: {e}")
+                return
+        if len(buffer) > _MAX_LINE_BYTES:
+            errors.append(f"Line {line_number + 1} is longer than {_MAX_LINE_BYTES} bytes")
+            return
+
+@app.post("/detect/all/batch", response_class=NDJSONResponse, tags=["Detection"])
+async def detect_all_batch(request: Request):
+    """
+    Detect anomalies in many records with the heuristic, statistical and ML methods.
+    The body is a JSON array of records or, as application/x-ndjson, one record per line, which may
+    be streamed in chunks. Records are evaluated in timestamp order, the statistical windows advancing
+    record by record, and one combined response per record is streamed back as NDJSON as each batch
+    completes, while the upload is still being read: clients must read the response as they send.
+    An invalid NDJSON line ends the upload with an error line after the preceding results.
+    """
+    content_type = request.headers.get("content-type", "")
+    errors: List[str] = []
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = _ndjson_records(request, errors)
+    else:
+        try:
+            batch = _RECORDS.validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        records = _iterate(sorted(batch, key=lambda record: record.timestamp.timestamp()))
+
+    logger.info("Processing batch ingest request", content_type=content_type)
+
+    async def stream_results() -> AsyncIterator[str]:
+        start_time = time.time()
+        count = 0
+        try:
+            async for result in anomaly_service.aingest(records):
+                count += 1
+                yield result.model_dump_json() + "\n"
+        except ClientDisconnect:
+            logger.warning("Batch ingest client disconnected", records=count)
+            return
+        except Exception as e:
+            logger.error("Batch ingest failed", error=str(e), records=count)
+            errors.append(f"Batch ingest failed: {str(e)}")
+        for error in errors:
+            yield ErrorResponse(error="Batch ingest stopped", detail=error, timestamp=datetime.now()).model_dump_json() + "\n"
+        logger.info("Batch ingest completed", records=count, errors=len(errors),
+                   processing_time=(time.time() - start_time) * 1000)
+
+    return NDJSONResponse(stream_results())
+
+_stream_stats = {"connections": 0, "active": 0, "records": 0, "invalid": 0, "backpressured": 0}
+
+async def _enqueue(queue: asyncio.Queue, item, worker: asyncio.Future) -> bool:
+    """Queue `item`, waiting while the queue is full; False if `worker` stopped consuming"""
+    if worker.done():
+        return False
+    if not queue.full():
+        queue.put_nowait(item)
+        return True
+    _stream_stats["backpressured"] += 1
+    put = asyncio.ensure_future(queue.put(item))
+    await asyncio.wait([put, worker], return_when=asyncio.FIRST_COMPLETED)
+    if put.done():
+        return True
+    put.cancel()
+    return False
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket):
+    """
+    Detection channel for continuous feeds. Send SensorData frames (JSON); each is answered, in order,
+    by a frame with its combined heuristic, statistical and ML result, or an ErrorResponse for an
+    invalid frame. Records arriving faster than they are evaluated are evaluated together; once
+    ws_queue_size are waiting the server stops reading frames until it catches up, which pushes
+    back on the sender through the connection.
+    """
+    await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_queue_size)
+    _stream_stats["connections"] += 1
+    _stream_stats["active"] += 1
+    logger.info("Detection stream opened", client=str(websocket.client))
+
+    async def evaluate() -> None:
+        connected = True
+        while True:
+            batch: List[Union[SensorData, ErrorResponse, None]] = [await queue.get()]
+            while len(batch) < settings.ingest_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            records = [item for item in batch if isinstance(item, SensorData)]
+            try:
+                results = iter(await anomaly_service.adetect_all_batch(records) if records else [])
+            except Exception as e:
+                # The batch is answered with errors and the stream goes on with the next records
+                logger.error("Detection stream batch failed", records=len(records), error=str(e))
+                failure = ErrorResponse(error="Detection failed", detail=str(e), timestamp=datetime.now())
+                results = iter([failure] * len(records))
+            for item in batch:
+                if item is None:
+                    return
+                response = next(results) if isinstance(item, SensorData) else item
+                if connected:
+                    try:
+                        await websocket.send_text(response.model_dump_json())
+                    except Exception:
+                        # Records already received are still evaluated, keeping the windows complete
+                        connected = False
+
+    worker = asyncio.ensure_future(evaluate())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                item = SensorData.model_validate_json(message.get("text") or message.get("bytes") or b"")
+                _stream_stats["records"] += 1
+            except ValidationError as e:
+                item = ErrorResponse(error="Invalid record", detail=str(e), timestamp=datetime.now())
+                _stream_stats["invalid"] += 1
+            if not await _enqueue(queue, item, worker):
+                break
+    except Exception as e:
+        logger.error("Detection stream failed", error=str(e))
+    finally:
+        await _enqueue(queue, None, worker)
+        try:
+            await worker
+        except Exception as e:
+            logger.error("Detection stream evaluation failed", error=str(e))
+            try:
+                await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            except Exception:
+                pass
+        _stream_stats["active"] -= 1
+        logger.info("Detection stream closed", client=str(websocket.client))
+
+@app.get("/results/{result_id}", response_model=DetectionResponse, tags=["Detection"])
+async def get_detection_result(result_id: str, wait: float = 0):
+    """
+    Get a deferred detection by its result_id.
+    `wait` long-polls up to that many seconds (at most 30) while its enrichment is pending.
+    """
+    try:
+        result = await anomaly_service.aget_result(result_id, min(max(wait, 0), 30))
+    except Exception as e:
+        logger.error("Failed to get detection result", result_id=result_id, error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to get detection result: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Result {result_id} not found or expired")
+    return result
+
+@app.post("/admin/reload", tags=["Admin"])
+async def reload_configuration(source: Optional[str] = None, force: bool = False):
+    """
+    Reload thresholds.json, alarm_context.json and/or the ML artifacts without a restart.
+    `source` is one of thresholds, alarm_context, ml or summary_catalog (all by default); `force` reloads unchanged files.
+    """
+    try:
+        # Detectors are rebuilt in a worker thread; requests keep being served meanwhile
+        result = await asyncio.to_thread(
+            anomaly_service.reload_configuration, [source] if source else None, force
+        )
+        logger.info("Configuration reload requested", source=source, outcomes=result["outcomes"])
+        return result
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Configuration reload failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Configuration reload failed: {str(e)}")
+
+@app.get("/admin/models", tags=["Admin"])
+async def list_ml_models():
+    """List the published ML model versions and the active one."""
+    try:
+        return await asyncio.to_thread(anomaly_service.list_ml_models)
+    except Exception as e:
+        logger.error("Failed to list ML models", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to list ML models: {str(e)}")
+
+@app.post("/admin/models/rollback", tags=["Admin"])
+async def rollback_ml_model():
+    """Reactivate the previously active ML model version."""
+    try:
+        result = await asyncio.to_thread(anomaly_service.rollback_ml_model)
+        logger.info("ML model rolled back", outcomes=result["outcomes"])
+        return result
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("ML model rollback failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"ML model rollback failed: {str(e)}")
+
+@app.post("/admin/models/{version}/promote", tags=["Admin"])
+async def promote_ml_model(version: str):
+    """Make a published ML model version the active one, without a restart."""
+    try:
+        result = await asyncio.to_thread(anomaly_service.promote_ml_model, version)
+        logger.info("ML model promoted", version=version, outcomes=result["outcomes"])
+        return result
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("ML model promotion failed", version=version, error=str(e))
+        raise HTTPException(status_code=500, detail=f"ML model promotion failed: {str(e)}")
 
 @app.get("/stats", tags=["Monitoring"])
-def get_statistics():
+async def get_statistics():
     """Get system statistics and performance metrics."""
     try:
         system_health = anomaly_service.get_system_health()
         return {
             "system_health": system_health,
+            "redis_pools": pool_stats(),
+            "llm_cache": anomaly_service.get_llm_cache_stats(),
+            "llm_gateway": anomaly_service.get_llm_gateway_stats(),
+            "detection_streams": _stream_stats,
             "config": {
                 "window_size": settings.statistical_window_size,
                 "min_data_points": 4,
-                "redis_prefix": settings.redis_key_prefix
+                "redis_prefix": settings.redis_key_prefix,
+                "redis_max_connections": settings.redis_max_connections,
+                "redis_ssl": settings.redis_ssl
             }
         }
     except Exception as e:
@@ -2,6 +2,7 @@ import requests
 import time
 import json
 from datetime import datetime, timezone
+from websockets.sync.client import connect
 
 # Values to test
 values = [
@@ -24,9 +25,14 @@ values = [
 # Choose what to test: "heuristic", "statistical", "ml", "all", or any combination
 # Options: "heuristic", "statistical", "ml", "all", 
 #          "heuristic,statistical", "heuristic,ml", "statistical,ml"
+#          "stream": all three methods over one WebSocket connection (/ws/detect)
 TEST_MODE = "all"
 
 BASE_URL = "http://localhost:8000/detect"
+STREAM_URL = "ws://localhost:8000/ws/detect"
+
+# One keep-alive connection for all requests
+session = requests.Session()
 
 def parse_test_modes(test_mode: str) -> list:
     """Parse TEST_MODE string and return list of methods to test."""
@@ -51,7 +57,7 @@ def send_request(i: int, v: dict):
     # Test Heuristic
     if "heuristic" in methods_to_test:
         try:
-            r_heur = requests.post(f"{BASE_URL}/heuristic", json=payload)
+            r_heur = session.post(f"{BASE_URL}/heuristic", json=payload)
             r_heur.raise_for_status()
             print("🔍 Heuristic result:")
             print(json.dumps(r_heur.json(), indent=2, ensure_ascii=False))
@@ -61,7 +67,7 @@ def send_request(i: int, v: dict):
     # Test Statistical
     if "statistical" in methods_to_test:
         try:
-            r_stat = requests.post(f"{BASE_URL}/statistical", json=payload)
+            r_stat = session.post(f"{BASE_URL}/statistical", json=payload)
             r_stat.raise_for_status()
             print("📊 Statistical result:")
             print(json.dumps(r_stat.json(), indent=2, ensure_ascii=False))
@@ -71,18 +77,33 @@ def send_request(i: int, v: dict):
     # Test ML
     if "ml" in methods_to_test:
         try:
-            r_ml = requests.post(f"{BASE_URL}/ml", json=payload)
+            r_ml = session.post(f"{BASE_URL}/ml", json=payload)
             r_ml.raise_for_status()
             print("🤖 ML result:")
             print(json.dumps(r_ml.json(), indent=2, ensure_ascii=False))
         except Exception as e:
             print(f"❌ ML request failed: {e}")
 
+def stream_records(records: list, interval: float):
+    """Send records over one WebSocket connection; each is answered with its combined result."""
+    with connect(STREAM_URL) as websocket:
+        for i, v in enumerate(records, 1):
+            payload = {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "data": v,
+            }
+            print(f"\n=== Streaming record #{i}: {v} ===")
+            websocket.send(json.dumps(payload))
+            print("📡 Combined result:")
+            print(json.dumps(json.loads(websocket.recv()), indent=2, ensure_ascii=False))
+            if i < len(records):
+                time.sleep(interval)
+
 def test_health_endpoint():
     """Test the health endpoint to ensure all detectors are working."""
     print("🏥 Testing health endpoint...")
     try:
-        response = requests.get("http://localhost:8000/health")
+        response = session.get("http://localhost:8000/health")
         response.raise_for_status()
         health_data = response.json()
         print("Health check result:")
@@ -109,10 +130,13 @@ if __name__ == "__main__":
     
     print(f"\n🔄 Testing with {len(values)} data points...")
     
-    for i, v in enumerate(values, 1):
-        send_request(i, v)
-        if i < len(values):  # Don't sleep after the last request
-            print(f"⏳ Waiting 20 seconds before next request...")
-            time.sleep(20)
+    if TEST_MODE.lower() == "stream":
+        stream_records(values, interval=20)
+    else:
+        for i, v in enumerate(values, 1):
+            send_request(i, v)
+            if i < len(values):  # Don't sleep after the last request
+                print(f"⏳ Waiting 20 seconds before next request...")
+                time.sleep(20)
     
     print("\n✅ All tests completed!")
\ No newline at end of file
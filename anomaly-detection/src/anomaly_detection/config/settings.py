@@ -14,6 +14,15 @@ class Settings(BaseSettings):
     redis_db: int = 0
     redis_password: Optional[str] = None
     redis_ssl: bool = False
+    redis_nodes: list = []  # ["host:port/db", ...] to shard statistical state; empty = redis_host/port/db only
+    redis_ssl_cert_reqs: str = "required"  # "required", "optional" or "none"
+    redis_max_connections: int = 50  # per pool; one pool per client flavour (sync/async, decoded/raw)
+    redis_pool_timeout: float = 5.0  # seconds to wait for a free pooled connection
+    redis_socket_timeout: float = 5.0
+    redis_socket_connect_timeout: float = 5.0
+    redis_socket_keepalive: bool = True
+    redis_health_check_interval: int = 30  # seconds idle before a pooled connection is PINGed on checkout
+    redis_retry_attempts: int = 3  # retries on connection errors/timeouts, with exponential backoff
     
     # Azure Configuration
     azure_storage_connection_string: Optional[str] = None
@@ -24,23 +33,63 @@ class Settings(BaseSettings):
     azure_openai_api_version: str = "2024-02-01-preview"
     azure_openai_deployment: Optional[str] = None
     azure_openai_model: Optional[str] = None
+    llm_base_url: Optional[str] = None  # OpenAI-compatible endpoint used instead of Azure OpenAI (e.g. a local stub server)
+    llm_request_timeout: float = 10.0  # seconds per completion request
+    llm_max_retries: int = 0  # client retries per request; the gateway circuit breaker handles outages
+    llm_max_concurrency: int = 8  # completion requests in flight per client
+    llm_acquire_timeout: float = 5.0  # seconds a request waits for a free slot before it is shed
+    llm_failure_threshold: int = 5  # consecutive failures that open the circuit
+    llm_reset_timeout: float = 30.0  # seconds the circuit stays open before a trial request
+    llm_requests_per_minute: int = 0  # request budget per minute; 0 = unlimited
+    llm_tokens_per_minute: int = 0  # token budget per minute (prompt + completion); 0 = unlimited
+    llm_cache_enabled: bool = True  # in-process LRU + Redis (anomaly:cache:llm:*) cache of LLM summaries
+    llm_cache_max_entries: int = 1024  # in-process LRU size
+    llm_cache_ttl: int = 86400  # seconds a summary stays in Redis
+    llm_enrichment_deadline: float = 5.0  # seconds for all LLM summaries of one request, then raw Cause/Actions; 0 = no deadline
+    llm_enrichment_workers: int = 16  # threads running sync summaries concurrently
+    llm_summary_mode: str = "live"  # "live" (LLM on demand) or "catalog" (precomputed summaries, live LLM for missing ones)
 
 
     # Data paths
     alarm_context_path: str = "data/processed/alarm_context.json"
     excel_questionnaire_path: str = "data/raw/Questionnaire.xlsx"
     ml_model_path: str = "data/processed/ml_models/"
+    ml_training_feed: bool = False  # stream records scored Normal to anomaly:queue:processing:ml-training for the retrainer
+    ml_training_stream_maxlen: int = 100000  # records kept in the training stream
+    ml_retrain_batch_size: int = 500  # records per retraining mini-batch
+    ml_retrain_publish_every: int = 20000  # records between published model versions
+    ml_retrain_min_samples: int = 5000  # records seen before the first version is published
+    ml_retrain_half_life: int = 100000  # records after which a sample counts half in the scaler/PCA; 0 = never forget
+    ml_retrain_threshold_quantile: float = 0.99  # quantile of Normal reconstruction errors used as threshold
+    ml_retrain_components: int = 0  # PCA components; 0 = as many as the active model
+    ml_retrain_auto_promote: bool = False  # activate each retrained version instead of waiting for /admin/models/{version}/promote
+    ml_retrain_keep_versions: int = 20  # model versions kept in the registry by the retrainer
     thresholds_path: str = "data/processed/thresholds.json"
+    summary_catalog_path: str = "data/processed/summary_catalog.json"
     
     # Anomaly Detection Configuration
     statistical_window_size: int = 100
     statistical_min_data_points: int = 4
+    statistical_eval_mode: str = "local"  # "local" (in-process windows) or "lua" (one atomic EVALSHA per record)
+    statistical_window_encoding: str = "json"  # "json" (list of JSON points) or "binary" (packed float64 string)
+    statistical_window_mode: str = "count"  # "count" (last N points) or "time" (last N seconds, quantile sketches)
+    statistical_time_window_seconds: float = 86400.0  # horizon of "time" windows
+    statistical_bucket_seconds: float = 300.0  # one t-digest per sensor per bucket in "time" windows
+    statistical_sketch_compression: float = 100.0  # t-digest compression; ~compression/2 centroids per digest
     redis_key_prefix: str = "anomaly"
+    health_refresh_interval: float = 15.0  # seconds between background health snapshot refreshes
+    alarm_state_tracking: bool = True  # summarize alarms via the LLM only on alarm transitions (state under anomaly:alerts)
+    config_reload_interval: float = 5.0  # seconds between checks of thresholds, alarm context and ML artifacts; 0 disables
+    deferred_enrichment_workers: int = 4  # tasks enriching deferred detections in the background
+    deferred_enrichment_queue_size: int = 1000  # deferred detections waiting for enrichment before requests are enriched inline
     
     # API Configuration
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     cors_origins: list = ["*"]
+    ingest_batch_size: int = 256  # records of a /detect/all/batch upload evaluated together
+    ingest_reorder_buffer: int = 1000  # NDJSON records held back to evaluate an upload in timestamp order
+    ws_queue_size: int = 1000  # records a /ws/detect connection queues before it stops reading from the client
     
     # Logging
     log_level: str = "INFO"
@@ -1,8 +1,11 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import os
+import numpy as np
 
+from .alarm_state import AlarmStateTracker, plan_enrichment, settle_enrichment
 from .context_processor import AlarmContextProcessor
+from .enrichment import EnrichmentRunner
 from ..integrations.llm import LLM
 from ..models.schemas import SensorData, AnomalyResult
 """
@@ -28,69 +31,145 @@ class HeuristicAnomalyDetector:
 
 
 
+    # Alarm type per compiled edge test, in if/elif order, with High-High when no test holds
+    ALARM_TYPES = np.array(["Low-Low", "Low", "OK", "High", "High-High"], dtype=object)
+
     #Initializing the thresholds (L,LL,H,HH) from thresholds.json, the context processor to derive context from Questionnaire.xlsx and the llm from llm.py
     def __init__(self, 
                  *,
                  thresholds: Dict[str, Dict[str, float]], 
                  context_processor: [AlarmContextProcessor], 
-                 llm: [LLM]) -> None:
+                 llm: [LLM],
+                 alarm_state: Optional[AlarmStateTracker] = None,
+                 enrichment: Optional[EnrichmentRunner] = None) -> None:
 
         self.thresholds = thresholds
         self.context_processor = context_processor
         self.llm = llm
+        self.alarm_state = alarm_state
+        self.enrichment = enrichment or EnrichmentRunner()
+        self._compiled = self._compile_thresholds(thresholds)
+
+    #Compiles the thresholds into a variable index and an (M, 4) edge array: Low-Low, Low, High, High-High
+    @staticmethod
+    def _compile_thresholds(thresholds: Dict[str, Dict[str, float]]) -> Tuple[List[str], Dict[str, int], np.ndarray]:
+        variables = list(thresholds)
+        edges = np.array(
+            [[limits["Low-Low"], limits["Low"], limits["High"], limits["High-High"]] for limits in thresholds.values()],
+            dtype=float
+        ).reshape(-1, 4)
+        return variables, {var: i for i, var in enumerate(variables)}, edges
 
     #Evaluates anomaly based on the thresholds
     def evaluate_anomaly(self, record: SensorData) -> Dict[str, AnomalyResult]:
-        
-        timestamp = record.timestamp
-        data = record.data
-        results: Dict[str, AnomalyResult] = {}
-
-        for var, limits in self.thresholds.items():
-            if var not in data:
-                continue
-            
-            value = data[var]
-
-            if value < limits["Low-Low"]:
-                alarm_type = "Low-Low"
-                status = "Anomaly"
-            elif value < limits["Low"]:
-                alarm_type = "Low"
-                status = "Anomaly"
-            elif value <= limits["High"]:
-                alarm_type = "OK"
-                status = "Normal"
-            elif value <= limits["High-High"]:
-                alarm_type = "High"
-                status = "Anomaly"
-            else:
-                alarm_type = "High-High"
-                status = "Anomaly"
-
-            results[var] = AnomalyResult(
-                value=value,
-                alarm_type=alarm_type,
-                status=status,
-                context=""
+        return self.evaluate_batch([record])[0]
+
+    #Async variant of evaluate_anomaly, awaiting the LLM instead of blocking a worker thread
+    async def aevaluate_anomaly(self, record: SensorData) -> Dict[str, AnomalyResult]:
+        return (await self.aevaluate_batch([record]))[0]
+
+    #Evaluates a batch of records in one vectorized classification; each (variable, alarm) needing a summary is summarized once
+    def evaluate_batch(self, records: List[SensorData]) -> List[Dict[str, AnomalyResult]]:
+        return self.enrich_batch(self.classify_records(records))
+
+    async def aevaluate_batch(self, records: List[SensorData]) -> List[Dict[str, AnomalyResult]]:
+        return await self.aenrich_batch(self.classify_records(records))
+
+    #Attaches context to classified results, in place; split from classification so it can run deferred
+    def enrich_batch(self, batch: List[Dict[str, AnomalyResult]]) -> List[Dict[str, AnomalyResult]]:
+
+        # If anomaly attach context and summarize via LLM; with alarm state only alarm transitions are summarized
+        states = self.alarm_state.lookup(self._variables(batch)) if self.alarm_state else {}
+        needed, transitions = plan_enrichment(batch, states)
+        summaries = self.enrichment.run(needed, self._summarize, self._fallback)
+        changes = settle_enrichment(needed, transitions, summaries)
+        if self.alarm_state:
+            self.alarm_state.commit(changes)
+
+        return batch
+
+    async def aenrich_batch(self, batch: List[Dict[str, AnomalyResult]]) -> List[Dict[str, AnomalyResult]]:
+
+        states = await self.alarm_state.alookup(self._variables(batch)) if self.alarm_state else {}
+        needed, transitions = plan_enrichment(batch, states)
+        summaries = await self.enrichment.arun(needed, self._asummarize, self._fallback)
+        changes = settle_enrichment(needed, transitions, summaries)
+        if self.alarm_state:
+            await self.alarm_state.acommit(changes)
+
+        return batch
+
+    @staticmethod
+    def _variables(batch: List[Dict[str, AnomalyResult]]) -> List[str]:
+        return list(dict.fromkeys(var for results in batch for var in results))
+
+    #Returns (context, settled); an alarm whose LLM summary failed is not settled and is retried on the next record
+    def _summarize(self, var: str, alarm_type: str) -> Tuple[str, bool]:
+        raw_ctx = self.context_processor.lookup_context(var, alarm_type)
+        text = self.llm.summarize(var, alarm_type, raw_ctx) if raw_ctx else None
+        return text or (str(raw_ctx) if raw_ctx else ""), text is not None or not raw_ctx
+
+    async def _asummarize(self, var: str, alarm_type: str) -> Tuple[str, bool]:
+        raw_ctx = self.context_processor.lookup_context(var, alarm_type)
+        text = await self.llm.asummarize(var, alarm_type, raw_ctx) if raw_ctx else None
+        return text or (str(raw_ctx) if raw_ctx else ""), text is not None or not raw_ctx
+
+    #Raw Cause/Actions context for summaries that missed the enrichment deadline
+    def _fallback(self, var: str, alarm_type: str) -> Tuple[str, bool]:
+        raw_ctx = self.context_processor.lookup_context(var, alarm_type)
+        return (str(raw_ctx) if raw_ctx else ""), not raw_ctx
+
+    #Classifies an (N, len(variables)) value matrix in one vectorized call; variables without thresholds are "OK"
+    def classify_matrix(self, X: np.ndarray, variables: List[str]) -> np.ndarray:
+        return self._classify_matrix(np.asarray(X, dtype=float), variables, self._compiled)
+
+    def _classify_matrix(self, X: np.ndarray, variables: List[str], compiled: Tuple) -> np.ndarray:
+
+        _, index, edges = compiled
+        alarm_types = np.full(X.shape, "OK", dtype=object)
+
+        columns = [j for j, var in enumerate(variables) if var in index]
+        if columns:
+            limits = edges[[index[variables[j]] for j in columns]]
+            values = X[:, columns, None]
+            # Same precedence as value < Low-Low / < Low / <= High / <= High-High: first test that holds wins
+            hits = np.concatenate(
+                (values < limits[:, :2], values <= limits[:, 2:], np.ones(values.shape, dtype=bool)),
+                axis=2
             )
+            alarm_types[:, columns] = self.ALARM_TYPES[hits.argmax(axis=2)]
 
-        # Handle variables that don't have thresholds defined
-        for var, value in data.items():
-            if var not in self.thresholds:
-                results[var] = AnomalyResult(
-                    value=value,
-                    alarm_type="OK",
-                    status="Normal",
+        return alarm_types
+
+    #Classifies every variable of every record against its thresholds, without context
+    def classify_records(self, records: List[SensorData]) -> List[Dict[str, AnomalyResult]]:
+
+        compiled = self._compiled
+        index = compiled[1]
+        variables = list(dict.fromkeys(var for record in records for var in record.data))
+        column = {var: j for j, var in enumerate(variables)}
+
+        X = np.zeros((len(records), len(variables)))
+        for i, record in enumerate(records):
+            for var, value in record.data.items():
+                X[i, column[var]] = value
+        alarm_types = self._classify_matrix(X, variables, compiled)
+
+        batch = []
+        for i, record in enumerate(records):
+            data = record.data
+            results: Dict[str, AnomalyResult] = {}
+
+            # Thresholded variables first, in thresholds order, then the others as received
+            ordered = sorted((var for var in data if var in index), key=index.get) + [var for var in data if var not in index]
+            for var in ordered:
+                alarm_type = alarm_types[i, column[var]]
+                results[var] = AnomalyResult.model_construct(
+                    value=data[var],
+                    alarm_type=alarm_type,
+                    status="Normal" if alarm_type == "OK" else "Anomaly",
                     context=""
                 )
+            batch.append(results)
 
-        # If anomaly attach context and summarize via LLM
-        for var, info in results.items():
-            if info.alarm_type != "OK":
-                raw_ctx = self.context_processor.lookup_context(var, info.alarm_type)
-                text = self.llm.summarize(var, info.alarm_type, raw_ctx) if raw_ctx else None
-                info.context = text or (str(raw_ctx) if raw_ctx else "")
-
-        return results
-        
+        return batch
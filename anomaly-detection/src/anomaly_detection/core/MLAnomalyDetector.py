@@ -1,45 +1,57 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import numpy as np
-import pandas as pd
-import joblib
-import json
 from pathlib import Path
 
 from ..models.schemas import MLAnomalyResult, SensorData
+from .model_registry import LEGACY_ARTIFACTS, ModelRegistry
 
 
 class MLAnomalyDetector:
     """
     ML-based anomaly detector using PCA reconstruction error.
-    Uses pre-trained models (scaler, PCA, threshold) to detect anomalies
-    in real-time records based on reconstruction error.
+    Uses a pre-trained model (scaler and PCA folded into one matrix, threshold) from the
+    model registry to detect anomalies in real-time records based on reconstruction error.
     """
+
+    # Files whose changes reload the model: the registry's active pointer and the legacy sklearn artifacts
+    ARTIFACTS = (ModelRegistry.POINTER,) + LEGACY_ARTIFACTS
     
-    def __init__(self, model_path: str) -> None:
+    def __init__(self, model_path: str, version: Optional[str] = None, read_only: bool = False) -> None:
         self.model_path = Path(model_path)
-        self.scaler = None
-        self.pca = None
+        self.registry = ModelRegistry(model_path)
+        self.version = version
+        # Read-only consumers (backfill) serve the active version and never import or promote
+        self.read_only = read_only
+        self.metadata: Dict[str, Any] = {}
         self.threshold = None
         self.features = None
+        # Scaler and PCA folded into residual = x @ weights + bias, memory-mapped from the registry
+        self.weights = None
+        self.bias = None
         self._load_models()
     
     def _load_models(self) -> None:
-        """Load pre-trained models and features list."""
+        """Load the requested or active model version; unless read-only, changed legacy artifacts are published and promoted first."""
         try:
-            self.scaler = joblib.load(self.model_path / "scaler.pkl")
-            self.pca = joblib.load(self.model_path / "pca.pkl")
-            self.threshold = joblib.load(self.model_path / "threshold.pkl")
-            with open(self.model_path / "features.json", "r") as f:
-                self.features = json.load(f)
-            print(f"ML models & features loaded successfully from {self.model_path}")
+            if self.version is None and not self.read_only:
+                imported = self.registry.import_legacy()
+                if imported is not None:
+                    self.registry.promote(imported)
+            if self.version is None:
+                self.version = self.registry.active_version()
+            if self.version is None:
+                raise FileNotFoundError(f"no active model version in {self.model_path}")
+            self.weights, self.bias, self.metadata = self.registry.load(self.version)
+            self.threshold = self.metadata["threshold"]
+            self.features = self.metadata["features"]
+            print(f"ML model {self.version} loaded successfully from {self.model_path}")
         except FileNotFoundError as e:
             raise FileNotFoundError(f"Could not load ML models from {self.model_path}: {e}")
         except Exception as e:
             raise RuntimeError(f"Error loading ML models: {e}")
-    
-    
+
     def _prepare_data(self, record: SensorData) -> np.ndarray:
-        """Prepare input data for ML model prediction."""
+        """Feature vector of a record, in `self.features` order."""
         if not hasattr(record, 'data') or not isinstance(record.data, dict):
             raise ValueError("Record must contain a 'data' dictionary")
         
@@ -49,51 +61,69 @@ class MLAnomalyDetector:
         if missing:
             raise ValueError(f"Missing required features: {missing}")
         
-        # Align in correct order using the expected feature names
-        df = pd.DataFrame([[data[f] for f in self.features]], columns=self.features)
-        return df
-    
-    def _calculate_reconstruction_error(self, data_point: np.ndarray) -> float:
-        """Calculate reconstruction error using PCA."""
-        X_scaled = self.scaler.transform(data_point)
-        X_pca = self.pca.transform(X_scaled)
-        X_reconstructed = self.pca.inverse_transform(X_pca)
-        reconstruction_error = np.mean((X_scaled - X_reconstructed)**2, axis=1)[0]
-        return reconstruction_error
+        return np.fromiter((data[f] for f in self.features), dtype=float, count=len(self.features))
     
+    def reconstruction_errors(self, X) -> np.ndarray:
+        """
+        Reconstruction error of every row of X (columns in `self.features` order).
+
+        The residual is one einsum contraction rather than a BLAS matrix product: BLAS picks
+        different kernels for one row and for many, while einsum sums every row in the same
+        order, so one online record and an offline batch agree bit for bit.
+        """
+        X = np.asarray(X, dtype=float)
+        residual = np.einsum("ij,jk->ik", X, self.weights) + self.bias
+        return np.einsum("ij,ij->i", residual, residual) / residual.shape[1]
 
     def evaluate_anomaly(self, record: SensorData) -> MLAnomalyResult:
-        
-        try:
-            data_point = self._prepare_data(record)
-            reconstruction_error = self._calculate_reconstruction_error(data_point)
-            is_anomaly = reconstruction_error > self.threshold
-            status = "Anomaly" if is_anomaly else "Normal"
-            
-            results = MLAnomalyResult(
-                values=record.data,
-                status=status
-            )
+        return self.evaluate_batch([record])[0]
 
-            return results
+    def evaluate_batch(self, records: List[SensorData]) -> List[MLAnomalyResult]:
+        """Score N records as one N x F matrix; records that cannot be scored get status Error."""
+        features = self.features
+        X = np.empty((len(records), len(features)))
+        valid = np.ones(len(records), dtype=bool)
+        for i, record in enumerate(records):
+            try:
+                X[i] = [record.data[f] for f in features]
+            except Exception:
+                valid[i] = False
+                try:
+                    self._prepare_data(record)
+                except Exception as e:
+                    print(f"ML detection error: {e}")
 
-        except Exception as e:
-            print(f"ML detection error: {e}")
-            return MLAnomalyResult(
-                values=record.data or {},
-                status="Error"
-            )
+        errors = np.full(len(records), np.nan)
+        if valid.any():
+            errors[valid] = self.reconstruction_errors(X[valid])
+        # NaN and Infinity are valid JSON numbers for the schema but cannot be scored either
+        valid &= np.isfinite(errors)
+        threshold = float(self.threshold)
+
+        results = []
+        for record, ok, error in zip(records, valid, errors.tolist()):
+            if not ok:
+                results.append(MLAnomalyResult(values=record.data or {}, status="Error"))
+                continue
+            # Built without validation: every field comes from a validated record or the model
+            results.append(MLAnomalyResult.model_construct(
+                values=record.data,
+                status="Anomaly" if error > threshold else "Normal",
+                reconstruction_error=error,
+                threshold=threshold
+            ))
+        return results
 
-    
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the loaded ML models."""
         return {
             "model_path": str(self.model_path),
+            "version": self.version,
+            "created_at": self.metadata.get("created_at"),
+            "source": self.metadata.get("source"),
             "threshold": float(self.threshold) if self.threshold is not None else None,
-            "pca_components": int(self.pca.n_components_) if self.pca is not None else None,
-            "scaler_type": type(self.scaler).__name__ if self.scaler is not None else None,
+            "pca_components": self.metadata.get("pca_components"),
+            "scaler_type": self.metadata.get("scaler_type"),
             "features": self.features,
-            "models_loaded": all([self.scaler, self.pca, self.threshold, self.features])
+            "models_loaded": self.weights is not None and self.bias is not None and bool(self.features)
         }
-
-
@@ -1,14 +1,32 @@
 from ..utils.redis_namespaces import AnomalyRedisKeys, AnomalyRedisTTL
+from ..utils.redis_sharding import ConsistentHashRing, RedisShard, ShardedPipeline, group_by_node, node_name
+import asyncio
 import redis
 import json
-import numpy as np
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple, Union
 
 from ..models.schemas import SensorData, AnomalyResult
+from .alarm_state import AlarmStateTracker, plan_enrichment, settle_enrichment
 from .context_processor import AlarmContextProcessor
+from .enrichment import EnrichmentRunner
+from .sliding_window import SortedWindow
+from .quantile_sketch import TimeWindowSketch
+from .redis_scripts import STATISTICAL_EVALUATE, STATISTICAL_EVALUATE_BINARY, WINDOW_APPEND, WINDOW_APPEND_JSON
+from .window_codec import WINDOW_POINT_SIZE, pack_point, pack_json_points, unpack_points
 from ..integrations.llm import LLM
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
 
 class StatisticalAnomalyDetector:
+    # Write-through rounds per record when other writers keep appending to its sensors; the
+    # last round appends unconditionally
+    write_attempts = 3
+
     def __init__(self, 
                  window_size: int, 
                  min_data_points: int,
@@ -17,85 +35,699 @@ class StatisticalAnomalyDetector:
                  redis_db: int, 
                  key_prefix: str,
                  context_processor: AlarmContextProcessor,
-                 llm: LLM):
+                 llm: LLM,
+                 eval_mode: str = "local",
+                 window_encoding: str = "json",
+                 window_mode: str = "count",
+                 time_window_seconds: float = 86400.0,
+                 bucket_seconds: float = 300.0,
+                 sketch_compression: float = 100.0,
+                 redis_nodes: Optional[List[str]] = None,
+                 alarm_state: Optional[AlarmStateTracker] = None,
+                 enrichment: Optional[EnrichmentRunner] = None):
+
+        if eval_mode not in ("local", "lua"):
+            raise ValueError(f"Unknown statistical eval_mode '{eval_mode}', expected 'local' or 'lua'")
+        if window_encoding not in ("json", "binary"):
+            raise ValueError(f"Unknown statistical window_encoding '{window_encoding}', expected 'json' or 'binary'")
+        if window_mode not in ("count", "time"):
+            raise ValueError(f"Unknown statistical window_mode '{window_mode}', expected 'count' or 'time'")
+        if window_mode == "time" and eval_mode != "local":
+            raise ValueError("Statistical window_mode 'time' requires eval_mode 'local'")
 
         self.window_size = window_size
         self.min_data_points = min_data_points 
-        self.redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
         self.key_prefix = key_prefix
         self.context_processor = context_processor
         self.llm = llm
+        # Alarm transitions per sensor; without it every non-OK sensor is summarized on every record
+        self.alarm_state = alarm_state
+        # Summarizes the alarms of a record concurrently, under an optional deadline
+        self.enrichment = enrichment or EnrichmentRunner()
+        self.eval_mode = eval_mode
+        self.window_encoding = window_encoding
+
+        # "time" windows cover the last time_window_seconds with one t-digest per sensor per
+        # bucket, persisted as a Redis hash; the count-based windows below are not used then.
+        # Each process owns the sketches of the sensors it ingests (no cross-writer re-sync).
+        self.window_mode = window_mode
+        self.time_window_seconds = time_window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.sketch_compression = sketch_compression
+
+        # Binary windows and sketches must be read without response decoding
+        self._raw_reads = window_encoding == "binary" or window_mode == "time"
+
+        # Sensor state is spread over the Redis nodes ("host:port/db") by consistent hashing of
+        # the sensor name; without redis_nodes, redis_host/port/db is the only node. Every
+        # node keeps the registry of the sensors stored on it, which drives rebalance().
+        self.shards: Dict[str, RedisShard] = {}
+        for spec in redis_nodes or [node_name(redis_host, redis_port, redis_db)]:
+            shard = RedisShard(spec)
+            self.shards[shard.name] = shard
+        self.ring = ConsistentHashRing(self.shards)
+
+        # Per-sensor in-memory windows (ring buffer + sorted view), written through to Redis.
+        # Each Redis window carries a version counter bumped on every append. The write-through
+        # appends only if Redis is still at the cached version; otherwise another writer touched
+        # the window, which is reloaded and the sensor classified again before its append.
+        self._windows: Dict[str, Union[SortedWindow, TimeWindowSketch]] = {}
+        self._versions: Dict[str, int] = {}
+
+        # Sensors known to be in the Redis registry set; new ones are added with their first write
+        self._registered: set = set()
+
+        # Window lengths per sensor, refreshed off the request path by start_health_refresher()
+        self._health_snapshot: Dict[str, int] = {}
+        self.health_updated_at: Optional[float] = None
+        self._health_stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+        # "lua" mode evaluates a record server-side in one atomic EVALSHA per node. The scripts
+        # are loaded into every node once here (and by add_node); pipelines reload them only
+        # when a node answers NOSCRIPT after a restart
+        script_client = next(iter(self.shards.values())).client
+        self._evaluate_script = script_client.register_script(
+            STATISTICAL_EVALUATE_BINARY if window_encoding == "binary" else STATISTICAL_EVALUATE
+        )
+        self._append_script = script_client.register_script(
+            WINDOW_APPEND if window_encoding == "binary" else WINDOW_APPEND_JSON
+        )
+        self._scripts = [self._evaluate_script, self._append_script]
+        for shard in self.shards.values():
+            shard.load_scripts(self._scripts)
 
 
     def evaluate_anomaly(self, record: SensorData) -> Dict[str, AnomalyResult]:
         """
         Process a multi-sensor record and return anomaly detection results
         """
-        timestamp = record.timestamp
-        sensor_data = record.data
-        
+        return self.enrich(self.classify(record))
+
+    async def aevaluate_anomaly(self, record: SensorData) -> Dict[str, AnomalyResult]:
+        """
+        Async variant of evaluate_anomaly using redis.asyncio and the async LLM client
+        """
+        return await self.aenrich(await self.aclassify(record))
+
+    def evaluate_batch(self, records: List[SensorData]) -> List[Dict[str, AnomalyResult]]:
+        """
+        Process consecutive records: each one is classified against the windows updated by the
+        records before it, exactly as if posted one by one; the batch is then enriched at once
+        """
+        return self.enrich_batch([self.classify(record) for record in records])
+
+    async def aevaluate_batch(self, records: List[SensorData]) -> List[Dict[str, AnomalyResult]]:
+        return await self.aenrich_batch([await self.aclassify(record) for record in records])
+
+    def classify(self, record: SensorData) -> Dict[str, AnomalyResult]:
+        """Update the windows with the record and return its results, without context"""
+        if self.eval_mode == "lua":
+            alarm_types = self._evaluate_with_script(record)
+        else:
+            alarm_types = self._evaluate_locally(record)
+        return self._build_results(record, alarm_types)
+
+    async def aclassify(self, record: SensorData) -> Dict[str, AnomalyResult]:
+        if self.eval_mode == "lua":
+            alarm_types = await self._aevaluate_with_script(record)
+        else:
+            alarm_types = await self._aevaluate_locally(record)
+        return self._build_results(record, alarm_types)
+
+    def enrich(self, results: Dict[str, AnomalyResult]) -> Dict[str, AnomalyResult]:
+        """Attach context to classified results, in place"""
+        return self.enrich_batch([results])[0]
+
+    async def aenrich(self, results: Dict[str, AnomalyResult]) -> Dict[str, AnomalyResult]:
+        return (await self.aenrich_batch([results]))[0]
+
+    def enrich_batch(self, batch: List[Dict[str, AnomalyResult]]) -> List[Dict[str, AnomalyResult]]:
+        """Attach context to the results of consecutive records, in place"""
+        # If anomaly attach context and summarize via LLM; with alarm state only alarm transitions are summarized
+        states = self.alarm_state.lookup(self._sensor_names(batch)) if self.alarm_state else {}
+        needed, transitions = plan_enrichment(batch, states)
+        summaries = self.enrichment.run(needed, self._summarize, self._fallback)
+        changes = settle_enrichment(needed, transitions, summaries)
+        if self.alarm_state:
+            self.alarm_state.commit(changes)
+        return batch
+
+    async def aenrich_batch(self, batch: List[Dict[str, AnomalyResult]]) -> List[Dict[str, AnomalyResult]]:
+        states = await self.alarm_state.alookup(self._sensor_names(batch)) if self.alarm_state else {}
+        needed, transitions = plan_enrichment(batch, states)
+        summaries = await self.enrichment.arun(needed, self._asummarize, self._fallback)
+        changes = settle_enrichment(needed, transitions, summaries)
+        if self.alarm_state:
+            await self.alarm_state.acommit(changes)
+        return batch
+
+    @staticmethod
+    def _sensor_names(batch: List[Dict[str, AnomalyResult]]) -> List[str]:
+        return list(dict.fromkeys(sensor_name for results in batch for sensor_name in results))
+
+    def _summarize(self, sensor_name: str, alarm_type: str) -> Tuple[str, bool]:
+        """(context, settled) of an alarm; failed LLM summaries are not settled and get retried"""
+        raw_ctx = self.context_processor.lookup_context(sensor_name, alarm_type)
+        try:
+            text = self.llm.summarize(sensor_name, alarm_type, raw_ctx) if raw_ctx else None
+        except Exception as e:
+            print(f"LLM error for {sensor_name}: {e}")
+            return "LLM summarization error", False
+        return self._format_context(sensor_name, alarm_type, raw_ctx, text), text is not None or not raw_ctx
+
+    async def _asummarize(self, sensor_name: str, alarm_type: str) -> Tuple[str, bool]:
+        raw_ctx = self.context_processor.lookup_context(sensor_name, alarm_type)
+        try:
+            text = await self.llm.asummarize(sensor_name, alarm_type, raw_ctx) if raw_ctx else None
+        except Exception as e:
+            print(f"LLM error for {sensor_name}: {e}")
+            return "LLM summarization error", False
+        return self._format_context(sensor_name, alarm_type, raw_ctx, text), text is not None or not raw_ctx
+
+    def _fallback(self, sensor_name: str, alarm_type: str) -> Tuple[str, bool]:
+        """Raw Cause/Actions context for summaries that missed the enrichment deadline"""
+        raw_ctx = self.context_processor.lookup_context(sensor_name, alarm_type)
+        if not raw_ctx:
+            return self._format_context(sensor_name, alarm_type, raw_ctx, None), True
+        return str(raw_ctx), False
+
+    def _build_results(self, record: SensorData, alarm_types: Dict[str, str]) -> Dict[str, AnomalyResult]:
+        """Create one AnomalyResult per sensor, context filled in by enrichment"""
         results = {}
-        
+        for sensor_name, value in record.data.items():
+            alarm_type = alarm_types[sensor_name]
+            results[sensor_name] = AnomalyResult(
+                value=value,
+                alarm_type=alarm_type, 
+                status="Anomaly" if alarm_type != "OK" else "Normal", 
+                context=""
+            )
+        return results
+
+    @staticmethod
+    def _format_context(sensor_name: str, alarm_type: str, raw_ctx: Dict[str, str], text: Optional[str]) -> str:
+        if not raw_ctx:
+            return f"No context available for {sensor_name} {alarm_type}"
+        return text if text else "LLM summarization failed"
+
+    def _evaluate_locally(self, record: SensorData) -> Dict[str, str]:
+        """Classify each sensor against its cached window, then write the new points through to Redis"""
+        alarm_types = {}
+        sensor_names = list(record.data)
+        for attempt in range(self.write_attempts):
+            # Get PREVIOUS data for every sensor (no Redis reads once the windows are cached)
+            windows = self._get_sensor_windows(sensor_names)
+            pipes = self._pipelines()
+            classified, version_slots, registering = self._classify_and_queue(
+                record, windows, pipes, sensor_names, conditional=attempt < self.write_attempts - 1
+            )
+
+            try:
+                replies = pipes.execute()
+            except Exception:
+                self._discard_windows(version_slots)
+                raise
+            alarm_types.update(classified)
+            # Sensors another writer appended to meanwhile: classify them again on the reloaded windows
+            sensor_names = self._apply_write_replies(replies, version_slots, registering)
+            if not sensor_names:
+                break
+        return alarm_types
+
+    async def _aevaluate_locally(self, record: SensorData) -> Dict[str, str]:
+        alarm_types = {}
+        sensor_names = list(record.data)
+        for attempt in range(self.write_attempts):
+            windows = await self._aget_sensor_windows(sensor_names)
+            pipes = self._pipelines(is_async=True)
+            classified, version_slots, registering = self._classify_and_queue(
+                record, windows, pipes, sensor_names, conditional=attempt < self.write_attempts - 1
+            )
+
+            try:
+                replies = await pipes.aexecute()
+            except Exception:
+                self._discard_windows(version_slots)
+                raise
+            alarm_types.update(classified)
+            sensor_names = self._apply_write_replies(replies, version_slots, registering)
+            if not sensor_names:
+                break
+        return alarm_types
+
+    def _classify_and_queue(self, record: SensorData, windows: Dict[str, Union[SortedWindow, TimeWindowSketch]],
+                            pipes: ShardedPipeline, sensor_names: List[str], conditional: bool = True) -> tuple:
+        """
+        Classify every sensor on its PREVIOUS points, append the new point in memory and queue
+        the write-through on the pipeline of the sensor's node. Runs without awaiting, so concurrent records never interleave
+        between the classification and the in-memory append.
+        """
+        alarm_types = {}
+        version_slots = {}
+        epoch = record.timestamp.timestamp()
+
         # Process each sensor individually
-        for sensor_name, value in sensor_data.items():
+        for sensor_name in sensor_names:
+            value = record.data[sensor_name]
             # Create simple data point (just timestamp and value)
             point_data = {
-                "timestamp": timestamp.isoformat(),
+                "timestamp": record.timestamp.isoformat(),
                 "value": float(value)
             }
-            
-            # Get PREVIOUS data for this sensor (before adding new point)
-            previous_data = self._get_sensor_queue_data(sensor_name)
+            window = windows[sensor_name]
+            node = self.ring.get_node(sensor_name)
+            pipe = pipes[node]
+
+            if self.window_mode == "time":
+                # Drop buckets that left the horizon before classifying, then update the sketch
+                expired = window.expire(epoch)
+                outlier_info = self._check_outlier(point_data, window)
+                bucket_id = window.append(point_data["value"], epoch)
+                self._queue_sketch_update(pipe, sensor_name, window, bucket_id, expired)
+                alarm_types[sensor_name] = outlier_info["alarm_type"]
+                continue
             
             # Check for outlier using ONLY previous data
-            outlier_info = self._check_outlier(point_data, previous_data)
+            outlier_info = self._check_outlier(point_data, window)
             
             # Add to sensor-specific queue AFTER calculation
-            self._add_to_sensor_queue(sensor_name, point_data)
-            
-            # Create AnomalyResult object
-            results[sensor_name] = AnomalyResult(
-                value=value,
-                alarm_type=outlier_info["alarm_type"], 
-                status="Anomaly" if outlier_info["alarm_type"] != "OK" else "Normal", 
-                context=""
+            version_slots[sensor_name] = node, self._queue_sensor_point(
+                pipe, sensor_name, self._encode_point(record.timestamp, point_data), conditional
             )
-            
-            # If anomaly attach context and summarize via LLM
-            if results[sensor_name].alarm_type != "OK":
-                raw_ctx = self.context_processor.lookup_context(sensor_name, results[sensor_name].alarm_type)
-                if raw_ctx:
-                    try:
-                        text = self.llm.summarize(sensor_name, results[sensor_name].alarm_type, raw_ctx)
-                        results[sensor_name].context = text if text else "LLM summarization failed"
-                    except Exception as e:
-                        print(f"LLM error for {sensor_name}: {e}")
-                        results[sensor_name].context = "LLM summarization error"
-                else:
-                    results[sensor_name].context = f"No context available for {sensor_name} {results[sensor_name].alarm_type}"
-        
-        return results
+            window.append(point_data["value"], epoch)
+
+            alarm_types[sensor_name] = outlier_info["alarm_type"]
+
+        registering = self._queue_registration(pipes, sensor_names)
+        return alarm_types, version_slots, registering
+
+    def _script_call(self, record: SensorData, sensor_names: List[str]) -> tuple:
+        """KEYS and ARGV for evaluating the sensors of a record with the server-side script"""
+        keys = []
+        for sensor_name in sensor_names:
+            keys += [self._get_sensor_window_key(sensor_name), self._get_sensor_version_key(sensor_name)]
+            if self.window_encoding == "binary":
+                # Checked for a legacy JSON queue still to migrate
+                keys.append(self._get_sensor_queue_key(sensor_name))
+        args = [self.window_size, self.min_data_points]
+
+        for sensor_name in sensor_names:
+            point_data = {
+                "timestamp": record.timestamp.isoformat(),
+                "value": float(record.data[sensor_name])
+            }
+            # repr() round-trips the float exactly through Lua's tonumber
+            args.append(repr(point_data["value"]))
+            args.append(self._encode_point(record.timestamp, point_data))
+
+        return keys, args
+
+    def _queue_script_calls(self, record: SensorData, pipes: ShardedPipeline,
+                            sensor_names: Optional[List[str]] = None) -> tuple:
+        """Queue one script call per node, first in its pipeline, then the new sensor registrations"""
+        sensor_names = list(sensor_names or record.data)
+        groups = group_by_node(self.ring, sensor_names)
+        for node, names in groups.items():
+            keys, args = self._script_call(record, names)
+            self._queue_script(pipes[node], self._evaluate_script, keys, args)
+        registering = self._queue_registration(pipes, sensor_names)
+        return groups, registering
+
+    def _script_alarm_types(self, groups: Dict[str, List[str]], replies: Dict[str, List[Any]], registering: List[str]) -> tuple:
+        """
+        Alarm types of the evaluated sensors, and the sensors of the nodes that refused the record
+        because of legacy JSON queues, with those legacy sensors
+        """
+        self._registered.update(registering)
+        alarm_types = {}
+        refused, legacy = [], []
+        for node, sensor_names in groups.items():
+            reply = replies[node][0]
+            if reply and reply[0] == "MIGRATE":
+                refused += sensor_names
+                legacy += [sensor_names[int(i) - 1] for i in reply[1:]]
+            else:
+                alarm_types.update(zip(sensor_names, reply))
+        return alarm_types, refused, legacy
+
+    def _evaluate_with_script(self, record: SensorData, sensor_names: Optional[List[str]] = None) -> Dict[str, str]:
+        """Classify and append every sensor of the record with a single server-side script call per node"""
+        # Register new sensors in the same round trip as the evaluation
+        pipes = self._pipelines()
+        groups, registering = self._queue_script_calls(record, pipes, sensor_names)
+        alarm_types, refused, legacy = self._script_alarm_types(groups, pipes.execute(), registering)
+        if refused:
+            # Those nodes evaluated nothing: convert the legacy queues and evaluate their sensors again
+            for sensor_name in legacy:
+                self._migrate_sensor_queue(sensor_name)
+            alarm_types.update(self._evaluate_with_script(record, refused))
+        return alarm_types
+
+    async def _aevaluate_with_script(self, record: SensorData, sensor_names: Optional[List[str]] = None) -> Dict[str, str]:
+        pipes = self._pipelines(is_async=True)
+        groups, registering = self._queue_script_calls(record, pipes, sensor_names)
+        alarm_types, refused, legacy = self._script_alarm_types(groups, await pipes.aexecute(), registering)
+        if refused:
+            for sensor_name in legacy:
+                await asyncio.to_thread(self._migrate_sensor_queue, sensor_name)
+            alarm_types.update(await self._aevaluate_with_script(record, refused))
+        return alarm_types
+
+    def _pipelines(self, is_async: bool = False, raw: bool = False, transaction: bool = True) -> ShardedPipeline:
+        """Per-node pipelines over the sync or async, decoded or raw clients of every shard"""
+        clients = {}
+        for name, shard in self.shards.items():
+            if is_async:
+                clients[name] = shard.async_raw_client if raw else shard.async_client
+            else:
+                clients[name] = shard.raw_client if raw else shard.client
+        return ShardedPipeline(clients, transaction=transaction, scripts=self._scripts)
+
+    def _shard_of(self, sensor_name: str) -> RedisShard:
+        return self.shards[self.ring.get_node(sensor_name)]
 
 
     def _get_sensor_queue_key(self, sensor_name: str) -> str:
         """Generate Redis key for specific sensor"""
         return AnomalyRedisKeys.temp_data(sensor_name)
     
-    def _add_to_sensor_queue(self, sensor_name: str, point_data: Dict):
-        """Add data point to sensor-specific Redis queue"""
-        queue_key = self._get_sensor_queue_key(sensor_name)
-        point_json = json.dumps(point_data)
-        
-        # Use Redis pipeline for atomic operations
-        pipe = self.redis_client.pipeline()
-        pipe.rpush(queue_key, point_json)
-        pipe.ltrim(queue_key, -self.window_size, -1)
+    def _get_sensor_window_key(self, sensor_name: str) -> str:
+        """Redis key holding the sensor window in the configured encoding"""
+        if self.window_encoding == "binary":
+            return AnomalyRedisKeys.temp_window(sensor_name)
+        return self._get_sensor_queue_key(sensor_name)
+
+    def _encode_point(self, timestamp: datetime, point_data: Dict) -> Union[str, bytes]:
+        """Serialize a data point for the configured window encoding"""
+        if self.window_encoding == "binary":
+            return pack_point(timestamp, point_data["value"])
+        return json.dumps(point_data)
+    
+    def _get_sensor_version_key(self, sensor_name: str) -> str:
+        """Redis counter bumped on every append to the sensor window"""
+        return AnomalyRedisKeys.temp_version(sensor_name)
+    
+    def _queue_sensor_point(self, pipe: redis.client.Pipeline, sensor_name: str, point: Union[str, bytes],
+                            conditional: bool = True) -> int:
+        """
+        Queue the append of an encoded point, conditional on Redis being at the cached window
+        version, and count it in that version right away so the next record of the sensor,
+        queued before this one is executed, expects it. Returns the pipeline slot of the reply.
+        """
+        expected = self._versions.get(sensor_name, 0)
+        self._versions[sensor_name] = expected + 1
+        if self.window_encoding == "binary":
+            max_length = self.window_size * WINDOW_POINT_SIZE
+        else:
+            max_length = self.window_size
+
+        self._queue_script(
+            pipe, self._append_script,
+            keys=[self._get_sensor_window_key(sensor_name), self._get_sensor_version_key(sensor_name)],
+            args=[point, max_length, expected if conditional else ""]
+        )
+        return len(pipe) - 1
+
+    def _get_sensor_sketch_key(self, sensor_name: str) -> str:
+        """Redis hash of the sensor's time-bucket sketches"""
+        return AnomalyRedisKeys.temp_sketch(sensor_name)
+
+    def _queue_sketch_update(self, pipe, sensor_name: str, window: TimeWindowSketch,
+                             bucket_id: Optional[int], expired: List[int]) -> None:
+        """Queue the write-through of the updated bucket and the removal of expired ones"""
+        sketch_key = self._get_sensor_sketch_key(sensor_name)
+        if bucket_id is not None:
+            pipe.hset(sketch_key, str(bucket_id), window.bucket_bytes(bucket_id))
+        if expired:
+            pipe.hdel(sketch_key, *[str(b) for b in expired])
+
+    @staticmethod
+    def _queue_script(pipe, script, keys: List[str], args: List[Any]) -> None:
+        """Queue an EVALSHA of a preloaded script on a sync or async pipeline"""
+        pipe.evalsha(script.sha, len(keys), *keys, *args)
+
+    def _apply_write_replies(self, replies: Dict[str, List[Any]], version_slots: Dict[str, tuple], registering: List[str]) -> List[str]:
+        """
+        Re-sync the windows another writer has touched since they were cached; returns the
+        sensors whose point was not appended because of it
+        """
+        conflicts = []
+        for sensor_name, (node, slot) in version_slots.items():
+            applied, version = replies[node][slot]
+            if not applied:
+                conflicts.append(sensor_name)
+                self._invalidate_window(sensor_name)
+            elif sensor_name in self._versions and version > self._versions[sensor_name]:
+                # Appended unconditionally over another writer's points
+                self._invalidate_window(sensor_name)
+        self._registered.update(registering)
+        return conflicts
+
+    def _discard_windows(self, sensor_names) -> None:
+        """A failed write-through leaves Redis behind the cached windows"""
+        for sensor_name in sensor_names:
+            self._invalidate_window(sensor_name)
+
+    def _queue_registration(self, pipes: ShardedPipeline, sensor_names: List[str]) -> List[str]:
+        """Queue SADD of sensors not yet in their node's registry set; returns the sensors being added"""
+        registering = [sensor_name for sensor_name in sensor_names if sensor_name not in self._registered]
+        for node, names in group_by_node(self.ring, registering).items():
+            pipes[node].sadd(AnomalyRedisKeys.sensor_registry(), *names)
+        return registering
+
+    def _registered_by_node(self) -> Dict[str, List[str]]:
+        """Registry set of every node: the sensors whose state is stored there"""
+        pipes = self._pipelines(transaction=False)
+        for node in self.shards:
+            pipes[node].smembers(AnomalyRedisKeys.sensor_registry())
+        return {node: sorted(replies[0]) for node, replies in pipes.execute().items()}
+
+    def get_registered_sensors(self) -> List[str]:
+        """All sensors that have a window in Redis, from the registry sets"""
+        return sorted(set().union(*self._registered_by_node().values()))
+
+    def ensure_sensor_registry(self) -> int:
+        """Populate each node's registry from its existing windows (one-off SCAN) when it is empty"""
+        registry_key = AnomalyRedisKeys.sensor_registry()
+        added = 0
+        for shard in self.shards.values():
+            if shard.client.scard(registry_key):
+                continue
+
+            sensor_names = set()
+            for suffix in ("queue", "window", "sketch"):
+                pattern = AnomalyRedisKeys.PREFIX + f":temp:data:*:{suffix}"
+                for key in shard.client.scan_iter(match=pattern, count=500):
+                    sensor_names.add(AnomalyRedisKeys.sensor_from_temp_key(key))
+            if sensor_names:
+                shard.client.sadd(registry_key, *sensor_names)
+            added += len(sensor_names)
+        return added
+
+    def _sensor_state_keys(self, sensor_name: str) -> List[str]:
+        return [
+            AnomalyRedisKeys.temp_data(sensor_name),
+            AnomalyRedisKeys.temp_window(sensor_name),
+            AnomalyRedisKeys.temp_version(sensor_name),
+            AnomalyRedisKeys.temp_sketch(sensor_name),
+        ]
+
+    def _move_sensor(self, sensor_name: str, source: RedisShard, target: RedisShard) -> None:
+        """Copy a sensor's keys to `target` with DUMP/RESTORE, then drop them from `source`"""
+        keys = self._sensor_state_keys(sensor_name)
+        pipe = source.raw_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.dump(key)
+            pipe.pttl(key)
+        dumped = pipe.execute()
+
+        pipe = target.raw_client.pipeline()
+        for i, key in enumerate(keys):
+            payload, ttl = dumped[2 * i], dumped[2 * i + 1]
+            if payload is not None:
+                pipe.restore(key, max(ttl, 0), payload, replace=True)
+        pipe.sadd(AnomalyRedisKeys.sensor_registry(), sensor_name)
         pipe.execute()
+
+        pipe = source.client.pipeline()
+        pipe.delete(*keys)
+        pipe.srem(AnomalyRedisKeys.sensor_registry(), sensor_name)
+        pipe.execute()
+
+    def rebalance(self) -> int:
+        """
+        Move every sensor stored on a node that no longer owns it on the ring; returns the number
+        of sensors moved. Cached windows stay valid since the state moves unchanged. Run it while
+        no other process writes the moving sensors, e.g. at startup after adding nodes; a node
+        leaving the configuration must be drained with remove_node() first.
+        """
+        moved = 0
+        for node, sensor_names in self._registered_by_node().items():
+            for sensor_name in sensor_names:
+                owner = self.ring.get_node(sensor_name)
+                if owner != node:
+                    self._move_sensor(sensor_name, self.shards[node], self.shards[owner])
+                    moved += 1
+        return moved
+
+    def add_node(self, spec: str) -> int:
+        """Add a Redis node ("host:port/db") to the ring and move the sensors it now owns"""
+        shard = RedisShard(spec)
+        if shard.name in self.shards:
+            return 0
+        shard.load_scripts(self._scripts)
+        self.shards[shard.name] = shard
+        self.ring.add_node(shard.name)
+        return self.rebalance()
+
+    def remove_node(self, spec: str) -> int:
+        """Move a node's sensors to the remaining nodes and take it off the ring"""
+        name = RedisShard(spec).name
+        if name not in self.shards or len(self.shards) == 1:
+            return 0
+        self.ring.remove_node(name)
+        moved = self.rebalance()
+        del self.shards[name]
+        return moved
+
+    def _invalidate_window(self, sensor_name: str) -> None:
+        """Drop a cached window so the next record reloads it from Redis"""
+        self._windows.pop(sensor_name, None)
+        self._versions.pop(sensor_name, None)
     
+    def _get_sensor_windows(self, sensor_names: List[str]) -> Dict[str, SortedWindow]:
+        """Return the in-memory windows for the sensors, loading unseen ones from Redis"""
+        missing = [sensor_name for sensor_name in sensor_names if sensor_name not in self._windows]
+        if missing:
+            self._load_windows(missing)
+        return {sensor_name: self._windows[sensor_name] for sensor_name in sensor_names}
+
+    async def _aget_sensor_windows(self, sensor_names: List[str]) -> Dict[str, SortedWindow]:
+        missing = [sensor_name for sensor_name in sensor_names if sensor_name not in self._windows]
+        if missing:
+            pipes = self._pipelines(is_async=True, raw=self._raw_reads)
+            groups = self._queue_window_loads(pipes, missing)
+            for sensor_name in self._install_loaded_windows(groups, await pipes.aexecute()):
+                await asyncio.to_thread(self._migrate_sensor_queue, sensor_name)
+                await self._aget_sensor_windows([sensor_name])
+        return {sensor_name: self._windows[sensor_name] for sensor_name in sensor_names}
+
+    def _load_windows(self, sensor_names: List[str]) -> None:
+        """Load windows and their versions in one transactional pipeline per node"""
+        pipes = self._pipelines(raw=self._raw_reads)
+        groups = self._queue_window_loads(pipes, sensor_names)
+        for sensor_name in self._install_loaded_windows(groups, pipes.execute()):
+            self._migrate_sensor_queue(sensor_name)
+            self._load_windows([sensor_name])
+
+    def _queue_window_loads(self, pipes: ShardedPipeline, sensor_names: List[str]) -> Dict[str, List[str]]:
+        groups = group_by_node(self.ring, sensor_names)
+        for node, names in groups.items():
+            self._queue_node_window_loads(pipes[node], names)
+        return groups
+
+    def _install_loaded_windows(self, groups: Dict[str, List[str]], replies: Dict[str, List[Any]]) -> List[str]:
+        to_migrate = []
+        for node, names in groups.items():
+            to_migrate += self._install_windows(names, replies[node])
+        return to_migrate
+
+    def _queue_node_window_loads(self, pipe, sensor_names: List[str]) -> None:
+        for sensor_name in sensor_names:
+            if self.window_mode == "time":
+                pipe.hgetall(self._get_sensor_sketch_key(sensor_name))
+                continue
+            pipe.get(self._get_sensor_version_key(sensor_name))
+            if self.window_encoding == "binary":
+                pipe.get(self._get_sensor_window_key(sensor_name))
+                pipe.exists(self._get_sensor_queue_key(sensor_name))
+            else:
+                pipe.lrange(self._get_sensor_queue_key(sensor_name), 0, -1)
+
+    def _install_windows(self, sensor_names: List[str], replies: List[Any]) -> List[str]:
+        """
+        Build windows from loaded replies, keeping any window installed concurrently meanwhile.
+        Returns binary-mode sensors that still have a legacy JSON queue to migrate first.
+        """
+        if self.window_mode == "time":
+            for sensor_name, raw_buckets in zip(sensor_names, replies):
+                if sensor_name not in self._windows:
+                    self._windows[sensor_name] = TimeWindowSketch.from_bucket_bytes(
+                        self.time_window_seconds, self.bucket_seconds, self.sketch_compression, raw_buckets
+                    )
+            return []
+
+        binary = self.window_encoding == "binary"
+        stride = 3 if binary else 2
+        to_migrate = []
+
+        for i, sensor_name in enumerate(sensor_names):
+            version, raw = replies[stride * i], replies[stride * i + 1]
+            if sensor_name in self._windows:
+                continue
+
+            if binary:
+                if raw is None and replies[stride * i + 2]:
+                    to_migrate.append(sensor_name)
+                    continue
+                points = unpack_points(raw)[-self.window_size:]
+                values, timestamps = points["value"], points["timestamp"]
+            else:
+                points = self._parse_queue_points(sensor_name, raw)
+                values = [dp["value"] for dp in points]
+                timestamps = [datetime.fromisoformat(dp["timestamp"]).timestamp() for dp in points]
+
+            self._windows[sensor_name] = SortedWindow(self.window_size, values, timestamps)
+            self._versions[sensor_name] = int(version or 0)
+
+        return to_migrate
+
+    def warm_windows(self) -> int:
+        """Load every sensor window present in Redis into memory, so the hot path makes no reads"""
+        if self.eval_mode != "local":
+            return 0
+
+        sensor_names = self.get_registered_sensors()
+        for i in range(0, len(sensor_names), 500):
+            self._load_windows(sensor_names[i:i + 500])
+        return len(sensor_names)
+
+    def _migrate_sensor_queue(self, sensor_name: str) -> bytes:
+        """Convert a sensor's JSON queue into a binary window and drop the list"""
+        packed = pack_json_points(self._get_sensor_queue_data(sensor_name))
+        packed = packed[-self.window_size * WINDOW_POINT_SIZE:]
+
+        # NX: never overwrite points already written in binary form
+        shard = self._shard_of(sensor_name)
+        pipe = shard.client.pipeline()
+        pipe.set(self._get_sensor_window_key(sensor_name), packed, nx=True)
+        pipe.delete(self._get_sensor_queue_key(sensor_name))
+        pipe.execute()
+        return shard.raw_client.get(self._get_sensor_window_key(sensor_name))
+
+    def migrate_json_windows(self) -> int:
+        """Convert every legacy JSON sensor queue to the binary window format"""
+        if self.window_encoding != "binary":
+            return 0
+
+        migrated = 0
+        pattern = AnomalyRedisKeys.PREFIX + ":temp:data:*:queue"
+        for shard in self.shards.values():
+            for key in shard.client.scan_iter(match=pattern, count=500):
+                sensor_name = AnomalyRedisKeys.sensor_from_temp_key(key)
+                self._migrate_sensor_queue(sensor_name)
+                self._invalidate_window(sensor_name)
+                migrated += 1
+        return migrated
+
     def _get_sensor_queue_data(self, sensor_name: str) -> List[Dict]:
         """Retrieve all data points for a specific sensor from Redis"""
         queue_key = self._get_sensor_queue_key(sensor_name)
-        data_json_list = self.redis_client.lrange(queue_key, 0, -1)
+        return self._parse_queue_points(sensor_name, self._shard_of(sensor_name).client.lrange(queue_key, 0, -1))
+
+    def _parse_queue_points(self, sensor_name: str, data_json_list: List[str]) -> List[Dict]:
+        """Decode the JSON points of a sensor queue, skipping malformed entries"""
         data_points = []
         
         for data_json in data_json_list:
@@ -108,11 +740,11 @@ class StatisticalAnomalyDetector:
                 
         return data_points
     
-    def _check_outlier(self, point_data: Dict, data: List[Dict]) -> Dict:
+    def _check_outlier(self, point_data: Dict, window: SortedWindow) -> Dict:
         """Check if the current point is an outlier using IQR method"""
         current_value = point_data["value"]
         
-        if len(data) < self.min_data_points:
+        if len(window) < self.min_data_points:
             # Not enough data, always return OK
             return {
                 "timestamp": point_data["timestamp"],
@@ -121,21 +753,19 @@ class StatisticalAnomalyDetector:
                 "alarm_type": "OK"
             }
 
-        values = [dp["value"] for dp in data]
-        q1 = np.percentile(values, 25)
-        q3 = np.percentile(values, 75)
+        q1 = window.percentile(25)
+        q3 = window.percentile(75)
         iqr = q3 - q1
 
         lower_bound = q1 - 1.5 * iqr
         upper_bound = q3 + 1.5 * iqr
         v = current_value
-        min_v, max_v = min(values), max(values)
 
         # Determine alarm type based on value position
         if v < lower_bound:
-            alarm_type = "Low-Low" if v < min_v else "Low"
+            alarm_type = "Low-Low" if v < window.min() else "Low"
         elif v > upper_bound:
-            alarm_type = "High-High" if v > max_v else "High"
+            alarm_type = "High-High" if v > window.max() else "High"
         elif v < q1:
             alarm_type = "Low"
         elif v > q3:
@@ -159,25 +789,74 @@ class StatisticalAnomalyDetector:
     def clear_all_data(self) -> bool:
         """Clear all sensor data - use with caution in production"""
         try:
-            pattern = AnomalyRedisKeys.PREFIX + ":temp:data:*:queue"
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                deleted_count = self.redis_client.delete(*keys)
-                print(f"Cleared {deleted_count} sensor queues")
+            deleted_count = 0
+            for shard in self.shards.values():
+                keys = [AnomalyRedisKeys.sensor_registry()]
+                for suffix in ("queue", "window", "version", "sketch"):
+                    keys += shard.client.scan_iter(match=AnomalyRedisKeys.PREFIX + f":temp:data:*:{suffix}", count=500)
+                deleted_count += shard.client.delete(*keys)
+            print(f"Cleared {deleted_count} sensor keys")
+            self._windows.clear()
+            self._versions.clear()
+            self._registered.clear()
             return True
         except Exception as e:
             print(f"Error clearing data: {e}")
             return False
 
-    def get_system_health(self) -> Dict[str, int]:
-        """Get queue lengths for all sensors - useful for monitoring"""
-        pattern = AnomalyRedisKeys.PREFIX + ":temp:data:*:queue"
-        keys = self.redis_client.keys(pattern)
+    def refresh_system_health(self) -> Dict[str, int]:
+        """Recompute window lengths for every registered sensor with one pipelined round trip per node"""
+        registry = self._registered_by_node()
+        pipes = self._pipelines(transaction=False)
+        sensor_names = []
+        for node, names in registry.items():
+            sensor_names += names
+            for sensor_name in names:
+                self._queue_length(pipes[node], sensor_name)
+        replies = pipes.execute()
+        lengths = [length for node in registry for length in replies.get(node, [])]
+
         health_info = {}
-        
-        for key in keys:
-            sensor_name = key.split(':')[1]  # Extract sensor name from key
-            queue_length = self.redis_client.llen(key)
-            health_info[sensor_name] = int(queue_length)  # Convert to native Python int
-        
-        return health_info
\ No newline at end of file
+        for sensor_name, length in zip(sensor_names, lengths):
+            if self.window_mode == "count" and self.window_encoding == "binary":
+                length = min(length // WINDOW_POINT_SIZE, self.window_size)
+            health_info[sensor_name] = int(length)  # Convert to native Python int
+
+        self._health_snapshot = health_info
+        self.health_updated_at = time.time()
+        return health_info
+
+    def _queue_length(self, pipe, sensor_name: str) -> None:
+        if self.window_mode == "time":
+            # Time windows report their number of live buckets
+            pipe.hlen(self._get_sensor_sketch_key(sensor_name))
+        elif self.window_encoding == "binary":
+            pipe.strlen(self._get_sensor_window_key(sensor_name))
+        else:
+            pipe.llen(self._get_sensor_queue_key(sensor_name))
+
+    def start_health_refresher(self, interval: float) -> None:
+        """Refresh the health snapshot every `interval` seconds in a daemon thread"""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        self._health_stop.clear()
+        self._health_thread = threading.Thread(
+            target=self._health_refresh_loop, args=(interval,), name="statistical-health", daemon=True
+        )
+        self._health_thread.start()
+
+    def stop_health_refresher(self) -> None:
+        self._health_stop.set()
+
+    def _health_refresh_loop(self, interval: float) -> None:
+        while not self._health_stop.wait(interval):
+            try:
+                self.refresh_system_health()
+            except Exception as e:
+                logger.error("Statistical health refresh failed", error=str(e))
+
+    def get_system_health(self) -> Dict[str, int]:
+        """Get queue lengths for all sensors from the latest snapshot - never touches Redis once refreshed"""
+        if self.health_updated_at is None:
+            return self.refresh_system_health()
+        return dict(self._health_snapshot)
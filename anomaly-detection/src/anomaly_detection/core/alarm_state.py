@@ -0,0 +1,156 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ..utils.redis_namespaces import AnomalyRedisKeys, AnomalyRedisTTL
+from ..utils.logging import get_logger
+
+"""
+AlarmStateTracker remembers the active alarm of every sensor for one detector, so LLM enrichment
+runs when a sensor's alarm type changes and later records of the same excursion reuse its summary.
+
+State is one Redis hash per sensor, anomaly:alerts:{detector}:{sensor} = {alarm_type, context, since},
+deleted when the sensor returns to OK. It is cached in-process: Redis is read once per sensor (the
+first time this process sees it) and written only on transitions, so sustained alarms and OK
+readings cost no round trips.
+"""
+
+logger = get_logger(__name__)
+
+# (alarm_type, context) of the active alarm; None when the sensor is OK
+AlarmState = Optional[Tuple[str, str]]
+
+
+def plan_enrichment(batch: List[Dict], states: Dict[str, AlarmState]) -> Tuple[Dict[Tuple[str, str], List], Dict[str, Optional[Tuple[str, str]]]]:
+    """
+    Walk the results of consecutive records against the alarm states they start from.
+    Results continuing a stored alarm get its context right away; the others are returned as
+    {(sensor, alarm_type): [results]} to summarize, with the transitions seen as {sensor: (sensor, alarm_type) or None for OK}.
+    Without alarm tracking pass empty states: every alarm is then a transition.
+    """
+    states = dict(states)
+    needed: Dict[Tuple[str, str], List] = {}
+    transitions: Dict[str, Optional[Tuple[str, str]]] = {}
+    for results in batch:
+        for sensor_name, result in results.items():
+            state = states.get(sensor_name)
+            if result.alarm_type == "OK":
+                if state is not None:
+                    states[sensor_name] = transitions[sensor_name] = None
+                continue
+            key = (sensor_name, result.alarm_type)
+            if state is not None and state[0] == result.alarm_type and state[1] is not None:
+                result.context = state[1]
+                continue
+            if state is None or state[0] != result.alarm_type:
+                # Context of a new alarm is only known once it is summarized
+                states[sensor_name] = (result.alarm_type, None)
+                transitions[sensor_name] = key
+            needed.setdefault(key, []).append(result)
+    return needed, transitions
+
+
+def settle_enrichment(needed: Dict[Tuple[str, str], List], transitions: Dict[str, Optional[Tuple[str, str]]],
+                      summaries: Dict[Tuple[str, str], Tuple[str, bool]]) -> Dict[str, AlarmState]:
+    """
+    Fill in the summarized contexts ({key: (context, settled)}) and return the alarm state changes to commit.
+    Alarms whose enrichment did not settle (LLM failure) are not recorded, so the next record retries.
+    """
+    for key, results in needed.items():
+        for result in results:
+            result.context = summaries[key][0]
+    return {
+        sensor_name: None if key is None else (key[1], summaries[key][0])
+        for sensor_name, key in transitions.items()
+        if key is None or summaries[key][1]
+    }
+
+
+class AlarmStateTracker:
+    def __init__(self, detector: str, redis_client, async_redis_client=None, ttl: int = AnomalyRedisTTL.ALERTS) -> None:
+        self.detector = detector
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.ttl = ttl
+        self._states: Dict[str, AlarmState] = {}
+
+    def _key(self, sensor_name: str) -> str:
+        return AnomalyRedisKeys.alert(f"{self.detector}:{sensor_name}")
+
+    @staticmethod
+    def _decode(entry: Dict[str, str]) -> AlarmState:
+        if not entry or not entry.get("alarm_type"):
+            return None
+        return entry["alarm_type"], entry.get("context", "")
+
+    def _queue_reads(self, pipe, sensor_names: Iterable[str]) -> list:
+        missing = [s for s in dict.fromkeys(sensor_names) if s not in self._states]
+        for sensor_name in missing:
+            pipe.hgetall(self._key(sensor_name))
+        return missing
+
+    def _install(self, missing: list, entries: list) -> None:
+        for sensor_name, entry in zip(missing, entries):
+            self._states.setdefault(sensor_name, self._decode(entry))
+
+    def lookup(self, sensor_names: Iterable[str]) -> Dict[str, AlarmState]:
+        """Current state of each sensor; sensors this process has not seen yet are read from Redis in one pipeline"""
+        sensor_names = list(sensor_names)
+        pipe = self.redis_client.pipeline(transaction=False)
+        missing = self._queue_reads(pipe, sensor_names)
+        if missing:
+            try:
+                self._install(missing, pipe.execute())
+            except Exception as e:
+                # Unknown state is treated as OK: the next alarm is enriched as a transition
+                logger.warning("Alarm state read failed", detector=self.detector, error=str(e))
+        return {s: self._states.get(s) for s in sensor_names}
+
+    async def alookup(self, sensor_names: Iterable[str]) -> Dict[str, AlarmState]:
+        sensor_names = list(sensor_names)
+        pipe = self.async_redis_client.pipeline(transaction=False)
+        missing = self._queue_reads(pipe, sensor_names)
+        if missing:
+            try:
+                self._install(missing, await pipe.execute())
+            except Exception as e:
+                logger.warning("Alarm state read failed", detector=self.detector, error=str(e))
+        return {s: self._states.get(s) for s in sensor_names}
+
+    def _queue_writes(self, pipe, changes: Dict[str, AlarmState]) -> None:
+        now = time.time()
+        for sensor_name, state in changes.items():
+            self._states[sensor_name] = state
+            key = self._key(sensor_name)
+            if state is None:
+                pipe.delete(key)
+            else:
+                pipe.hset(key, mapping={"alarm_type": state[0], "context": state[1], "since": now})
+                pipe.expire(key, self.ttl)
+
+    def commit(self, changes: Dict[str, AlarmState]) -> None:
+        """Record alarm transitions ({sensor: new state}) in the cache and in Redis"""
+        if not changes:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._queue_writes(pipe, changes)
+        try:
+            pipe.execute()
+        except Exception as e:
+            logger.error("Alarm state write failed", detector=self.detector, error=str(e))
+
+    async def acommit(self, changes: Dict[str, AlarmState]) -> None:
+        if not changes:
+            return
+        pipe = self.async_redis_client.pipeline(transaction=False)
+        self._queue_writes(pipe, changes)
+        try:
+            await pipe.execute()
+        except Exception as e:
+            logger.error("Alarm state write failed", detector=self.detector, error=str(e))
+
+    def clear(self) -> None:
+        """Forget every stored alarm, e.g. after the alarm context changed, so active alarms are re-enriched"""
+        self._states.clear()
+        keys = list(self.redis_client.scan_iter(match=self._key("*"), count=1000))
+        if keys:
+            self.redis_client.delete(*keys)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+"""
+EnrichmentRunner summarizes all the alarms of a request concurrently under one deadline.
+
+Each alarm is summarized by the detector's (context, settled) callable; alarms still running when
+the deadline expires get the detector's fallback (the raw Cause/Actions context) and are left
+unsettled, so they are enriched again on a later record. Sync calls that overran keep running in
+the pool and still fill the LLM cache; async waiters are cancelled, which leaves a shared cached
+call running for the others.
+"""
+
+Summary = Tuple[str, bool]
+
+
+class EnrichmentRunner:
+    def __init__(self, deadline: Optional[float] = None, max_workers: int = 16) -> None:
+        # Seconds allowed for the enrichment of one request; None or 0 waits for every summary
+        self.deadline = deadline or None
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"summaries": 0, "timed_out": 0}
+
+    def __getstate__(self) -> dict:
+        # Detectors are pickled into backfill worker processes; the pool is recreated on use there
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-enrichment")
+            return self._executor
+
+    def run(self, keys: Iterable[Hashable], summarize: Callable[..., Summary],
+            fallback: Callable[..., Summary]) -> Dict[Hashable, Summary]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        self.stats["summaries"] += len(keys)
+        if len(keys) == 1 and self.deadline is None:
+            return {keys[0]: summarize(*keys[0])}
+
+        futures = {key: self._pool().submit(summarize, *key) for key in keys}
+        wait(futures.values(), timeout=self.deadline)
+        summaries = {}
+        for key, future in futures.items():
+            if future.done():
+                summaries[key] = future.result()
+            else:
+                self.stats["timed_out"] += 1
+                summaries[key] = fallback(*key)
+        return summaries
+
+    async def arun(self, keys: Iterable[Hashable], asummarize: Callable[..., Awaitable[Summary]],
+                   fallback: Callable[..., Summary]) -> Dict[Hashable, Summary]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        self.stats["summaries"] += len(keys)
+        tasks = {key: asyncio.ensure_future(asummarize(*key)) for key in keys}
+        _, pending = await asyncio.wait(tasks.values(), timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        summaries = {}
+        for key, task in tasks.items():
+            if task in pending:
+                self.stats["timed_out"] += 1
+                summaries[key] = fallback(*key)
+            else:
+                summaries[key] = task.result()
+        return summaries
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,241 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+"""
+ModelRegistry keeps versioned, pickle-free ML models under ml_model_path:
+
+    ml_model_path/
+        ACTIVE                      {"version": str, "previous": [str, ...], "legacy_digest": str},
+                                    replaced atomically
+        versions/{version}/
+            weights.npy, bias.npy   the scaler and PCA folded into residual = x @ weights + bias
+            model.json              features, threshold and metadata
+        scaler.pkl, pca.pkl, threshold.pkl, features.json
+                                    legacy sklearn artifacts, imported as a new version when they change;
+                                    ACTIVE keeps the digest of the last import, which pruning never removes
+
+Versions are written to a temporary directory and renamed into place, so they are complete or
+absent. The arrays are memory-mapped read-only, so every worker process on a host shares one copy
+in the page cache, and serving needs neither sklearn nor pickle. Promotion and rollback replace
+the ACTIVE pointer, which the detectors' hot reload watches; mutations are serialized by an
+flock on ml_model_path/.lock.
+"""
+
+LEGACY_ARTIFACTS = ("scaler.pkl", "pca.pkl", "threshold.pkl", "features.json")
+
+# Previous active versions kept for rollback
+HISTORY = 10
+
+
+def fold_pipeline(scaler, pca, features: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fold a fitted per-feature scaler and PCA into one affine map from raw features to the
+    reconstruction residual.
+
+    The scalers are per-feature affine, z = x * a + b, and the PCA reconstruction of z is
+    mean + (z - mean) C^T C whether or not it whitens, so the residual z - reconstruction is
+    (z - mean)(I - C^T C) = x @ weights + bias.
+    """
+    import pandas as pd
+
+    def scale(X: np.ndarray) -> np.ndarray:
+        return np.asarray(scaler.transform(pd.DataFrame(X, columns=features)), dtype=float)
+
+    n_features = len(features)
+    offset = scale(np.zeros((1, n_features)))[0]
+    slope = scale(np.ones((1, n_features)))[0] - offset
+    components = np.asarray(pca.components_, dtype=float)
+    residual = np.eye(n_features) - components.T @ components
+    weights = np.ascontiguousarray(slope[:, None] * residual)
+    bias = (offset - pca.mean_) @ residual
+    return weights, bias
+
+
+class ModelRegistry:
+    POINTER = "ACTIVE"
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self.versions_dir = self.root / "versions"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_pointer(self) -> Dict[str, Any]:
+        try:
+            with open(self.root / self.POINTER, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": None, "previous": []}
+
+    def _write_pointer(self, pointer: Dict[str, Any]) -> None:
+        tmp_path = self.root / f"{self.POINTER}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(pointer, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.root / self.POINTER)
+
+    def active_version(self) -> Optional[str]:
+        return self._read_pointer().get("version")
+
+    def _path(self, version: str) -> Path:
+        if not version or version.startswith(".") or os.sep in version or "/" in version:
+            raise ValueError(f"Invalid model version {version!r}")
+        return self.versions_dir / version
+
+    def metadata(self, version: str) -> Dict[str, Any]:
+        with open(self._path(version) / "model.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Metadata of every published version, oldest first"""
+        if not self.versions_dir.is_dir():
+            return []
+        found = []
+        for path in self.versions_dir.iterdir():
+            if path.is_dir() and not path.name.startswith(".") and (path / "model.json").exists():
+                found.append(self.metadata(path.name))
+        return sorted(found, key=lambda meta: meta["created_at"])
+
+    @staticmethod
+    def digest(weights: np.ndarray, bias: np.ndarray, threshold: float, features: List[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(weights, dtype=float).tobytes())
+        digest.update(np.ascontiguousarray(bias, dtype=float).tobytes())
+        digest.update(json.dumps([float(threshold), list(features)]).encode("utf-8"))
+        return digest.hexdigest()
+
+    def publish(self, weights: np.ndarray, bias: np.ndarray, threshold: float, features: List[str],
+                **metadata: Any) -> str:
+        """Store a model as a new version (not promoted); an identical model returns its existing version"""
+        digest = self.digest(weights, bias, threshold, features)
+        with self._locked():
+            for meta in self.versions():
+                if meta["digest"] == digest:
+                    return meta["version"]
+
+            created_at = time.time()
+            version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(created_at))}-{digest[:8]}"
+            tmp_dir = self.versions_dir / f".tmp-{uuid.uuid4().hex}"
+            tmp_dir.mkdir(parents=True)
+            try:
+                np.save(tmp_dir / "weights.npy", np.ascontiguousarray(weights, dtype=float))
+                np.save(tmp_dir / "bias.npy", np.ascontiguousarray(bias, dtype=float))
+                meta = {
+                    **metadata,
+                    "version": version,
+                    "digest": digest,
+                    "created_at": created_at,
+                    "threshold": float(threshold),
+                    "features": list(features),
+                }
+                with open(tmp_dir / "model.json", "w", encoding="utf-8") as f:
+                    json.dump(meta, f, indent=2)
+                os.rename(tmp_dir, self.versions_dir / version)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        return version
+
+    def load(self, version: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Memory-mapped (weights, bias) and the metadata of `version`"""
+        path = self._path(version)
+        weights = np.load(path / "weights.npy", mmap_mode="r")
+        bias = np.load(path / "bias.npy", mmap_mode="r")
+        meta = self.metadata(version)
+        n_features = len(meta["features"])
+        if weights.shape != (n_features, n_features) or bias.shape != (n_features,):
+            raise ValueError(f"Model version {version} is corrupt: arrays do not match its {n_features} features")
+        return weights, bias, meta
+
+    def promote(self, version: str) -> Dict[str, Any]:
+        """Make `version` the active model; the current one is kept for rollback"""
+        if not (self._path(version) / "model.json").exists():
+            raise ValueError(f"Unknown model version {version}")
+        with self._locked():
+            pointer = self._read_pointer()
+            if pointer.get("version") != version:
+                previous = [pointer["version"]] if pointer.get("version") else []
+                previous += [v for v in pointer.get("previous", []) if v != version]
+                pointer = {**pointer, "version": version, "previous": previous[:HISTORY]}
+                self._write_pointer(pointer)
+        return pointer
+
+    def rollback(self) -> Dict[str, Any]:
+        """Make the previously active version active again"""
+        with self._locked():
+            pointer = self._read_pointer()
+            if not pointer.get("previous"):
+                raise ValueError("No previous model version to roll back to")
+            pointer = {**pointer, "version": pointer["previous"][0], "previous": pointer["previous"][1:]}
+            self._write_pointer(pointer)
+        return pointer
+
+    def prune(self, keep: int) -> List[str]:
+        """Delete the oldest versions beyond `keep`, never the active one or its rollback history"""
+        with self._locked():
+            pointer = self._read_pointer()
+            protected = {pointer.get("version"), *pointer.get("previous", [])}
+            candidates = [meta["version"] for meta in self.versions() if meta["version"] not in protected]
+            removed = candidates[:max(0, len(candidates) - max(0, keep - len(protected - {None})))]
+            for version in removed:
+                shutil.rmtree(self._path(version), ignore_errors=True)
+        return removed
+
+    def import_legacy(self) -> Optional[str]:
+        """
+        Publish the sklearn artifacts in ml_model_path as a version if they are not published yet.
+        Returns the new version, or None when there are no legacy artifacts or they are unchanged.
+        """
+        if not all((self.root / name).exists() for name in LEGACY_ARTIFACTS):
+            return None
+        source_digest = hashlib.sha256()
+        for name in LEGACY_ARTIFACTS:
+            source_digest.update((self.root / name).read_bytes())
+        source_digest = source_digest.hexdigest()
+        # Checked against ACTIVE first: the imported version itself may have been pruned since
+        if self._read_pointer().get("legacy_digest") == source_digest:
+            return None
+        if any(meta.get("source_digest") == source_digest for meta in self.versions()):
+            self._record_legacy_import(source_digest)
+            return None
+
+        import joblib
+
+        scaler = joblib.load(self.root / "scaler.pkl")
+        pca = joblib.load(self.root / "pca.pkl")
+        threshold = joblib.load(self.root / "threshold.pkl")
+        with open(self.root / "features.json", "r") as f:
+            features = json.load(f)
+        weights, bias = fold_pipeline(scaler, pca, features)
+        version = self.publish(
+            weights, bias, float(threshold), features,
+            source="legacy", source_digest=source_digest,
+            pca_components=int(pca.n_components_), scaler_type=type(scaler).__name__
+        )
+        self._record_legacy_import(source_digest)
+        return version
+
+    def _record_legacy_import(self, source_digest: str) -> None:
+        with self._locked():
+            pointer = self._read_pointer()
+            if pointer.get("legacy_digest") != source_digest:
+                self._write_pointer({**pointer, "legacy_digest": source_digest})
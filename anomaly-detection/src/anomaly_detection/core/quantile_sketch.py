@@ -0,0 +1,222 @@
+from typing import Dict, List, Optional, Tuple
+import math
+import numpy as np
+
+"""
+Bounded-memory quantile sketches for time-based statistical windows.
+
+TDigest is a merging t-digest: values are buffered, then folded into weighted centroids whose
+size is bounded by the k1 scale function, so tails stay precise and a digest holds about
+compression / 2 centroids however many points it has seen. Digests merge by pooling centroids.
+
+TimeWindowSketch keeps one TDigest per time bucket of a sensor and answers percentile / min /
+max over the buckets inside the horizon, duck-typing SortedWindow for the IQR check.
+"""
+
+_HEADER_SIZE = 4  # compression, count, min, max as float64, followed by (mean, weight) pairs
+
+
+def _merge_centroids(means: np.ndarray, weights: np.ndarray, compression: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort centroids and fold neighbours that share one unit of the k1 scale"""
+    order = np.argsort(means, kind="mergesort")
+    means, weights = means[order], weights[order]
+    cumulative = np.cumsum(weights)
+    q_mid = (cumulative - weights / 2) / cumulative[-1]
+    k = compression / (2 * math.pi) * np.arcsin(2 * q_mid - 1)
+    groups = np.floor(k - k[0]).astype(np.int64)
+
+    merged_weights = np.bincount(groups, weights=weights)
+    merged_sums = np.bincount(groups, weights=means * weights)
+    used = merged_weights > 0
+    return merged_sums[used] / merged_weights[used], merged_weights[used]
+
+
+def _interpolate(means: np.ndarray, weights: np.ndarray, minimum: float, maximum: float, q: float) -> float:
+    """
+    Quantile of sorted centroids. Each centroid sits at the middle of the ranks it covers and
+    ranks are interpolated linearly, so all-singleton digests match np.percentile (linear).
+    """
+    n = weights.sum()
+    if n == 0:
+        return math.nan
+    centers = np.cumsum(weights) - (weights + 1) / 2
+    ranks = np.concatenate(([0.0], centers, [n - 1]))
+    values = np.concatenate(([minimum], means, [maximum]))
+    return float(np.interp((n - 1) * q, ranks, values))
+
+
+class TDigest:
+    """Mergeable t-digest over float values; NaN values are ignored."""
+
+    def __init__(self, compression: float = 100.0) -> None:
+        self.compression = compression
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer: List[float] = []
+        self._buffer_limit = int(5 * compression)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        if math.isnan(value):
+            return
+        self._buffer.append(value)
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self._buffer_limit:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        """Fold another digest into this one"""
+        means, weights = other.centroids()
+        if not len(weights):
+            return
+        self._means = np.concatenate((self._means, means))
+        self._weights = np.concatenate((self._weights, weights))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _compress(self) -> None:
+        self._means, self._weights = self.centroids(compress=True)
+        self._buffer = []
+
+    def centroids(self, compress: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted (means, weights); buffered values are singletons unless `compress`"""
+        means = np.concatenate((self._means, self._buffer))
+        weights = np.concatenate((self._weights, np.ones(len(self._buffer))))
+        if not len(weights):
+            return means, weights
+        if compress:
+            return _merge_centroids(means, weights, self.compression)
+        order = np.argsort(means, kind="mergesort")
+        return means[order], weights[order]
+
+    def percentile(self, q: float) -> float:
+        """Estimated percentile, q in [0, 100]"""
+        means, weights = self.centroids()
+        return _interpolate(means, weights, self.min, self.max, q / 100)
+
+    def to_bytes(self) -> bytes:
+        """Compressed little-endian float64 encoding"""
+        means, weights = self.centroids(compress=bool(self._buffer))
+        header = np.array([self.compression, self.count, self.min, self.max], dtype="<f8")
+        pairs = np.column_stack((means, weights)).astype("<f8").ravel()
+        return header.tobytes() + pairs.tobytes()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "TDigest":
+        data = np.frombuffer(raw, dtype="<f8")
+        digest = cls(float(data[0]))
+        digest.count = int(data[1])
+        digest.min, digest.max = float(data[2]), float(data[3])
+        pairs = data[_HEADER_SIZE:].reshape(-1, 2)
+        digest._means = pairs[:, 0].copy()
+        digest._weights = pairs[:, 1].copy()
+        return digest
+
+
+class TimeWindowSketch:
+    """
+    Quantiles over the last `horizon_seconds` of a sensor, as one TDigest per bucket.
+
+    - append: O(1) amortized, into the bucket of the point's timestamp
+    - expire: drops buckets that fell out of the horizon of a newer timestamp
+    - percentile / min / max: over every bucket in the horizon; the merge of all buckets but
+      the newest is cached, so a query only folds in the bucket being written
+
+    The horizon has bucket granularity: a point leaves the window with its whole bucket.
+    """
+
+    def __init__(self, horizon_seconds: float, bucket_seconds: float, compression: float = 100.0,
+                 buckets: Optional[Dict[int, TDigest]] = None) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, math.ceil(horizon_seconds / bucket_seconds))
+        self.compression = compression
+        self._buckets: Dict[int, TDigest] = dict(buckets or {})
+        self._newest = max(self._buckets) if self._buckets else None
+        self._closed: Optional[TDigest] = None
+        self._view: Optional[Tuple[np.ndarray, np.ndarray, float, float]] = None
+
+    def __len__(self) -> int:
+        return sum(digest.count for digest in self._buckets.values())
+
+    def bucket_id(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def expire(self, timestamp: float) -> List[int]:
+        """Advance the horizon to `timestamp`; returns the ids of the dropped buckets"""
+        bucket_id = self.bucket_id(timestamp)
+        if self._newest is not None and bucket_id <= self._newest:
+            return []
+        self._newest = bucket_id
+        expired = [b for b in self._buckets if b <= bucket_id - self.bucket_count]
+        for b in expired:
+            del self._buckets[b]
+        self._closed = None
+        self._view = None
+        return expired
+
+    def append(self, value: float, timestamp: float) -> Optional[int]:
+        """Add a point; returns its bucket id, or None when it is older than the horizon"""
+        self.expire(timestamp)
+        bucket_id = self.bucket_id(timestamp)
+        if bucket_id <= self._newest - self.bucket_count:
+            return None
+        if bucket_id != self._newest:
+            # Late point into an already closed bucket
+            self._closed = None
+        self._buckets.setdefault(bucket_id, TDigest(self.compression)).add(value)
+        self._view = None
+        return bucket_id
+
+    def bucket_bytes(self, bucket_id: int) -> bytes:
+        return self._buckets[bucket_id].to_bytes()
+
+    def _centroids(self) -> Tuple[np.ndarray, np.ndarray, float, float]:
+        if self._view is None:
+            if self._closed is None:
+                self._closed = TDigest(self.compression)
+                for b, digest in self._buckets.items():
+                    if b != self._newest:
+                        self._closed.merge(digest)
+
+            current = self._buckets.get(self._newest)
+            if current is None:
+                means, weights = self._closed.centroids()
+                self._view = (means, weights, self._closed.min, self._closed.max)
+            else:
+                closed_means, closed_weights = self._closed.centroids()
+                current_means, current_weights = current.centroids()
+                means = np.concatenate((closed_means, current_means))
+                weights = np.concatenate((closed_weights, current_weights))
+                order = np.argsort(means, kind="mergesort")
+                self._view = (
+                    means[order], weights[order],
+                    min(self._closed.min, current.min), max(self._closed.max, current.max)
+                )
+        return self._view
+
+    def percentile(self, q: float) -> float:
+        means, weights, minimum, maximum = self._centroids()
+        return _interpolate(means, weights, minimum, maximum, q / 100)
+
+    def min(self) -> float:
+        return self._centroids()[2]
+
+    def max(self) -> float:
+        return self._centroids()[3]
+
+    @classmethod
+    def from_bucket_bytes(cls, horizon_seconds: float, bucket_seconds: float, compression: float,
+                          raw_buckets: Dict) -> "TimeWindowSketch":
+        """Rebuild from a {bucket id: TDigest bytes} mapping, e.g. an HGETALL reply"""
+        buckets = {int(b): TDigest.from_bytes(raw) for b, raw in raw_buckets.items()}
+        return cls(horizon_seconds, bucket_seconds, compression, buckets)
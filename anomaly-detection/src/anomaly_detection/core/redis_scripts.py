@@ -0,0 +1,178 @@
+"""
+Lua scripts executed server-side by the statistical detector.
+
+STATISTICAL_EVALUATE evaluates a whole multi-sensor record in one EVALSHA call:
+for every sensor it reads the window, computes the IQR bounds on the previous points,
+appends the new point, trims the window and bumps its version, all atomically.
+
+    KEYS[2i - 1]   sensor window key (JSON list ":queue" or binary string ":window")
+    KEYS[2i]       sensor window version counter (":version")
+    ARGV[1]        window size
+    ARGV[2]        minimum data points before alarms are raised
+    ARGV[1 + 2i]   new value of sensor i, as repr(float)
+    ARGV[2 + 2i]   new point of sensor i (JSON string or 16-byte packed record), appended as-is
+
+Returns the alarm type of each sensor, in record order.
+STATISTICAL_EVALUATE works on JSON lists, STATISTICAL_EVALUATE_BINARY on packed windows.
+The percentile and alarm logic mirror SortedWindow and StatisticalAnomalyDetector._check_outlier.
+
+STATISTICAL_EVALUATE_BINARY takes a third key per sensor, KEYS[3i], the legacy JSON ":queue"
+of the sensor. If any sensor has no binary window yet but still has a legacy queue, the script
+changes nothing and returns {'MIGRATE', i, ...}, the indexes of those sensors; the caller
+converts their queues and evaluates the record again, so the startup migration is optional.
+
+WINDOW_APPEND appends one packed record to a binary window (KEYS[1]) and trims it to
+ARGV[2] bytes; WINDOW_APPEND_JSON appends one JSON point to a list window and trims it to
+ARGV[2] points. Both compare the version counter (KEYS[2]) with ARGV[3] first, the version
+the writer's cached window is at: on a mismatch another writer appended meanwhile, and they
+return {0, version} without appending. Otherwise, or when ARGV[3] is empty, they append and
+return {1, incremented version}.
+"""
+
+_CLASSIFY = """
+local window_size = tonumber(ARGV[1])
+local min_points = tonumber(ARGV[2])
+
+local function percentile(sorted, n, q)
+    local virtual = (n - 1) * q
+    if virtual >= n - 1 then
+        return sorted[n]
+    end
+    local previous = math.floor(virtual)
+    local gamma = virtual - previous
+    local a = sorted[previous + 1]
+    local b = sorted[previous + 2]
+    local diff_b_a = b - a
+    if gamma >= 0.5 then
+        return b - diff_b_a * (1 - gamma)
+    end
+    return a + diff_b_a * gamma
+end
+
+local function classify(v, values, count, has_nan)
+    if count < min_points or has_nan or v == nil or v ~= v then
+        return 'OK'
+    end
+    table.sort(values)
+    local n = #values
+    local q1 = percentile(values, n, 0.25)
+    local q3 = percentile(values, n, 0.75)
+    local iqr = q3 - q1
+    local lower_bound = q1 - 1.5 * iqr
+    local upper_bound = q3 + 1.5 * iqr
+
+    if v < lower_bound then
+        if v < values[1] then return 'Low-Low' end
+        return 'Low'
+    elseif v > upper_bound then
+        if v > values[n] then return 'High-High' end
+        return 'High'
+    elseif v < q1 then
+        return 'Low'
+    elseif v > q3 then
+        return 'High'
+    end
+    return 'OK'
+end
+"""
+
+STATISTICAL_EVALUATE = _CLASSIFY + """
+local alarm_types = {}
+for i = 1, #KEYS / 2 do
+    local key = KEYS[2 * i - 1]
+    local v = tonumber(ARGV[1 + 2 * i])
+    local point = ARGV[2 + 2 * i]
+
+    local values = {}
+    local count = 0
+    local has_nan = false
+    for _, item in ipairs(redis.call('LRANGE', key, 0, -1)) do
+        local ok, dp = pcall(cjson.decode, item)
+        if ok and type(dp) == 'table' and type(dp.value) == 'number' then
+            count = count + 1
+            if dp.value ~= dp.value then
+                has_nan = true
+            else
+                values[#values + 1] = dp.value
+            end
+        end
+    end
+
+    alarm_types[i] = classify(v, values, count, has_nan)
+
+    redis.call('RPUSH', key, point)
+    redis.call('LTRIM', key, -window_size, -1)
+    redis.call('INCR', KEYS[2 * i])
+end
+
+return alarm_types
+"""
+
+STATISTICAL_EVALUATE_BINARY = _CLASSIFY + """
+local max_bytes = window_size * 16
+
+local legacy = {'MIGRATE'}
+for i = 1, #KEYS / 3 do
+    if redis.call('EXISTS', KEYS[3 * i - 2]) == 0 and redis.call('EXISTS', KEYS[3 * i]) == 1 then
+        legacy[#legacy + 1] = i
+    end
+end
+if #legacy > 1 then
+    return legacy
+end
+
+local alarm_types = {}
+for i = 1, #KEYS / 3 do
+    local key = KEYS[3 * i - 2]
+    local v = tonumber(ARGV[1 + 2 * i])
+    local point = ARGV[2 + 2 * i]
+
+    local window = redis.call('GET', key) or ''
+    local values = {}
+    local count = 0
+    local has_nan = false
+    local first = math.max(0, #window - max_bytes)
+    first = first - first % 16
+    for pos = first + 9, #window - 7, 16 do
+        local x = struct.unpack('<d', window, pos)
+        count = count + 1
+        if x ~= x then
+            has_nan = true
+        else
+            values[#values + 1] = x
+        end
+    end
+
+    alarm_types[i] = classify(v, values, count, has_nan)
+
+    local length = redis.call('APPEND', key, point)
+    if length > max_bytes then
+        redis.call('SET', key, redis.call('GETRANGE', key, length - max_bytes, -1))
+    end
+    redis.call('INCR', KEYS[3 * i - 1])
+end
+
+return alarm_types
+"""
+
+_CHECK_VERSION = """
+local version = tonumber(redis.call('GET', KEYS[2]) or '0')
+if ARGV[3] ~= '' and version ~= tonumber(ARGV[3]) then
+    return {0, version}
+end
+"""
+
+WINDOW_APPEND = _CHECK_VERSION + """
+local length = redis.call('APPEND', KEYS[1], ARGV[1])
+local max_bytes = tonumber(ARGV[2])
+if length > max_bytes then
+    redis.call('SET', KEYS[1], redis.call('GETRANGE', KEYS[1], length - max_bytes, -1))
+end
+return {1, redis.call('INCR', KEYS[2])}
+"""
+
+WINDOW_APPEND_JSON = _CHECK_VERSION + """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+return {1, redis.call('INCR', KEYS[2])}
+"""
@@ -0,0 +1,124 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+import math
+import numpy as np
+
+"""
+RingBuffer is a fixed-capacity, array-backed FIFO of (timestamp, value) points.
+SortedWindow layers a sorted view on top of it so order statistics are answered
+without re-sorting as values are inserted and evicted.
+"""
+
+class RingBuffer:
+    """Preallocated float64 ring of (epoch timestamp, value) points, oldest first."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._timestamps = np.full(capacity, np.nan)
+        self._values = np.empty(capacity)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float, timestamp: float = math.nan) -> Optional[float]:
+        """Store a point, returning the evicted value when the buffer was full."""
+        evicted = None
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            slot = self._start
+            evicted = float(self._values[slot])
+            self._start = (self._start + 1) % self.capacity
+        self._values[slot] = value
+        self._timestamps[slot] = timestamp
+        return evicted
+
+    def _ordered(self, array: np.ndarray) -> np.ndarray:
+        return np.roll(array, -self._start)[:self._size]
+
+    def values(self) -> np.ndarray:
+        return self._ordered(self._values)
+
+    def timestamps(self) -> np.ndarray:
+        return self._ordered(self._timestamps)
+
+
+class SortedWindow:
+    """
+    Sliding window over the last `capacity` values of a sensor.
+
+    - append: evicts the oldest value once full, O(log n) search per insert/evict
+    - percentile: same result as np.percentile(values, q) (method="linear")
+    - min / max: O(1)
+
+    NaN values occupy a slot in the window but are kept out of the sorted list;
+    while any NaN is in the window every percentile is NaN, like numpy.
+    """
+
+    def __init__(self, capacity: int, values: Iterable[float] = (), timestamps: Optional[Iterable[float]] = None) -> None:
+        self.capacity = capacity
+        self._ring = RingBuffer(capacity)
+        self._sorted: list = []
+        self._nan_count = 0
+        if timestamps is None:
+            for value in values:
+                self.append(value)
+        else:
+            for value, timestamp in zip(values, timestamps):
+                self.append(value, timestamp)
+
+    def __len__(self) -> int:
+        return len(self._ring)
+
+    def append(self, value: float, timestamp: float = math.nan) -> None:
+        """Insert a new value, evicting the oldest one when the window is full."""
+        value = float(value)
+        evicted = self._ring.append(value, timestamp)
+        if evicted is not None:
+            self._discard(evicted)
+        if math.isnan(value):
+            self._nan_count += 1
+        else:
+            insort(self._sorted, value)
+
+    def _discard(self, value: float) -> None:
+        if math.isnan(value):
+            self._nan_count -= 1
+        else:
+            del self._sorted[bisect_left(self._sorted, value)]
+
+    def percentile(self, q: float) -> float:
+        """Linear-interpolated percentile, bit-identical to np.percentile."""
+        n = len(self._ring)
+        if self._nan_count:
+            return math.nan
+
+        virtual = (n - 1) * (q / 100)
+        if virtual >= n - 1:
+            return self._sorted[-1]
+        previous = math.floor(virtual)
+        gamma = virtual - previous
+        a = self._sorted[previous]
+        b = self._sorted[previous + 1]
+
+        # Mirrors numpy's _lerp, which switches formula at gamma >= 0.5
+        diff_b_a = b - a
+        if gamma >= 0.5:
+            return b - diff_b_a * (1 - gamma)
+        return a + diff_b_a * gamma
+
+    def min(self) -> float:
+        return self._sorted[0]
+
+    def max(self) -> float:
+        return self._sorted[-1]
+
+    def values(self) -> np.ndarray:
+        """Window contents in insertion order (oldest first)."""
+        return self._ring.values()
+
+    def timestamps(self) -> np.ndarray:
+        return self._ring.timestamps()
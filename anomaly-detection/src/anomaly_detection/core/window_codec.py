@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Dict, List
+import numpy as np
+
+"""
+Compact binary encoding of sensor windows.
+
+A window is a single Redis string of fixed-size little-endian records
+(epoch timestamp as float64, value as float64), oldest first. Appending a point is a
+Redis APPEND and reading a window is one GET decoded with np.frombuffer, no parsing.
+"""
+
+WINDOW_POINT_DTYPE = np.dtype([("timestamp", "<f8"), ("value", "<f8")])
+WINDOW_POINT_SIZE = WINDOW_POINT_DTYPE.itemsize
+
+
+def pack_point(timestamp: datetime, value: float) -> bytes:
+    """Encode one point as a 16-byte record."""
+    return np.array([(timestamp.timestamp(), value)], dtype=WINDOW_POINT_DTYPE).tobytes()
+
+
+def pack_json_points(points: List[Dict]) -> bytes:
+    """Encode JSON-format points ({"timestamp": iso, "value": float}) for migration."""
+    records = [(datetime.fromisoformat(dp["timestamp"]).timestamp(), float(dp["value"])) for dp in points]
+    return np.array(records, dtype=WINDOW_POINT_DTYPE).tobytes()
+
+
+def unpack_points(raw: bytes) -> np.ndarray:
+    """Decode a window into a structured array with "timestamp" and "value" fields."""
+    if not raw:
+        return np.empty(0, dtype=WINDOW_POINT_DTYPE)
+    # Ignore a torn trailing record rather than failing the whole window
+    usable = len(raw) - len(raw) % WINDOW_POINT_SIZE
+    return np.frombuffer(raw, dtype=WINDOW_POINT_DTYPE, count=usable // WINDOW_POINT_SIZE)
@@ -1,13 +1,23 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
+import asyncio
+import hashlib
 import json
+from contextlib import contextmanager
+from contextvars import ContextVar
 from openai import OpenAI
 from ..config.settings import settings
-from openai import AzureOpenAI, OpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI, AsyncOpenAI, OpenAI
+from .llm_cache import SummaryCache
+from .llm_gateway import GatewayRejected, LLMGateway
+from .summary_catalog import SummaryCatalog
 
 """
 LLM is a utility class to interact with OpenAI's language models for summarization.
 """
 
+# Summaries of the current request, shared by the detectors enriching it (see LLM.shared_summaries)
+_shared_summaries: ContextVar[Optional[Dict[str, asyncio.Future]]] = ContextVar("shared_summaries", default=None)
+
 class LLM:
     #def __init__(self, *, enabled: bool = True):
         #self.model = settings.openai_model
@@ -15,11 +25,30 @@ class LLM:
         #if self.enabled:
         #    self.client = OpenAI(api_key=settings.openai_api_key)
 
-    def __init__(self, *, enabled: bool = True):
+    def __init__(self, *, enabled: bool = True, cache: Optional[SummaryCache] = None,
+                 catalog: Optional[SummaryCatalog] = None, gateway: Optional[LLMGateway] = None):
         self.enabled = enabled
+        self.stats = {"shared": 0}
+        # Bounds, budgets and circuit-breaks every completion request
+        self.gateway = gateway or LLMGateway()
+        # Summaries depend only on their inputs, so they are cached and concurrent identical calls coalesced
+        self.cache = cache
+        # Precomputed summaries served before any live call; requests missing from it fall back to the LLM
+        self.catalog = catalog
         if not self.enabled:
             self.model = None
             self.client = None
+            self.async_client = None
+            return
+
+        # Fail fast instead of retrying: an outage is handled by the gateway's circuit breaker
+        client_options = {"timeout": settings.llm_request_timeout, "max_retries": settings.llm_max_retries}
+
+        if settings.llm_base_url:
+            # Any OpenAI-compatible server, e.g. a local stub for testing
+            self.client = OpenAI(base_url=settings.llm_base_url, api_key=settings.azure_openai_api_key or "none", **client_options)
+            self.async_client = AsyncOpenAI(base_url=settings.llm_base_url, api_key=settings.azure_openai_api_key or "none", **client_options)
+            self.model = settings.azure_openai_deployment or settings.azure_openai_model
             return
 
         if not (settings.azure_openai_api_key and settings.azure_openai_endpoint and settings.azure_openai_deployment):
@@ -29,6 +58,15 @@ class LLM:
             api_version=settings.azure_openai_api_version,
             azure_endpoint=settings.azure_openai_endpoint,
             api_key=settings.azure_openai_api_key,
+            **client_options,
+        )
+
+        # Used by asummarize so async endpoints never block on OpenAI
+        self.async_client = AsyncAzureOpenAI(
+            api_version=settings.azure_openai_api_version,
+            azure_endpoint=settings.azure_openai_endpoint,
+            api_key=settings.azure_openai_api_key,
+            **client_options,
         )
 
         self.model = settings.azure_openai_deployment or settings.azure_openai_model
@@ -36,29 +74,123 @@ class LLM:
 
 
 
+    SYSTEM_MSG = (
+            "You are a monitoring assistant. Convert the following alarm JSON into a clear, "
+            "concise summary using plain text only. Write in simple sentences without any "
+            "markdown formatting, bullet points, bold text, or special characters. "
+    )
+
+    TEMPERATURE = 0.2
+    MAX_TOKENS = 200
+
+    def _messages(self, var: str, alarm_type: str, context: Dict[str, Any]) -> list:
+        payload = {"variable": var, "alarm_type": alarm_type, "context": context}
+        return [
+            {"role": "system", "content": self.SYSTEM_MSG},
+            {"role": "user", "content": f"Alarm JSON:\n{json.dumps(payload, ensure_ascii=False)}"}
+        ]
+
+    def cache_key(self, var: str, alarm_type: str, context: Dict[str, Any]) -> str:
+        """Hash of everything the completion depends on: variable, alarm type, context, prompt and model"""
+        request = {
+            "model": self.model,
+            "messages": self._messages(var, alarm_type, context),
+            "temperature": self.TEMPERATURE,
+            "max_tokens": self.MAX_TOKENS,
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def estimate_tokens(self, messages: list) -> int:
+        """Rough token count of a request (about 4 characters per token) plus its completion limit"""
+        return len(json.dumps(messages, ensure_ascii=False)) // 4 + self.MAX_TOKENS
+
     def summarize(self, var: str, alarm_type: str, context: Dict[str, Any]) -> Optional[str]:
         if not self.enabled or not context:
             return None
+        key = self.cache_key(var, alarm_type, context)
+        catalog = self.catalog
+        if catalog is not None:
+            text = catalog.get(key)
+            if text is not None:
+                return text
+        if self.cache is None:
+            return self._summarize(var, alarm_type, context)
+        return self.cache.get_or_compute(key, lambda: self._summarize(var, alarm_type, context))
 
-        system_msg = (
-                "You are a monitoring assistant. Convert the following alarm JSON into a clear, "
-                "concise summary using plain text only. Write in simple sentences without any "
-                "markdown formatting, bullet points, bold text, or special characters. "
-        )
-        payload = {"variable": var, "alarm_type": alarm_type, "context": context}
+    @contextmanager
+    def shared_summaries(self) -> Iterator[None]:
+        """
+        Within this block, asummarize calls for the same request share one lookup, so detectors
+        enriching the same record concurrently summarize an alarm they both raised only once.
+        """
+        token = _shared_summaries.set({})
+        try:
+            yield
+        finally:
+            _shared_summaries.reset(token)
+
+    async def asummarize(self, var: str, alarm_type: str, context: Dict[str, Any]) -> Optional[str]:
+        if not self.enabled or not context:
+            return None
+        key = self.cache_key(var, alarm_type, context)
+        shared = _shared_summaries.get()
+        if shared is None:
+            return await self._alookup(key, var, alarm_type, context)
+        if key in shared:
+            self.stats["shared"] += 1
+        else:
+            shared[key] = asyncio.ensure_future(self._alookup(key, var, alarm_type, context))
+        # Shielded: a detector that gives up at its deadline leaves the lookup running for the other
+        return await asyncio.shield(shared[key])
+
+    async def _alookup(self, key: str, var: str, alarm_type: str, context: Dict[str, Any]) -> Optional[str]:
+        catalog = self.catalog
+        if catalog is not None:
+            text = catalog.get(key)
+            if text is not None:
+                return text
+        if self.cache is None:
+            return await self._asummarize(var, alarm_type, context)
+        return await self.cache.aget_or_compute(key, lambda: self._asummarize(var, alarm_type, context))
+
+    def _summarize(self, var: str, alarm_type: str, context: Dict[str, Any]) -> Optional[str]:
+        messages = self._messages(var, alarm_type, context)
+        try:
+            resp = self.gateway.call(
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                ),
+                self.estimate_tokens(messages),
+            )
+            text = (resp.choices[0].message.content or "").strip()
+            return text or None
+        except GatewayRejected:
+            # Shed by the gateway (circuit open, budget or concurrency); counted in its stats
+            return None
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return None
 
+    async def _asummarize(self, var: str, alarm_type: str, context: Dict[str, Any]) -> Optional[str]:
+        messages = self._messages(var, alarm_type, context)
         try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": f"Alarm JSON:\n{json.dumps(payload, ensure_ascii=False)}"}
-                ],
-                temperature=0.2,
-                max_tokens=200,
+            resp = await self.gateway.acall(
+                lambda: self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=self.TEMPERATURE,
+                    max_tokens=self.MAX_TOKENS,
+                ),
+                self.estimate_tokens(messages),
             )
             text = (resp.choices[0].message.content or "").strip()
             return text or None
+        except GatewayRejected:
+            # Shed by the gateway (circuit open, budget or concurrency); counted in its stats
+            return None
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..utils.redis_namespaces import AnomalyRedisKeys, AnomalyRedisTTL
+from ..utils.logging import get_logger
+
+"""
+SummaryCache is a two-tier cache for LLM summaries: an in-process LRU in front of Redis
+(anomaly:cache:llm:{key} with a TTL), shared by every replica.
+
+Lookups that miss the LRU are single-flight: concurrent requests for the same key wait for
+the first one, which reads Redis and, on a miss, makes the one upstream call for all of them.
+Failed summaries (None) are not cached.
+"""
+
+logger = get_logger(__name__)
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+
+
+class SummaryCache:
+    def __init__(self, redis_client=None, async_redis_client=None, max_entries: int = 1024,
+                 ttl: int = AnomalyRedisTTL.CACHE) -> None:
+        self.redis_client = redis_client
+        self.async_redis_client = async_redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "coalesced": 0}
+
+    @staticmethod
+    def redis_key(key: str) -> str:
+        return AnomalyRedisKeys.cache("llm", key)
+
+    def _get_local(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.stats["local_hits"] += 1
+            return text
+
+    def _set_local(self, key: str, text: str) -> None:
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _load(self, key: str, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """Redis, then the upstream call; fills both tiers"""
+        text = None
+        if self.redis_client is not None:
+            try:
+                text = self.redis_client.get(self.redis_key(key))
+            except Exception as e:
+                logger.warning("LLM cache read failed", error=str(e))
+        if text is not None:
+            self._count("redis_hits")
+        else:
+            self._count("misses")
+            text = compute()
+            if text is not None and self.redis_client is not None:
+                try:
+                    self.redis_client.set(self.redis_key(key), text, ex=self.ttl)
+                except Exception as e:
+                    logger.warning("LLM cache write failed", error=str(e))
+        if text is not None:
+            self._set_local(key, text)
+        return text
+
+    async def _aload(self, key: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        text = None
+        if self.async_redis_client is not None:
+            try:
+                text = await self.async_redis_client.get(self.redis_key(key))
+            except Exception as e:
+                logger.warning("LLM cache read failed", error=str(e))
+        if text is not None:
+            self._count("redis_hits")
+        else:
+            self._count("misses")
+            text = await compute()
+            if text is not None and self.async_redis_client is not None:
+                try:
+                    await self.async_redis_client.set(self.redis_key(key), text, ex=self.ttl)
+                except Exception as e:
+                    logger.warning("LLM cache write failed", error=str(e))
+        if text is not None:
+            self._set_local(key, text)
+        return text
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        text = self._get_local(key)
+        if text is not None:
+            return text
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            return flight.result
+
+        try:
+            flight.result = self._load(key, compute)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        text = self._get_local(key)
+        if text is not None:
+            return text
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(self._aload(key, compute))
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self._count("coalesced")
+        # Shielded: a waiter that gives up does not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        """Drop the in-process entries (Redis entries expire with their TTL)"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl}
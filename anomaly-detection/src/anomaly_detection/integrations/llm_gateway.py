@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+"""
+LLMGateway guards the completion calls of LLM so an Azure OpenAI outage or quota exhaustion
+costs the detectors nothing but a fallback context:
+
+- at most `max_concurrency` calls are in flight (per sync/async client); a call that cannot
+  start within `acquire_timeout` seconds is rejected
+- after `failure_threshold` consecutive failures the circuit opens and calls are rejected
+  without touching the network for `reset_timeout` seconds; then one trial call is let
+  through, which closes the circuit on success and opens it again on failure. Only the trial
+  moves the circuit out of half-open: calls started before it opened do not count
+- requests and tokens started in the last minute are tracked against `requests_per_minute`
+  and `tokens_per_minute` (0 = unlimited); a call that would exceed them is rejected. A call
+  counts its estimated tokens until the response reports its actual usage
+
+Rejected calls raise GatewayRejected; every outcome is counted in get_stats.
+"""
+
+
+class GatewayRejected(Exception):
+    """Raised instead of calling the LLM when the gateway sheds the call"""
+
+
+class LLMGateway:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    WINDOW = 60.0
+
+    def __init__(self, max_concurrency: int = 8, acquire_timeout: float = 5.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, requests_per_minute: int = 0, tokens_per_minute: int = 0) -> None:
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._consecutive_failures = 0
+        # [started_at, tokens] of the calls started in the last minute
+        self._window: deque = deque()
+        self._in_flight = 0
+        self.stats = {
+            "calls": 0, "successes": 0, "failures": 0,
+            "rejected_open": 0, "rejected_rate": 0, "rejected_tokens": 0, "rejected_concurrency": 0,
+            "circuit_opened": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms_total": 0.0,
+        }
+
+    def _prune(self, now: float) -> None:
+        while self._window and self._window[0][0] <= now - self.WINDOW:
+            self._window.popleft()
+
+    def _admit(self, estimated_tokens: int) -> Tuple[list, bool]:
+        """
+        Check the circuit and the minute budget, and reserve the call in the window.
+        Returns the window entry and whether the call is the half-open trial.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    self.stats["rejected_open"] += 1
+                    raise GatewayRejected("circuit open")
+                self._state = self.HALF_OPEN
+            trial = self._state == self.HALF_OPEN
+            if trial and self._trial_in_flight:
+                self.stats["rejected_open"] += 1
+                raise GatewayRejected("circuit half-open, trial call in flight")
+
+            self._prune(now)
+            reason = None
+            if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+                reason = "rate"
+            elif self.tokens_per_minute and sum(tokens for _, tokens in self._window) + estimated_tokens > self.tokens_per_minute:
+                reason = "tokens"
+            if reason is not None:
+                self.stats[f"rejected_{reason}"] += 1
+                raise GatewayRejected(f"{reason} budget per minute exhausted")
+
+            entry = [now, estimated_tokens]
+            self._window.append(entry)
+            self.stats["calls"] += 1
+            self._in_flight += 1
+            if trial:
+                self._trial_in_flight = True
+            return entry, trial
+
+    def _record(self, entry: list, trial: bool, start_time: float, response: Any = None,
+                error: Optional[BaseException] = None, cancelled: bool = False) -> None:
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self._in_flight -= 1
+            if trial:
+                self._trial_in_flight = False
+            if cancelled:
+                # A cancelled call says nothing about the health of the LLM
+                return
+            self.stats["latency_ms_total"] += (time.monotonic() - start_time) * 1000
+            if usage is not None:
+                entry[1] = usage.total_tokens or entry[1]
+                self.stats["prompt_tokens"] += usage.prompt_tokens or 0
+                self.stats["completion_tokens"] += usage.completion_tokens or 0
+
+            if error is None:
+                self.stats["successes"] += 1
+                self._consecutive_failures = 0
+                if trial:
+                    self._state = self.CLOSED
+                return
+            self.stats["failures"] += 1
+            self._consecutive_failures += 1
+            # Calls that started before the circuit opened neither close nor reopen it
+            if trial or (self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self.stats["circuit_opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def _reject_busy(self) -> None:
+        with self._lock:
+            self.stats["rejected_concurrency"] += 1
+        raise GatewayRejected(f"{self.max_concurrency} LLM calls already in flight")
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Any:
+        """Run the completion `fn` in a concurrency slot, accounting for its outcome and usage"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._reject_busy()
+        try:
+            entry, trial = self._admit(estimated_tokens)
+            start_time = time.monotonic()
+            try:
+                response = fn()
+            except Exception as e:
+                self._record(entry, trial, start_time, error=e)
+                raise
+            self._record(entry, trial, start_time, response)
+            return response
+        finally:
+            self._slots.release()
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], estimated_tokens: int = 0) -> Any:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._reject_busy()
+        try:
+            entry, trial = self._admit(estimated_tokens)
+            start_time = time.monotonic()
+            try:
+                response = await fn()
+            except asyncio.CancelledError:
+                self._record(entry, trial, start_time, cancelled=True)
+                raise
+            except Exception as e:
+                self._record(entry, trial, start_time, error=e)
+                raise
+            self._record(entry, trial, start_time, response)
+            return response
+        finally:
+            self._async_slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            completed = self.stats["successes"] + self.stats["failures"]
+            return {
+                **self.stats,
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "in_flight": self._in_flight,
+                "requests_last_minute": len(self._window),
+                "tokens_last_minute": sum(tokens for _, tokens in self._window),
+                "avg_latency_ms": self.stats["latency_ms_total"] / completed if completed else 0.0,
+            }
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+"""
+SummaryCatalog holds LLM summaries generated ahead of time for every (tag, alarm type) of the
+alarm context, so the detectors can enrich alarms without calling the LLM on the hot path.
+
+Entries are stored under LLM.cache_key, the hash of the exact completion request (variable,
+alarm type, context, prompt, model). A catalog built from an older alarm context, prompt or
+deployment simply has no entry for the changed requests, which then fall back to the live LLM.
+
+File layout (JSON, written atomically next to alarm_context.json):
+    {"version": str, "built_at": float, "model": str,
+     "entries": [{"variable": str, "alarm_type": str, "key": str, "text": str}, ...]}
+"""
+
+
+class SummaryCatalog:
+    def __init__(self, entries: Optional[List[Dict[str, str]]] = None, model: Optional[str] = None,
+                 built_at: Optional[float] = None) -> None:
+        self.entries = list(entries or [])
+        self.model = model
+        self.built_at = built_at
+        self.version = self.compute_version(self.entries)
+        self._texts = {entry["key"]: entry["text"] for entry in self.entries}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @staticmethod
+    def compute_version(entries: List[Dict[str, str]]) -> str:
+        """Content hash of the entries, independent of their order"""
+        digest = hashlib.sha256()
+        for key, text in sorted((entry["key"], entry["text"]) for entry in entries):
+            digest.update(key.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+        return digest.hexdigest()[:12]
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._texts.get(key)
+        with self._lock:
+            self.stats["hits" if text is not None else "misses"] += 1
+        return text
+
+    @classmethod
+    def from_json_file(cls, path: str) -> "SummaryCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        catalog = cls(data.get("entries", []), model=data.get("model"), built_at=data.get("built_at"))
+        if data.get("version") and data["version"] != catalog.version:
+            raise ValueError(f"Summary catalog {path} is corrupt: version {data['version']} does not match its entries")
+        return catalog
+
+    def save(self, path: str) -> None:
+        """Write to a temporary file and rename it over `path`, so readers never see a partial catalog"""
+        data = {
+            "version": self.version,
+            "built_at": self.built_at or time.time(),
+            "model": self.model,
+            "entries": sorted(self.entries, key=lambda entry: (entry["variable"], entry["alarm_type"])),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get_info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"version": self.version, "built_at": self.built_at, "model": self.model,
+                    "entries": len(self), **self.stats}
@@ -16,6 +16,8 @@ class AnomalyResult(BaseModel):
 class MLAnomalyResult(BaseModel):
     values: Dict[str, float]
     status: str
+    reconstruction_error: Optional[float] = None
+    threshold: Optional[float] = None
 
 class DetectionMethod(str, Enum):
     HEURISTIC = "heuristic"
@@ -27,6 +29,13 @@ class DetectionResponse(BaseModel):
     method: DetectionMethod  
     results: Dict[str, AnomalyResult]
     processing_time_ms: float
+    result_id: Optional[str] = None  # set in deferred mode, see GET /results/{result_id}
+    enrichment_status: Optional[str] = None  # deferred mode: "pending", "complete" or "failed"
+
+class BatchDetectionResponse(BaseModel):
+    method: DetectionMethod
+    results: List[DetectionResponse]
+    processing_time_ms: float
 
 class MLDetectionResponse(BaseModel):
     timestamp: datetime
@@ -34,6 +43,18 @@ class MLDetectionResponse(BaseModel):
     results: MLAnomalyResult
     processing_time_ms: float
 
+class BatchMLDetectionResponse(BaseModel):
+    method: DetectionMethod
+    results: List[MLDetectionResponse]
+    processing_time_ms: float
+
+class CombinedDetectionResponse(BaseModel):
+    timestamp: datetime
+    heuristic: DetectionResponse
+    statistical: DetectionResponse
+    ml: MLDetectionResponse
+    processing_time_ms: float  # wall time of the request; each detector reports its own
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime
@@ -1,14 +1,26 @@
+import asyncio
+import heapq
 import time
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, AsyncIterable, AsyncIterator, List, Tuple, Optional
 from datetime import datetime
 from enum import Enum
 from ..core.HeuristicAnomalyDetector import HeuristicAnomalyDetector
 from ..core.StatisticalAnomalyDetector import StatisticalAnomalyDetector
+from ..core.alarm_state import AlarmStateTracker
 from ..core.context_processor import AlarmContextProcessor
+from ..core.enrichment import EnrichmentRunner
 from ..core.MLAnomalyDetector import MLAnomalyDetector
+from ..core.model_registry import ModelRegistry
 from ..integrations.llm import LLM
-from ..models.schemas import MLDetectionResponse, SensorData, DetectionResponse, HealthResponse, ErrorResponse, DetectionMethod
+from ..integrations.llm_cache import SummaryCache
+from ..integrations.llm_gateway import LLMGateway
+from ..integrations.summary_catalog import SummaryCatalog
+from ..models.schemas import BatchDetectionResponse, BatchMLDetectionResponse, CombinedDetectionResponse, MLDetectionResponse, SensorData, DetectionResponse, HealthResponse, ErrorResponse, DetectionMethod
 from ..utils.logging import get_logger
+from ..utils.redis_pool import aclose_pools, get_async_redis_client, get_redis_client
+from .deferred_enrichment import DeferredEnrichment
+from .hot_reload import ConfigReloader, WatchedSource
+from .ml_retraining import TrainingFeed
 from ..config.settings import settings
 import os
 import json
@@ -22,6 +34,10 @@ class AnomalyDetectionService:
         self.heuristic_detector: Optional[HeuristicAnomalyDetector] = None
         self.statistical_detector: Optional[StatisticalAnomalyDetector] = None
         self.ml_detector: Optional[MLAnomalyDetector] = None
+        self.reloader: Optional[ConfigReloader] = None
+        self.enrichment: Optional[EnrichmentRunner] = None
+        self.deferred: Optional[DeferredEnrichment] = None
+        self.training_feed: Optional[TrainingFeed] = None
         self._initialized = False
         
     def initialize(self) -> None:
@@ -32,8 +48,7 @@ class AnomalyDetectionService:
         try:
 
             # Load the threshold values
-            with open(settings.thresholds_path, "r", encoding="utf-8") as f:
-                thresholds = json.load(f)
+            thresholds = self._load_thresholds()
 
             # Check if alarm_context.json exists
             if not os.path.exists(settings.alarm_context_path):
@@ -48,14 +63,49 @@ class AnomalyDetectionService:
                 settings.alarm_context_path
             )
 
-            # Initialize LLM
-            llm = LLM(enabled=True)
+            # Initialize LLM, with summaries cached in-process and in Redis
+            summary_cache = None
+            if settings.llm_cache_enabled:
+                summary_cache = SummaryCache(
+                    get_redis_client(), get_async_redis_client(),
+                    max_entries=settings.llm_cache_max_entries, ttl=settings.llm_cache_ttl
+                )
+            # Concurrency limit, circuit breaker and per-minute budgets for the completion requests
+            gateway = LLMGateway(
+                max_concurrency=settings.llm_max_concurrency,
+                acquire_timeout=settings.llm_acquire_timeout,
+                failure_threshold=settings.llm_failure_threshold,
+                reset_timeout=settings.llm_reset_timeout,
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute
+            )
+            llm = LLM(enabled=True, cache=summary_cache, catalog=self._load_summary_catalog(), gateway=gateway)
+
+            # The alarms of a request are summarized concurrently, bounded by one deadline
+            self.enrichment = EnrichmentRunner(
+                deadline=settings.llm_enrichment_deadline, max_workers=settings.llm_enrichment_workers
+            )
+
+            # Background enrichment of the detections requested with deferred=true
+            self.deferred = DeferredEnrichment(
+                get_async_redis_client(),
+                workers=settings.deferred_enrichment_workers,
+                queue_size=settings.deferred_enrichment_queue_size
+            )
+
+            # Per-detector alarm state, so the LLM is only called when a sensor's alarm type changes
+            heuristic_alarms = statistical_alarms = None
+            if settings.alarm_state_tracking:
+                heuristic_alarms = AlarmStateTracker("heuristic", get_redis_client(), get_async_redis_client())
+                statistical_alarms = AlarmStateTracker("statistical", get_redis_client(), get_async_redis_client())
             
             # Initialize heuristic detector
             self.heuristic_detector = HeuristicAnomalyDetector(
                 thresholds=thresholds,
                 context_processor=context_processor,
-                llm=llm
+                llm=llm,
+                alarm_state=heuristic_alarms,
+                enrichment=self.enrichment
             )
 
             # Initialize statistical detector
@@ -67,14 +117,65 @@ class AnomalyDetectionService:
                 redis_db=settings.redis_db,
                 key_prefix=settings.redis_key_prefix,
                 context_processor=context_processor,
-                llm=llm
+                llm=llm,
+                eval_mode=settings.statistical_eval_mode,
+                window_encoding=settings.statistical_window_encoding,
+                window_mode=settings.statistical_window_mode,
+                time_window_seconds=settings.statistical_time_window_seconds,
+                bucket_seconds=settings.statistical_bucket_seconds,
+                sketch_compression=settings.statistical_sketch_compression,
+                redis_nodes=settings.redis_nodes or None,
+                alarm_state=statistical_alarms,
+                enrichment=self.enrichment
             )
+
+            # Backfill the sensor registries for windows written before they existed
+            self.statistical_detector.ensure_sensor_registry()
+
+            # Move sensors to their owning node after Redis nodes were added or removed
+            moved = self.statistical_detector.rebalance()
+            if moved:
+                logger.info("Rebalanced statistical state across Redis nodes", sensors=moved)
+
+            # Convert legacy JSON sensor queues once when switching to binary windows
+            migrated = self.statistical_detector.migrate_json_windows()
+            if migrated:
+                logger.info("Migrated JSON sensor windows to binary encoding", sensors=migrated)
+
+            # Warm the in-memory statistical windows so detection makes no Redis reads
+            warmed = self.statistical_detector.warm_windows()
+            logger.info("Statistical windows warmed from Redis", sensors=warmed)
+
+            # Health probes read a snapshot refreshed in the background
+            self.statistical_detector.refresh_system_health()
+            self.statistical_detector.start_health_refresher(settings.health_refresh_interval)
         
 
             # Initialize ML detector
             self.ml_detector = MLAnomalyDetector(
                 model_path=settings.ml_model_path
             )
+
+            # Records scored Normal feed the background retrainer (services/ml_retraining.py)
+            if settings.ml_training_feed:
+                self.training_feed = TrainingFeed(get_redis_client(), maxlen=settings.ml_training_stream_maxlen)
+                self.training_feed.start()
+
+            # Watch the configuration files and swap in rebuilt detectors when they change
+            sources = [
+                WatchedSource("thresholds", [settings.thresholds_path], self.reload_thresholds),
+                WatchedSource("alarm_context", [settings.alarm_context_path], self.reload_alarm_context),
+                WatchedSource(
+                    "ml",
+                    [os.path.join(settings.ml_model_path, name) for name in MLAnomalyDetector.ARTIFACTS],
+                    self.reload_ml_models
+                ),
+            ]
+            if settings.llm_summary_mode == "catalog":
+                sources.append(WatchedSource("summary_catalog", [settings.summary_catalog_path], self.reload_summary_catalog))
+            self.reloader = ConfigReloader(sources)
+            if settings.config_reload_interval > 0:
+                self.reloader.start(settings.config_reload_interval)
             
             self._initialized = True
             logger.info("Anomaly detection service initialized successfully")
@@ -87,6 +188,106 @@ class AnomalyDetectionService:
             logger.error("Failed to initialize anomaly detection service", error=str(e))
             raise
     
+    def shutdown(self) -> None:
+        """Stop background workers."""
+        if self.statistical_detector:
+            self.statistical_detector.stop_health_refresher()
+        if self.reloader:
+            self.reloader.stop()
+        if self.enrichment:
+            self.enrichment.shutdown()
+        if self.training_feed:
+            self.training_feed.stop()
+
+    @staticmethod
+    def _load_thresholds() -> Dict[str, Dict[str, float]]:
+        with open(settings.thresholds_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def reload_thresholds(self) -> None:
+        """Rebuild the heuristic detector on the current thresholds.json and swap it in."""
+        current = self.heuristic_detector
+        self.heuristic_detector = HeuristicAnomalyDetector(
+            thresholds=self._load_thresholds(),
+            context_processor=current.context_processor,
+            llm=current.llm,
+            alarm_state=current.alarm_state,
+            enrichment=current.enrichment
+        )
+
+    def reload_alarm_context(self) -> None:
+        """Load the current alarm_context.json and swap it into both detectors that enrich alarms."""
+        context_processor = AlarmContextProcessor.from_json_file(settings.alarm_context_path)
+        current = self.heuristic_detector
+        self.heuristic_detector = HeuristicAnomalyDetector(
+            thresholds=current.thresholds,
+            context_processor=context_processor,
+            llm=current.llm,
+            alarm_state=current.alarm_state,
+            enrichment=current.enrichment
+        )
+        # The statistical detector owns the live windows, so only its context lookup is replaced
+        self.statistical_detector.context_processor = context_processor
+
+        # Summaries of active alarms were built from the old context: enrich them again on their next record
+        for alarm_state in (current.alarm_state, self.statistical_detector.alarm_state):
+            if alarm_state:
+                alarm_state.clear()
+
+    @staticmethod
+    def _load_summary_catalog() -> Optional[SummaryCatalog]:
+        """The precomputed summary catalog in "catalog" mode; None in "live" mode."""
+        if settings.llm_summary_mode not in ("live", "catalog"):
+            raise ValueError(f"Unknown llm_summary_mode '{settings.llm_summary_mode}', expected 'live' or 'catalog'")
+        if settings.llm_summary_mode == "live":
+            return None
+        if not os.path.exists(settings.summary_catalog_path):
+            logger.warning("Summary catalog not found, every summary falls back to the live LLM",
+                           path=settings.summary_catalog_path)
+            return SummaryCatalog()
+        catalog = SummaryCatalog.from_json_file(settings.summary_catalog_path)
+        logger.info("Summary catalog loaded", version=catalog.version, entries=len(catalog))
+        return catalog
+
+    def reload_summary_catalog(self) -> None:
+        """Swap in the current summary catalog; detectors share the LLM, so one assignment covers both."""
+        self.heuristic_detector.llm.catalog = self._load_summary_catalog()
+
+    def reload_ml_models(self) -> None:
+        """Load the current ML artifacts into a new detector and swap it in."""
+        self.ml_detector = MLAnomalyDetector(model_path=settings.ml_model_path)
+
+    def list_ml_models(self) -> Dict[str, Any]:
+        """Published ML model versions and the active one."""
+        registry = ModelRegistry(settings.ml_model_path)
+        return {
+            "active": registry.active_version(),
+            "loaded": self.ml_detector.version if self.ml_detector else None,
+            "versions": registry.versions()
+        }
+
+    def promote_ml_model(self, version: str) -> Dict[str, Any]:
+        """Make `version` the active ML model and load it; other workers follow through their reloader."""
+        registry = ModelRegistry(settings.ml_model_path)
+        if not any(meta["version"] == version for meta in registry.versions()):
+            raise ValueError(f"Unknown model version {version}")
+        # Load it once before promoting, so a broken version never becomes active
+        MLAnomalyDetector(model_path=settings.ml_model_path, version=version)
+        registry.promote(version)
+        return self.reload_configuration(["ml"])
+
+    def rollback_ml_model(self) -> Dict[str, Any]:
+        """Make the previously active ML model active again and load it."""
+        ModelRegistry(settings.ml_model_path).rollback()
+        return self.reload_configuration(["ml"])
+
+    def reload_configuration(self, sources: Optional[List[str]] = None, force: bool = False) -> Dict[str, Any]:
+        """Reload changed configuration now instead of waiting for the watcher."""
+        if not self._initialized:
+            self.initialize()
+        outcomes = self.reloader.reload(sources, force=force)
+        return {"outcomes": outcomes, "sources": self.reloader.status()}
+
     def detect_heuristic_anomalies(self, sensor_data: SensorData) -> DetectionResponse:
         """Run only heuristic detection."""
         if not self._initialized:
@@ -118,6 +319,33 @@ class AnomalyDetectionService:
             processing_time_ms=processing_time
         )
 
+    def detect_heuristic_batch(self, records: List[SensorData]) -> BatchDetectionResponse:
+        """Run heuristic detection on a batch of records with one vectorized classification."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            batch_results = self.heuristic_detector.evaluate_batch(records)
+        except Exception as e:
+            logger.error("Heuristic batch detection failed", error=str(e), records=len(records))
+            batch_results = [{} for _ in records]
+        return self._create_batch_response(records, DetectionMethod.HEURISTIC, batch_results, (time.time() - start_time) * 1000)
+
+    def _create_batch_response(self, records: List[SensorData], method: DetectionMethod,
+                               batch_results: List[Dict[str, Any]], processing_time: float) -> BatchDetectionResponse:
+        """Batch response; each record is reported with its share of the batch processing time."""
+        per_record = processing_time / len(records) if records else 0.0
+        return BatchDetectionResponse(
+            method=method,
+            results=[
+                DetectionResponse(timestamp=record.timestamp, method=method, results=results, processing_time_ms=per_record)
+                for record, results in zip(records, batch_results)
+            ],
+            processing_time_ms=processing_time
+        )
+
     def detect_statistical_anomalies(self, sensor_data: SensorData) -> DetectionResponse:
         """Run only statistical detection."""
         if not self._initialized:
@@ -149,6 +377,20 @@ class AnomalyDetectionService:
             processing_time_ms=processing_time
         )
         
+    def detect_statistical_batch(self, records: List[SensorData]) -> BatchDetectionResponse:
+        """Run statistical detection on consecutive records, each against the windows the previous ones updated."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            batch_results = self.statistical_detector.evaluate_batch(records)
+        except Exception as e:
+            logger.error("Statistical batch detection failed", error=str(e), records=len(records))
+            batch_results = [{} for _ in records]
+        return self._create_batch_response(records, DetectionMethod.STATISTICAL, batch_results, (time.time() - start_time) * 1000)
+
     def detect_ml_anomalies(self, sensor_data: SensorData) -> MLDetectionResponse:
         """Run only ML detection."""
         if not self._initialized:
@@ -173,12 +415,19 @@ class AnomalyDetectionService:
             )
     
 
+    @staticmethod
+    def _trainable(result) -> bool:
+        """Only records scored Normal on finite values may train the next model"""
+        return result.status == "Normal" and result.reconstruction_error is not None
+
     def _run_ml_detection(self, record: SensorData) -> MLDetectionResponse:
         
         start_time = time.time()
         
         result = self.ml_detector.evaluate_anomaly(record)
         processing_time = (time.time() - start_time) * 1000
+        if self.training_feed and self._trainable(result):
+            self.training_feed.offer([result.values])
 
         return MLDetectionResponse(
             timestamp=record.timestamp,
@@ -187,6 +436,42 @@ class AnomalyDetectionService:
             processing_time_ms=processing_time
         )
         
+    def detect_ml_batch(self, records: List[SensorData]) -> BatchMLDetectionResponse:
+        """Run ML detection on a batch of records, scored as one feature matrix."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            batch_results = self.ml_detector.evaluate_batch(records)
+        except Exception as e:
+            logger.error("ML batch detection failed", error=str(e), records=len(records))
+            from ..models.schemas import MLAnomalyResult
+            batch_results = [MLAnomalyResult(values=record.data, status="Error") for record in records]
+        processing_time = (time.time() - start_time) * 1000
+        if self.training_feed:
+            self.training_feed.offer(result.values for result in batch_results if self._trainable(result))
+        per_record = processing_time / len(records) if records else 0.0
+        return BatchMLDetectionResponse(
+            method=DetectionMethod.ML,
+            results=[
+                MLDetectionResponse(timestamp=record.timestamp, method=DetectionMethod.ML, results=result, processing_time_ms=per_record)
+                for record, result in zip(records, batch_results)
+            ],
+            processing_time_ms=processing_time
+        )
+
+    @staticmethod
+    def _combine_batches(records: List[SensorData], heuristic: BatchDetectionResponse, statistical: BatchDetectionResponse,
+                         ml: BatchMLDetectionResponse, processing_time: float) -> List[CombinedDetectionResponse]:
+        """One combined response per record; each is reported with its share of the batch processing time."""
+        per_record = processing_time / len(records) if records else 0.0
+        return [
+            CombinedDetectionResponse(timestamp=record.timestamp, heuristic=h, statistical=s, ml=m, processing_time_ms=per_record)
+            for record, h, s, m in zip(records, heuristic.results, statistical.results, ml.results)
+        ]
+
     def _create_error_response(self, timestamp: datetime, method: DetectionMethod, processing_time: float) -> DetectionResponse:
         """Create an error response when detection fails."""
         return DetectionResponse(
@@ -196,6 +481,28 @@ class AnomalyDetectionService:
             processing_time_ms=processing_time
         )
     
+    def get_llm_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the LLM summary cache and catalog."""
+        llm = self.heuristic_detector.llm if self.heuristic_detector else None
+        if llm is None:
+            return {"enabled": False}
+        stats = {"enabled": llm.cache is not None, **(llm.cache.get_stats() if llm.cache else {})}
+        if llm.catalog is not None:
+            stats["catalog"] = llm.catalog.get_info()
+        if self.enrichment is not None:
+            stats["enrichment"] = {"deadline": self.enrichment.deadline, **self.enrichment.stats}
+        if self.deferred is not None:
+            stats["deferred"] = self.deferred.get_stats()
+        stats["shared_summaries"] = llm.stats["shared"]
+        return stats
+
+    def get_llm_gateway_stats(self) -> Dict[str, Any]:
+        """Concurrency, circuit breaker and token budget metrics of the LLM requests."""
+        llm = self.heuristic_detector.llm if self.heuristic_detector else None
+        if llm is None or not llm.enabled:
+            return {"enabled": False}
+        return {"enabled": True, **llm.gateway.get_stats()}
+
     def get_system_health(self) -> Dict[str, Any]:
         """Get system health information."""
         if not self._initialized:
@@ -212,11 +519,15 @@ class AnomalyDetectionService:
                     ml_health = self.ml_detector.get_model_info()
                 except Exception as e:
                     ml_health = {"error": str(e)}
+            if self.training_feed:
+                ml_health["training_feed"] = self.training_feed.get_stats()
             
             return {
                 "status": "healthy",
                 "redis_health": redis_health,
+                "redis_health_updated_at": self.statistical_detector.health_updated_at,
                 "ml_health": ml_health,
+                "config_versions": self.reloader.status() if self.reloader else {},
                 "detectors_initialized": True
             }
         
@@ -227,5 +538,228 @@ class AnomalyDetectionService:
                 "error": str(e)
             }
 
+
+class AsyncAnomalyDetectionService(AnomalyDetectionService):
+    """
+    Async variant used by the API: statistical detection runs on redis.asyncio and LLM
+    enrichment on the async OpenAI client, so one worker keeps many detections in flight
+    while waiting on I/O. The sync methods of AnomalyDetectionService remain available.
+    """
+
+    async def adetect_heuristic_anomalies(self, sensor_data: SensorData) -> DetectionResponse:
+        """Run only heuristic detection."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            detector_result = await self.heuristic_detector.aevaluate_anomaly(sensor_data)
+            return DetectionResponse(
+                timestamp=sensor_data.timestamp,
+                method=DetectionMethod.HEURISTIC,
+                results=detector_result,
+                processing_time_ms=(time.time() - start_time) * 1000
+            )
+        except Exception as e:
+            logger.error("Heuristic detection failed", error=str(e))
+            return self._create_error_response(
+                sensor_data.timestamp,
+                DetectionMethod.HEURISTIC,
+                (time.time() - start_time) * 1000
+            )
+
+    async def adetect_heuristic_deferred(self, sensor_data: SensorData) -> DetectionResponse:
+        """Run heuristic detection and return before the LLM context of its alarms is generated."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            detector = self.heuristic_detector
+            response = DetectionResponse(
+                timestamp=sensor_data.timestamp,
+                method=DetectionMethod.HEURISTIC,
+                results=detector.classify_records([sensor_data])[0],
+                processing_time_ms=(time.time() - start_time) * 1000
+            )
+            return await self.deferred.submit(response, lambda results: detector.aenrich_batch([results]))
+        except Exception as e:
+            logger.error("Heuristic detection failed", error=str(e))
+            return self._create_error_response(
+                sensor_data.timestamp,
+                DetectionMethod.HEURISTIC,
+                (time.time() - start_time) * 1000
+            )
+
+    async def adetect_heuristic_batch(self, records: List[SensorData]) -> BatchDetectionResponse:
+        """Run heuristic detection on a batch of records with one vectorized classification."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            batch_results = await self.heuristic_detector.aevaluate_batch(records)
+        except Exception as e:
+            logger.error("Heuristic batch detection failed", error=str(e), records=len(records))
+            batch_results = [{} for _ in records]
+        return self._create_batch_response(records, DetectionMethod.HEURISTIC, batch_results, (time.time() - start_time) * 1000)
+
+    async def adetect_statistical_anomalies(self, sensor_data: SensorData) -> DetectionResponse:
+        """Run only statistical detection."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            results = await self.statistical_detector.aevaluate_anomaly(sensor_data)
+            return DetectionResponse(
+                timestamp=sensor_data.timestamp,
+                method=DetectionMethod.STATISTICAL,
+                results=results,
+                processing_time_ms=(time.time() - start_time) * 1000
+            )
+        except Exception as e:
+            logger.error("Statistical detection failed", error=str(e))
+            return self._create_error_response(
+                sensor_data.timestamp,
+                DetectionMethod.STATISTICAL,
+                (time.time() - start_time) * 1000
+            )
+
+    async def adetect_statistical_deferred(self, sensor_data: SensorData) -> DetectionResponse:
+        """Run statistical detection and return before the LLM context of its alarms is generated."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            detector = self.statistical_detector
+            response = DetectionResponse(
+                timestamp=sensor_data.timestamp,
+                method=DetectionMethod.STATISTICAL,
+                results=await detector.aclassify(sensor_data),
+                processing_time_ms=(time.time() - start_time) * 1000
+            )
+            return await self.deferred.submit(response, detector.aenrich)
+        except Exception as e:
+            logger.error("Statistical detection failed", error=str(e))
+            return self._create_error_response(
+                sensor_data.timestamp,
+                DetectionMethod.STATISTICAL,
+                (time.time() - start_time) * 1000
+            )
+
+    async def adetect_statistical_batch(self, records: List[SensorData]) -> BatchDetectionResponse:
+        """Run statistical detection on consecutive records, each against the windows the previous ones updated."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+
+        try:
+            batch_results = await self.statistical_detector.aevaluate_batch(records)
+        except Exception as e:
+            logger.error("Statistical batch detection failed", error=str(e), records=len(records))
+            batch_results = [{} for _ in records]
+        return self._create_batch_response(records, DetectionMethod.STATISTICAL, batch_results, (time.time() - start_time) * 1000)
+
+    async def aget_result(self, result_id: str, wait: float = 0) -> Optional[DetectionResponse]:
+        """A deferred detection by ID, waiting up to `wait` seconds for its enrichment to finish."""
+        if not self._initialized:
+            self.initialize()
+        if wait > 0:
+            return await self.deferred.wait(result_id, wait)
+        return await self.deferred.get(result_id)
+
+    async def adetect_ml_anomalies(self, sensor_data: SensorData) -> MLDetectionResponse:
+        """Run only ML detection (pure CPU, executed inline on the event loop)."""
+        return self.detect_ml_anomalies(sensor_data)
+
+    async def adetect_ml_batch(self, records: List[SensorData]) -> BatchMLDetectionResponse:
+        """Run ML detection on a batch of records (pure CPU, executed inline on the event loop)."""
+        return self.detect_ml_batch(records)
+
+    async def adetect_all_anomalies(self, sensor_data: SensorData) -> CombinedDetectionResponse:
+        """
+        Run the three detectors concurrently on one record. An alarm raised by both rule-based
+        detectors for the same variable is summarized by one LLM lookup.
+        """
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+        with self.heuristic_detector.llm.shared_summaries():
+            # Statistical first, so its Redis round trip is in flight while the CPU-bound detectors run
+            statistical, heuristic, ml = await asyncio.gather(
+                self.adetect_statistical_anomalies(sensor_data),
+                self.adetect_heuristic_anomalies(sensor_data),
+                self.adetect_ml_anomalies(sensor_data)
+            )
+        return CombinedDetectionResponse(
+            timestamp=sensor_data.timestamp,
+            heuristic=heuristic,
+            statistical=statistical,
+            ml=ml,
+            processing_time_ms=(time.time() - start_time) * 1000
+        )
+
+    async def adetect_all_batch(self, records: List[SensorData]) -> List[CombinedDetectionResponse]:
+        """Run the three detectors concurrently on consecutive records, sharing the LLM summaries of their alarms."""
+        if not self._initialized:
+            self.initialize()
+
+        start_time = time.time()
+        with self.heuristic_detector.llm.shared_summaries():
+            statistical, heuristic, ml = await asyncio.gather(
+                self.adetect_statistical_batch(records),
+                self.adetect_heuristic_batch(records),
+                self.adetect_ml_batch(records)
+            )
+        return self._combine_batches(records, heuristic, statistical, ml, (time.time() - start_time) * 1000)
+
+    async def aingest(self, records: AsyncIterable[SensorData]) -> AsyncIterator[CombinedDetectionResponse]:
+        """
+        Evaluate a stream of records with all three detectors, in batches of ingest_batch_size,
+        yielding the results as each batch completes. Up to ingest_reorder_buffer records are held
+        back so the stream is evaluated in timestamp order; a record arriving later than that is
+        evaluated as soon as it arrives. Memory is bounded by the two settings, not the stream.
+        """
+        if not self._initialized:
+            self.initialize()
+
+        pending: List[Tuple[float, int, SensorData]] = []
+        batch: List[SensorData] = []
+        received = 0
+        async for record in records:
+            heapq.heappush(pending, (record.timestamp.timestamp(), received, record))
+            received += 1
+            if len(pending) > settings.ingest_reorder_buffer:
+                batch.append(heapq.heappop(pending)[2])
+                if len(batch) >= settings.ingest_batch_size:
+                    for result in await self.adetect_all_batch(batch):
+                        yield result
+                    batch = []
+        while pending:
+            batch.append(heapq.heappop(pending)[2])
+            if len(batch) >= settings.ingest_batch_size:
+                for result in await self.adetect_all_batch(batch):
+                    yield result
+                batch = []
+        if batch:
+            for result in await self.adetect_all_batch(batch):
+                yield result
+
+    async def ashutdown(self) -> None:
+        """Stop background workers and close the shared Redis pools."""
+        if self.deferred:
+            await self.deferred.aclose()
+        self.shutdown()
+        await aclose_pools()
+
 # Global service instance
-anomaly_service = AnomalyDetectionService()
\ No newline at end of file
+anomaly_service = AsyncAnomalyDetectionService()
\ No newline at end of file
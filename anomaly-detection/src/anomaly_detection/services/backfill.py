@@ -0,0 +1,311 @@
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ..config.settings import settings
+from ..core.HeuristicAnomalyDetector import HeuristicAnomalyDetector
+from ..core.MLAnomalyDetector import MLAnomalyDetector
+from ..utils.logging import get_logger, setup_logging
+
+"""
+Offline backfill: replay historian data through the heuristic, statistical and ML detectors.
+
+The input (CSV or Parquet) has a timestamp column and one column per sensor, one row per
+record, replayed in file order. Empty cells mean the sensor was absent from that record.
+Each chunk is scored column-wise in NumPy with the same arithmetic as the online detectors,
+so results equal posting the rows one by one to a service whose statistical windows start empty:
+
+  - heuristic: HeuristicAnomalyDetector.classify_matrix over the whole chunk
+  - statistical: rolling IQR over the previous `window_size` points of each sensor, from
+    sliding_window_view; np.percentile matches SortedWindow bit for bit (count windows only)
+  - ml: MLAnomalyDetector.reconstruction_errors, which is batch-size independent
+
+Statistical windows depend only on input values, so every chunk is shipped with the tail of
+each sensor's history and chunks can be scored in parallel across a process pool.
+
+    python -m src.anomaly_detection.services.backfill history.parquet results.parquet --workers 4
+"""
+
+logger = get_logger(__name__)
+
+METHODS = ("heuristic", "statistical", "ml")
+_BLOCK_ROWS = 16384  # rows per np.percentile call, bounding the temporary window copies
+
+
+def _iqr_alarm_types(values: np.ndarray, q1: np.ndarray, q3: np.ndarray,
+                     minimum: np.ndarray, maximum: np.ndarray) -> np.ndarray:
+    """Vectorized StatisticalAnomalyDetector._check_outlier, in the same branch order"""
+    iqr = q3 - q1
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+    return np.select(
+        [
+            (values < lower_bound) & (values < minimum),
+            values < lower_bound,
+            (values > upper_bound) & (values > maximum),
+            values > upper_bound,
+            values < q1,
+            values > q3,
+        ],
+        ["Low-Low", "Low", "High-High", "High", "Low", "High"],
+        default="OK"
+    ).astype(object)
+
+
+def rolling_iqr_alarm_types(history: np.ndarray, values: np.ndarray,
+                            window_size: int, min_data_points: int) -> np.ndarray:
+    """
+    Alarm type of each value against the `window_size` points preceding it.
+
+    `history` holds the sensor's last (up to window_size) points before `values`; a shorter
+    history means the sensor has not filled its window yet, as in a fresh online window.
+    """
+    series = np.concatenate((history, values))
+    offset = len(history)
+    alarm_types = np.full(len(values), "OK", dtype=object)
+
+    # Points whose window is still filling up (fewer than window_size predecessors)
+    for j in range(min(len(values), max(0, window_size - offset))):
+        count = offset + j
+        if count < min_data_points:
+            continue
+        window = series[:count]
+        q1, q3 = np.percentile(window, [25, 75])
+        alarm_types[j] = _iqr_alarm_types(
+            values[j:j + 1], np.array([q1]), np.array([q3]), np.array([window.min()]), np.array([window.max()])
+        )[0]
+
+    # Full windows: row k of the view is series[k:k + window_size], the window of point k + window_size
+    first = max(0, window_size - offset)
+    if first < len(values) and window_size >= min_data_points:
+        windows = sliding_window_view(series[:-1], window_size)
+        for start in range(first, len(values), _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, len(values))
+            block = windows[offset + start - window_size:offset + stop - window_size]
+            q1, q3 = np.percentile(block, [25, 75], axis=1)
+            alarm_types[start:stop] = _iqr_alarm_types(
+                values[start:stop], q1, q3, block.min(axis=1), block.max(axis=1)
+            )
+    return alarm_types
+
+
+class BackfillEngine:
+    """Scores DataFrame chunks; picklable so chunks can be farmed out to worker processes."""
+
+    def __init__(self,
+                 thresholds: Dict[str, Dict[str, float]],
+                 window_size: int,
+                 min_data_points: int,
+                 ml_detector: Optional[MLAnomalyDetector] = None,
+                 methods: Sequence[str] = METHODS,
+                 timestamp_column: str = "timestamp") -> None:
+        unknown = set(methods) - set(METHODS)
+        if unknown:
+            raise ValueError(f"Unknown backfill methods {sorted(unknown)}, expected {list(METHODS)}")
+        if "ml" in methods and ml_detector is None:
+            raise ValueError("ML backfill requires an MLAnomalyDetector")
+
+        self.heuristic = HeuristicAnomalyDetector(thresholds=thresholds, context_processor=None, llm=None)
+        self.window_size = window_size
+        self.min_data_points = min_data_points
+        self.ml_detector = ml_detector
+        self.methods = tuple(methods)
+        self.timestamp_column = timestamp_column
+
+    def sensor_columns(self, chunk: pd.DataFrame) -> List[str]:
+        return [column for column in chunk.columns if column != self.timestamp_column]
+
+    def advance_history(self, chunk: pd.DataFrame, history: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Last window_size points of every sensor after `chunk`, for scoring the next one"""
+        advanced = dict(history)
+        for sensor in self.sensor_columns(chunk):
+            values = chunk[sensor].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            previous = history.get(sensor, np.empty(0))
+            advanced[sensor] = np.concatenate((previous, values))[-self.window_size:]
+        return advanced
+
+    def score_chunk(self, chunk: pd.DataFrame, history: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """One output row per input row: "{sensor}.{method}" alarm types plus ML status and error"""
+        output = {self.timestamp_column: chunk[self.timestamp_column].to_numpy()}
+        sensors = self.sensor_columns(chunk)
+        X = chunk[sensors].to_numpy(dtype=float)
+        if "heuristic" in self.methods:
+            heuristic = self.heuristic.classify_matrix(X, sensors)
+
+        for j, sensor in enumerate(sensors):
+            values = X[:, j]
+            present = ~np.isnan(values)
+
+            if "heuristic" in self.methods:
+                alarm_types = np.full(len(values), None, dtype=object)
+                alarm_types[present] = heuristic[present, j]
+                output[f"{sensor}.heuristic"] = alarm_types
+
+            if "statistical" in self.methods:
+                alarm_types = np.full(len(values), None, dtype=object)
+                alarm_types[present] = rolling_iqr_alarm_types(
+                    history.get(sensor, np.empty(0)), values[present], self.window_size, self.min_data_points
+                )
+                output[f"{sensor}.statistical"] = alarm_types
+
+        if "ml" in self.methods:
+            status = np.full(len(chunk), "Error", dtype=object)
+            errors = np.full(len(chunk), np.nan)
+            features = self.ml_detector.features
+            if all(feature in chunk.columns for feature in features):
+                X = chunk[features].to_numpy(dtype=float)
+                complete = np.isfinite(X).all(axis=1)
+                errors[complete] = self.ml_detector.reconstruction_errors(X[complete])
+                # Like the online detector, rows without a finite error are errors
+                scored = np.isfinite(errors)
+                errors[~scored] = np.nan
+                status[scored] = np.where(errors[scored] > self.ml_detector.threshold, "Anomaly", "Normal")
+            output["ml.status"] = status
+            output["ml.reconstruction_error"] = errors
+
+        return pd.DataFrame(output, index=chunk.index)
+
+
+def _score(engine: BackfillEngine, chunk: pd.DataFrame, history: Dict[str, np.ndarray]) -> pd.DataFrame:
+    return engine.score_chunk(chunk, history)
+
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Stream a CSV or Parquet file in DataFrame chunks"""
+    if Path(path).suffix.lower() in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet backfill requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class _ResultWriter:
+    """Appends result chunks to a CSV or Parquet file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.parquet = Path(path).suffix.lower() in (".parquet", ".pq")
+        self._writer = None
+        self._started = False
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def backfill(input_path: str,
+             output_path: Optional[str] = None,
+             *,
+             engine: Optional[BackfillEngine] = None,
+             chunk_size: int = 100_000,
+             workers: int = 1) -> Dict[str, Any]:
+    """
+    Score a whole file and optionally write the per-row results. With workers > 1, chunks are
+    scored in a process pool while the next ones are read; results are written in input order.
+    Returns row counts and the number of anomalies per method.
+    """
+    engine = engine or build_engine()
+    writer = _ResultWriter(output_path) if output_path else None
+    summary = {"rows": 0, "anomalies": {method: 0 for method in engine.methods}}
+    started = time.time()
+
+    def consume(result: pd.DataFrame) -> None:
+        summary["rows"] += len(result)
+        for column in result.columns:
+            method = column.rsplit(".", 1)[-1]
+            if method in ("heuristic", "statistical"):
+                summary["anomalies"][method] += int(((result[column] != "OK") & result[column].notna()).sum())
+        if "ml" in engine.methods:
+            summary["anomalies"]["ml"] += int((result["ml.status"] == "Anomaly").sum())
+        if writer is not None:
+            writer.write(result)
+
+    history: Dict[str, np.ndarray] = {}
+    try:
+        if workers <= 1:
+            for chunk in iter_chunks(input_path, chunk_size):
+                consume(engine.score_chunk(chunk, history))
+                history = engine.advance_history(chunk, history)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = []
+                for chunk in iter_chunks(input_path, chunk_size):
+                    pending.append(pool.submit(_score, engine, chunk, history))
+                    history = engine.advance_history(chunk, history)
+                    # Bound read-ahead so memory stays at a few chunks per worker
+                    while len(pending) >= 2 * workers:
+                        consume(pending.pop(0).result())
+                for future in pending:
+                    consume(future.result())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    summary["elapsed_s"] = round(time.time() - started, 3)
+    summary["rows_per_minute"] = int(summary["rows"] / summary["elapsed_s"] * 60) if summary["elapsed_s"] else None
+    return summary
+
+
+def build_engine(methods: Sequence[str] = METHODS, timestamp_column: str = "timestamp") -> BackfillEngine:
+    """Engine configured like the online service, from Settings"""
+    if settings.statistical_window_mode != "count" and "statistical" in methods:
+        raise ValueError("Statistical backfill replays count-based windows only")
+
+    thresholds = {}
+    if "heuristic" in methods:
+        with open(settings.thresholds_path, "r", encoding="utf-8") as f:
+            thresholds = json.load(f)
+
+    return BackfillEngine(
+        thresholds=thresholds,
+        window_size=settings.statistical_window_size,
+        min_data_points=settings.statistical_min_data_points,
+        ml_detector=MLAnomalyDetector(model_path=settings.ml_model_path, read_only=True) if "ml" in methods else None,
+        methods=methods,
+        timestamp_column=timestamp_column
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay historian data through the anomaly detectors")
+    parser.add_argument("input", help="CSV or Parquet file, one row per record")
+    parser.add_argument("output", nargs="?", help="CSV or Parquet file for per-row results")
+    parser.add_argument("--methods", default=",".join(METHODS), help="comma-separated subset of heuristic,statistical,ml")
+    parser.add_argument("--timestamp-column", default="timestamp")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes scoring chunks in parallel")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    engine = build_engine([method.strip() for method in args.methods.split(",")], args.timestamp_column)
+    summary = backfill(args.input, args.output, engine=engine, chunk_size=args.chunk_size, workers=args.workers)
+    logger.info("Backfill completed", **summary)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
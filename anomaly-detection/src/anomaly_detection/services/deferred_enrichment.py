@@ -0,0 +1,165 @@
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from ..models.schemas import AnomalyResult, DetectionResponse
+from ..utils.logging import get_logger
+from ..utils.redis_namespaces import AnomalyRedisKeys, AnomalyRedisTTL
+
+"""
+Deferred enrichment: detection responses are returned before their LLM context exists.
+
+A deferred response carries a result_id and enrichment_status "pending". Its results are stored
+under anomaly:results:analysis:{result_id} right away and queued for a pool of worker tasks on
+the event loop, which run the detector's enrichment and store the completed response. Completion
+is published on the channel of the same name, so clients can GET the result by ID, long-poll it,
+or SUBSCRIBE to the channel in Redis directly.
+
+The queue is bounded: when it is full a request is enriched inline, which slows ingest down only
+while the workers are behind.
+"""
+
+logger = get_logger(__name__)
+
+Enricher = Callable[[Dict[str, AnomalyResult]], Awaitable[Dict[str, AnomalyResult]]]
+
+
+class DeferredEnrichment:
+    def __init__(self, redis_client, workers: int = 4, queue_size: int = 1000,
+                 ttl: int = AnomalyRedisTTL.RESULTS) -> None:
+        self.redis_client = redis_client
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._listening: Optional[asyncio.Event] = None
+        self.stats = {"queued": 0, "inline": 0, "completed": 0, "failed": 0}
+
+    @staticmethod
+    def new_result_id() -> str:
+        return uuid.uuid4().hex
+
+    def _start(self) -> None:
+        """Worker tasks are created on first use, on the loop serving the requests"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def _store(self, response: DetectionResponse, publish: bool = False) -> None:
+        key = AnomalyRedisKeys.analysis_result(response.result_id)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(key, response.model_dump_json(), ex=self.ttl)
+        if publish:
+            pipe.publish(key, response.enrichment_status)
+        await pipe.execute()
+
+    async def _complete(self, response: DetectionResponse, enrich: Enricher) -> DetectionResponse:
+        start_time = time.time()
+        try:
+            await enrich(response.results)
+            response.enrichment_status = "complete"
+            self.stats["completed"] += 1
+        except Exception as e:
+            logger.error("Deferred enrichment failed", result_id=response.result_id, error=str(e))
+            response.enrichment_status = "failed"
+            self.stats["failed"] += 1
+        response.processing_time_ms += (time.time() - start_time) * 1000
+        await self._store(response, publish=True)
+        return response
+
+    async def submit(self, response: DetectionResponse, enrich: Enricher) -> DetectionResponse:
+        """
+        Return `response` with context pending and enrich a copy of its results in the background.
+        Responses without alarms are complete as they are and are only stored.
+        """
+        response.result_id = self.new_result_id()
+        if all(result.alarm_type == "OK" for result in response.results.values()):
+            response.enrichment_status = "complete"
+            await self._store(response)
+            return response
+
+        self._start()
+        if self._queue.full():
+            self.stats["inline"] += 1
+            return await self._complete(response, enrich)
+
+        # Stored as pending before it is queued, so a fast worker cannot be overwritten by it
+        response.enrichment_status = "pending"
+        await self._store(response)
+        self._queue.put_nowait((response.model_copy(deep=True), enrich))
+        self.stats["queued"] += 1
+        return response
+
+    async def _work(self) -> None:
+        while True:
+            response, enrich = await self._queue.get()
+            try:
+                await self._complete(response, enrich)
+            except Exception as e:
+                logger.error("Deferred enrichment could not be stored", result_id=response.result_id, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def get(self, result_id: str) -> Optional[DetectionResponse]:
+        raw = await self.redis_client.get(AnomalyRedisKeys.analysis_result(result_id))
+        return DetectionResponse.model_validate_json(raw) if raw else None
+
+    async def _listen(self) -> None:
+        """One pattern subscription per process, resolving the local long-poll waiters"""
+        pubsub = self.redis_client.pubsub()
+        await pubsub.psubscribe(AnomalyRedisKeys.analysis_result("*"))
+        self._listening.set()
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                channel = message["channel"]
+                result_id = channel.rsplit(":", 1)[-1]
+                waiter = self._waiters.pop(result_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(True)
+        finally:
+            await pubsub.aclose()
+
+    async def wait(self, result_id: str, timeout: float) -> Optional[DetectionResponse]:
+        """The stored response once it is no longer pending, or as it is after `timeout` seconds"""
+        if self._listener is None or self._listener.done():
+            self._listening = asyncio.Event()
+            self._listener = asyncio.ensure_future(self._listen())
+        try:
+            await asyncio.wait_for(self._listening.wait(), timeout)
+        except asyncio.TimeoutError:
+            return await self.get(result_id)
+
+        waiter = self._waiters.get(result_id)
+        if waiter is None:
+            waiter = self._waiters[result_id] = asyncio.get_running_loop().create_future()
+        # Subscribed before reading, so a completion between the two is not missed
+        response = await self.get(result_id)
+        if response is None or response.enrichment_status != "pending":
+            self._waiters.pop(result_id, None)
+            return response
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if self._waiters.get(result_id) is waiter:
+                del self._waiters[result_id]
+        return await self.get(result_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "backlog": self._queue.qsize() if self._queue else 0}
+
+    async def aclose(self) -> None:
+        """Finish queued enrichments, then stop the workers and the listener"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), 10)
+            except asyncio.TimeoutError:
+                logger.warning("Deferred enrichments dropped at shutdown", backlog=self._queue.qsize())
+        for task in self._tasks + ([self._listener] if self._listener else []):
+            task.cancel()
+        self._tasks, self._listener, self._queue = [], None, None
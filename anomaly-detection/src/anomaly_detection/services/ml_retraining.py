@@ -0,0 +1,290 @@
+import argparse
+import json
+import math
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config.settings import settings
+from ..core.model_registry import ModelRegistry
+from ..core.quantile_sketch import TDigest
+from ..utils.logging import get_logger, setup_logging
+from ..utils.redis_namespaces import AnomalyRedisKeys
+from ..utils.redis_pool import get_redis_client
+
+"""
+Background retraining of the ML model from live records.
+
+The API only hands the values of records the ML detector scored Normal to a TrainingFeed: a bounded
+in-memory buffer (full buffers drop records rather than wait) that a daemon thread flushes to the
+capped Redis stream anomaly:queue:processing:ml-training with pipelined XADDs, so detection requests
+never wait on training.
+
+A separate retrainer process reads the stream in mini-batches:
+
+    python -m src.anomaly_detection.services.ml_retraining [--auto-promote]
+
+StreamingPCATrainer keeps exponentially decayed mean and covariance of the raw features (half-life
+in samples), so the scaler and PCA follow plant drift; the model is their exact StandardScaler + PCA
+fit, folded like the registry's models. Every mini-batch is scored with the model as it was before
+the batch and the errors feed a t-digest, whose quantile becomes the threshold. After every
+`publish_every` samples a version is published to the model registry, and promoted if configured,
+which the API workers pick up through their reloader.
+"""
+
+logger = get_logger(__name__)
+
+TRAINING_STREAM = AnomalyRedisKeys.processing_queue("ml-training")
+
+
+class TrainingFeed:
+    """Non-blocking hand-off of Normal records from the request path to the training stream."""
+
+    def __init__(self, redis_client, stream: str = TRAINING_STREAM, maxlen: int = 100000,
+                 buffer_size: int = 10000, flush_interval: float = 1.0) -> None:
+        self.redis_client = redis_client
+        self.stream = stream
+        self.maxlen = maxlen
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque()
+        self._buffer_size = buffer_size
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"offered": 0, "dropped": 0, "sent": 0, "failed": 0}
+
+    def offer(self, records: Iterable[Dict[str, float]]) -> None:
+        for values in records:
+            if len(self._buffer) >= self._buffer_size:
+                self.stats["dropped"] += 1
+                continue
+            self._buffer.append(values)
+            self.stats["offered"] += 1
+
+    def flush(self) -> int:
+        batch = []
+        while self._buffer:
+            batch.append(self._buffer.popleft())
+        if not batch:
+            return 0
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for values in batch:
+                pipe.xadd(self.stream, {"data": json.dumps(values)}, maxlen=self.maxlen, approximate=True)
+            pipe.execute()
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.error("Training feed flush failed", records=len(batch), error=str(e))
+            return 0
+        self.stats["sent"] += len(batch)
+        return len(batch)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="ml-training-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "buffered": len(self._buffer)}
+
+
+class StreamingPCATrainer:
+    """Exponentially decayed StandardScaler + PCA, updated in mini-batches."""
+
+    def __init__(self, features: List[str], n_components: int, half_life: float = 100000,
+                 threshold_quantile: float = 0.99, warmup: int = 1000) -> None:
+        self.features = list(features)
+        self.n_components = n_components
+        # Weight of a sample after another one arrives
+        self.decay = 0.5 ** (1 / half_life) if half_life else 1.0
+        self.threshold_quantile = threshold_quantile
+        # Samples seen before errors are collected for the threshold
+        self.warmup = warmup
+        n_features = len(self.features)
+        self.weight = 0.0
+        self.mean = np.zeros(n_features)
+        self.scatter = np.zeros((n_features, n_features))
+        self.seen = 0
+        self.errors = TDigest()
+
+    def update(self, X: np.ndarray) -> None:
+        X = np.asarray(X, dtype=float)
+        if not len(X):
+            return
+        if self.seen >= self.warmup:
+            weights, bias = self.fold()
+            residual = X @ weights + bias
+            for error in np.mean(residual**2, axis=1):
+                self.errors.add(float(error))
+
+        # Chan et al. pairwise merge of the decayed moments with the batch moments
+        n = len(X)
+        old_weight = self.weight * self.decay ** n
+        batch_mean = X.mean(axis=0)
+        centered = X - batch_mean
+        delta = batch_mean - self.mean
+        self.weight = old_weight + n
+        self.mean = self.mean + delta * n / self.weight
+        self.scatter = self.scatter * self.decay ** n + centered.T @ centered + np.outer(delta, delta) * old_weight * n / self.weight
+        self.seen += n
+
+    def fold(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The current scaler and PCA as residual = x @ weights + bias (see core.model_registry)"""
+        covariance = self.scatter / self.weight
+        std = np.sqrt(np.diag(covariance))
+        std[std == 0] = 1.0  # like StandardScaler, constant features are not scaled
+        correlation = covariance / np.outer(std, std)
+        _, vectors = np.linalg.eigh(correlation)
+        components = vectors[:, ::-1][:, :self.n_components].T
+        residual = np.eye(len(self.features)) - components.T @ components
+        weights = residual / std[:, None]
+        bias = (-self.mean / std) @ residual
+        return weights, bias
+
+    def threshold(self) -> float:
+        # threshold_quantile is a fraction, the t-digest takes percentiles
+        return self.errors.percentile(self.threshold_quantile * 100)
+
+    def reset_threshold(self) -> None:
+        self.errors = TDigest()
+
+
+class ModelRetrainer:
+    """Consumes the training stream and publishes retrained model versions."""
+
+    def __init__(self, redis_client, registry: ModelRegistry, trainer: StreamingPCATrainer,
+                 stream: str = TRAINING_STREAM, batch_size: int = 500, publish_every: int = 20000,
+                 min_samples: int = 5000, auto_promote: bool = False, keep_versions: int = 20) -> None:
+        self.redis_client = redis_client
+        self.registry = registry
+        self.trainer = trainer
+        self.stream = stream
+        self.batch_size = batch_size
+        self.publish_every = publish_every
+        self.min_samples = min_samples
+        self.auto_promote = auto_promote
+        self.keep_versions = keep_versions
+        self.last_id = "$"
+        self.since_publish = 0
+        self._stop = threading.Event()
+        self.stats = {"samples": 0, "skipped": 0, "published": 0}
+
+    def _rows(self, entries: List[Tuple[str, Dict[str, str]]]) -> np.ndarray:
+        rows = []
+        for _, fields in entries:
+            try:
+                values = json.loads(fields["data"])
+                row = [float(values[feature]) for feature in self.trainer.features]
+            except (KeyError, TypeError, ValueError):
+                self.stats["skipped"] += 1
+                continue
+            if all(math.isfinite(value) for value in row):
+                rows.append(row)
+            else:
+                self.stats["skipped"] += 1
+        return np.array(rows, dtype=float).reshape(-1, len(self.trainer.features))
+
+    def poll(self, block_ms: int = 1000) -> int:
+        """Train on the next mini-batch of the stream; returns the number of samples used"""
+        reply = self.redis_client.xread({self.stream: self.last_id}, count=self.batch_size, block=block_ms)
+        if not reply:
+            return 0
+        entries = reply[0][1]
+        self.last_id = entries[-1][0]
+        X = self._rows(entries)
+        self.trainer.update(X)
+        self.stats["samples"] += len(X)
+        self.since_publish += len(X)
+        if self.since_publish >= self.publish_every and self.trainer.seen >= self.min_samples:
+            self.publish()
+        return len(X)
+
+    def publish(self) -> Optional[str]:
+        threshold = self.trainer.threshold()
+        if not math.isfinite(threshold):
+            return None
+        weights, bias = self.trainer.fold()
+        version = self.registry.publish(
+            weights, bias, threshold, self.trainer.features,
+            source="retrained", samples=self.trainer.seen, pca_components=self.trainer.n_components,
+            scaler_type="StreamingStandardScaler", based_on=self.registry.active_version()
+        )
+        self.since_publish = 0
+        self.trainer.reset_threshold()
+        self.stats["published"] += 1
+        if self.auto_promote:
+            self.registry.promote(version)
+        removed = self.registry.prune(self.keep_versions)
+        logger.info("Retrained ML model published", version=version, threshold=threshold,
+                    samples=self.trainer.seen, promoted=self.auto_promote, pruned=len(removed))
+        return version
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error("ML retraining step failed", error=str(e))
+                self._stop.wait(1.0)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def build_retrainer(auto_promote: Optional[bool] = None, from_start: bool = False) -> ModelRetrainer:
+    """Retrainer for the features and PCA size of the active model, configured from Settings"""
+    registry = ModelRegistry(settings.ml_model_path)
+    active = registry.active_version()
+    if active is None:
+        raise FileNotFoundError(f"No active model version in {settings.ml_model_path} to retrain")
+    metadata = registry.metadata(active)
+    trainer = StreamingPCATrainer(
+        metadata["features"],
+        n_components=settings.ml_retrain_components or metadata.get("pca_components") or 1,
+        half_life=settings.ml_retrain_half_life,
+        threshold_quantile=settings.ml_retrain_threshold_quantile,
+        warmup=min(settings.ml_retrain_min_samples, 1000)
+    )
+    retrainer = ModelRetrainer(
+        get_redis_client(), registry, trainer,
+        batch_size=settings.ml_retrain_batch_size,
+        publish_every=settings.ml_retrain_publish_every,
+        min_samples=settings.ml_retrain_min_samples,
+        auto_promote=settings.ml_retrain_auto_promote if auto_promote is None else auto_promote,
+        keep_versions=settings.ml_retrain_keep_versions
+    )
+    if from_start:
+        retrainer.last_id = "0"
+    return retrainer
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Retrain the ML model from the Normal records streamed by the API")
+    parser.add_argument("--auto-promote", action="store_true", default=None, help="activate every published version")
+    parser.add_argument("--from-start", action="store_true", help="train on the records already in the stream first")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    retrainer = build_retrainer(auto_promote=args.auto_promote, from_start=args.from_start)
+    logger.info("ML retraining started", stream=retrainer.stream, features=len(retrainer.trainer.features),
+                components=retrainer.trainer.n_components, auto_promote=retrainer.auto_promote)
+    try:
+        retrainer.run()
+    except KeyboardInterrupt:
+        pass
+    logger.info("ML retraining stopped", **retrainer.stats)
+
+
+if __name__ == "__main__":
+    main()
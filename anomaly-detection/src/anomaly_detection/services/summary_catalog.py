@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+from ..core.context_processor import AlarmContextProcessor
+from ..integrations.llm import LLM
+from ..integrations.summary_catalog import SummaryCatalog
+from ..utils.logging import get_logger, setup_logging
+
+"""
+Offline build of the summary catalog: one LLM summary per (tag, alarm type) of alarm_context.json,
+written next to it and served by the detectors when LLM_SUMMARY_MODE=catalog.
+
+Builds are incremental: entries of the previous catalog whose request (context, prompt, model) is
+unchanged are reused, so after an edit of the questionnaire only the changed alarms are summarized.
+
+    python -m src.anomaly_detection.services.summary_catalog [--rebuild] [--concurrency 4]
+"""
+
+logger = get_logger(__name__)
+
+
+async def build_catalog(context_processor: AlarmContextProcessor, llm: LLM,
+                        previous: Optional[SummaryCatalog] = None,
+                        concurrency: int = 4) -> Tuple[SummaryCatalog, Dict[str, Any]]:
+    """Summarize every alarm of the context that `previous` does not already cover"""
+    requests = []
+    for tag, alarms in context_processor.alarm_context.items():
+        if not isinstance(alarms, dict):
+            continue
+        for alarm_type in alarms:
+            context = context_processor.lookup_context(tag, alarm_type)
+            if context:
+                requests.append((tag, alarm_type, context, llm.cache_key(tag, alarm_type, context)))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    reused: List[Dict[str, str]] = []
+    failed: List[str] = []
+
+    async def summarize(tag: str, alarm_type: str, context: Dict[str, str], key: str) -> Optional[Dict[str, str]]:
+        text = previous.get(key) if previous is not None else None
+        if text is not None:
+            reused.append(key)
+        else:
+            async with semaphore:
+                text = await llm.asummarize(tag, alarm_type, context)
+        if text is None:
+            failed.append(f"{tag}:{alarm_type}")
+            return None
+        return {"variable": tag, "alarm_type": alarm_type, "key": key, "text": text}
+
+    entries = await asyncio.gather(*[summarize(*request) for request in requests])
+    catalog = SummaryCatalog([entry for entry in entries if entry], model=llm.model, built_at=time.time())
+    summary = {
+        "version": catalog.version,
+        "entries": len(catalog),
+        "reused": len(reused),
+        "generated": len(catalog) - len(reused),
+        "failed": failed,
+    }
+    return catalog, summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute LLM summaries for every alarm of the alarm context")
+    parser.add_argument("--alarm-context", default=settings.alarm_context_path)
+    parser.add_argument("--output", default=settings.summary_catalog_path)
+    parser.add_argument("--rebuild", action="store_true", help="summarize every alarm again instead of reusing the previous catalog")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM calls in flight")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if not os.path.exists(args.alarm_context):
+        logger.info("alarm_context.json not found, generating from Excel...")
+        AlarmContextProcessor.create_json_from_excel(settings.excel_questionnaire_path, output_json_path=args.alarm_context)
+    context_processor = AlarmContextProcessor.from_json_file(args.alarm_context)
+
+    previous = None
+    if os.path.exists(args.output) and not args.rebuild:
+        previous = SummaryCatalog.from_json_file(args.output)
+
+    catalog, summary = asyncio.run(build_catalog(context_processor, LLM(enabled=True), previous, args.concurrency))
+    catalog.save(args.output)
+    logger.info("Summary catalog built", output=args.output, **summary)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
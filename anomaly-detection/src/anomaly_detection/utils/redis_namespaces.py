@@ -0,0 +1,88 @@
+from ..config.settings import settings
+
+"""
+Redis key and TTL conventions for the anomaly detection namespace.
+See ANOMALY_REDIS_NAMESPACING.md for the full key layout.
+"""
+
+class AnomalyRedisKeys:
+    """Builders for every Redis key owned by the anomaly detection service."""
+
+    PREFIX = settings.redis_key_prefix
+
+    @classmethod
+    def temp_data(cls, sensor_name: str) -> str:
+        """anomaly:temp:data:{sensor_name}:queue"""
+        return f"{cls.PREFIX}:temp:data:{sensor_name}:queue"
+
+    @classmethod
+    def temp_window(cls, sensor_name: str) -> str:
+        """anomaly:temp:data:{sensor_name}:window (binary-encoded window)"""
+        return f"{cls.PREFIX}:temp:data:{sensor_name}:window"
+
+    @classmethod
+    def temp_sketch(cls, sensor_name: str) -> str:
+        """anomaly:temp:data:{sensor_name}:sketch (hash of time bucket id -> t-digest bytes)"""
+        return f"{cls.PREFIX}:temp:data:{sensor_name}:sketch"
+
+    @classmethod
+    def temp_version(cls, sensor_name: str) -> str:
+        """anomaly:temp:data:{sensor_name}:version (append counter of the window)"""
+        return f"{cls.PREFIX}:temp:data:{sensor_name}:version"
+
+    @classmethod
+    def sensor_registry(cls) -> str:
+        """anomaly:temp:sensors (set of sensor names with a window)"""
+        return f"{cls.PREFIX}:temp:sensors"
+
+    @classmethod
+    def sensor_from_temp_key(cls, key: str) -> str:
+        """Extract the sensor name from a temp data key; sensor names may contain ':'"""
+        head = f"{cls.PREFIX}:temp:data:"
+        return key[len(head):].rsplit(":", 1)[0]
+
+    @classmethod
+    def processing_queue(cls, batch_id: str) -> str:
+        return f"{cls.PREFIX}:queue:processing:{batch_id}"
+
+    @classmethod
+    def analysis_result(cls, analysis_id: str) -> str:
+        return f"{cls.PREFIX}:results:analysis:{analysis_id}"
+
+    @classmethod
+    def cache(cls, category: str, key: str) -> str:
+        return f"{cls.PREFIX}:cache:{category}:{key}"
+
+    @classmethod
+    def model(cls, model_name: str) -> str:
+        return f"{cls.PREFIX}:model:{model_name}"
+
+    @classmethod
+    def health(cls, component: str) -> str:
+        return f"{cls.PREFIX}:health:{component}"
+
+    @classmethod
+    def metrics(cls, metric_name: str, interval: str) -> str:
+        return f"{cls.PREFIX}:metrics:{metric_name}:{interval}"
+
+    @classmethod
+    def alert(cls, alert_id: str) -> str:
+        return f"{cls.PREFIX}:alerts:{alert_id}"
+
+    @classmethod
+    def config(cls, config_name: str) -> str:
+        return f"{cls.PREFIX}:config:{config_name}"
+
+
+class AnomalyRedisTTL:
+    """Time-to-live (seconds) for each data type in the anomaly namespace."""
+
+    TEMP_DATA = 3600            # 1 hour
+    PROCESSING_QUEUE = 1800     # 30 minutes
+    RESULTS = 86400             # 24 hours
+    CACHE = 3600                # 1 hour
+    MODEL = 86400               # 24 hours
+    HEALTH = 300                # 5 minutes
+    METRICS = 3600              # 1 hour
+    ALERTS = 604800             # 7 days
+    CONFIG = 86400              # 24 hours
@@ -0,0 +1,121 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+import redis
+import redis.asyncio
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
+
+from ..config.settings import settings
+
+"""
+Shared Redis connection pools for every component of the anomaly detection service.
+
+Pools are blocking (a caller waits up to redis_pool_timeout for a free connection rather
+than failing or opening unbounded connections), sized, timed out, kept alive, health-checked
+and retried according to Settings, and TLS-enabled with redis_ssl. One pool exists per
+(sync/async, host, port, db, decoded/raw) combination and is reused by all clients asking
+for it, so TLS handshakes are paid once per pooled connection, not per client.
+"""
+
+_pools: Dict[Tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def _connection_kwargs(decode_responses: bool) -> Dict[str, Any]:
+    kwargs = {
+        "password": settings.redis_password,
+        "decode_responses": decode_responses,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_socket_connect_timeout,
+        "socket_keepalive": settings.redis_socket_keepalive,
+        "health_check_interval": settings.redis_health_check_interval,
+        "retry_on_error": [ConnectionError, TimeoutError],
+    }
+    if settings.redis_ssl:
+        kwargs["ssl_cert_reqs"] = settings.redis_ssl_cert_reqs
+    return kwargs
+
+
+def _get_pool(is_async: bool, host: Optional[str], port: Optional[int], db: Optional[int], decode_responses: bool):
+    key = (
+        "async" if is_async else "sync",
+        host or settings.redis_host,
+        port or settings.redis_port,
+        settings.redis_db if db is None else db,
+        decode_responses,
+    )
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            module = redis.asyncio if is_async else redis
+            retry_class = AsyncRetry if is_async else Retry
+            pool = module.BlockingConnectionPool(
+                host=key[1],
+                port=key[2],
+                db=key[3],
+                max_connections=settings.redis_max_connections,
+                timeout=settings.redis_pool_timeout,
+                connection_class=module.SSLConnection if settings.redis_ssl else module.Connection,
+                retry=retry_class(ExponentialBackoff(), settings.redis_retry_attempts),
+                **_connection_kwargs(decode_responses)
+            )
+            _pools[key] = pool
+        return pool
+
+
+def get_redis_client(host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None,
+                     decode_responses: bool = True) -> redis.Redis:
+    """Sync client on the shared pool; host/port/db default to Settings."""
+    return redis.Redis(connection_pool=_get_pool(False, host, port, db, decode_responses))
+
+
+def get_async_redis_client(host: Optional[str] = None, port: Optional[int] = None, db: Optional[int] = None,
+                           decode_responses: bool = True) -> redis.asyncio.Redis:
+    """redis.asyncio client on the shared pool; host/port/db default to Settings."""
+    return redis.asyncio.Redis(connection_pool=_get_pool(True, host, port, db, decode_responses))
+
+
+def _pool_usage(pool) -> Dict[str, int]:
+    if hasattr(pool, "_in_use_connections"):
+        # redis.asyncio pools track checked-out and idle connections directly
+        in_use = len(pool._in_use_connections)
+        idle = len(pool._available_connections)
+    else:
+        # Sync BlockingConnectionPool: a LIFO queue of idle connections padded with None
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        in_use = len(pool._connections) - idle
+    return {"in_use": in_use, "idle": idle}
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Utilization of every shared pool, for /stats."""
+    stats = {}
+    with _lock:
+        pools = list(_pools.items())
+    for (kind, host, port, db, decode_responses), pool in pools:
+        usage = _pool_usage(pool)
+        stats[f"{kind}:{host}:{port}/{db}:{'decoded' if decode_responses else 'raw'}"] = {
+            **usage,
+            "max_connections": pool.max_connections,
+            "utilization": round(usage["in_use"] / pool.max_connections, 3),
+        }
+    return stats
+
+
+def close_pools() -> None:
+    """Disconnect the sync pools."""
+    with _lock:
+        sync_pools = [key for key in _pools if key[0] == "sync"]
+        for key in sync_pools:
+            _pools.pop(key).disconnect()
+
+
+async def aclose_pools() -> None:
+    """Disconnect every pool; async pools must be closed from their event loop."""
+    close_pools()
+    with _lock:
+        async_pools = [_pools.pop(key) for key in list(_pools) if key[0] == "async"]
+    for pool in async_pools:
+        await pool.disconnect()
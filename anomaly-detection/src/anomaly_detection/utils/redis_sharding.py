@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+from bisect import bisect
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from redis.exceptions import NoScriptError
+
+from .redis_pool import get_redis_client, get_async_redis_client
+
+"""
+Consistent-hash routing of per-sensor Redis state over several Redis nodes.
+
+A node is named by a "host:port/db" spec. Every node owns `replicas` points on a 64-bit hash
+ring and a sensor belongs to the first node point clockwise of hash(sensor name), so adding
+or removing a node only moves the sensors of the ring segments it takes over or gives back.
+"""
+
+
+def parse_redis_node(spec: str) -> Tuple[str, int, int]:
+    """Parse "host:port/db" (port defaults to 6379, db to 0)"""
+    address, _, db = spec.partition("/")
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host, int(port or 6379), int(db or 0)
+
+
+def node_name(host: str, port: int, db: int) -> str:
+    return f"{host}:{port}/{db}"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """Maps keys to nodes; `replicas` virtual points per node smooth out the distribution."""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 160) -> None:
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add_node(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            index = bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def get_node(self, key: str) -> str:
+        if not self._points:
+            raise ValueError("Consistent hash ring has no nodes")
+        index = bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class RedisShard:
+    """Clients of one Redis node, all on the shared connection pools."""
+
+    def __init__(self, spec: str) -> None:
+        host, port, db = parse_redis_node(spec)
+        self.name = node_name(host, port, db)
+        self.client = get_redis_client(host, port, db)
+        self.async_client = get_async_redis_client(host, port, db)
+        # Binary windows, sketches and DUMP payloads must be read without response decoding
+        self.raw_client = get_redis_client(host, port, db, decode_responses=False)
+        self.async_raw_client = get_async_redis_client(host, port, db, decode_responses=False)
+
+    def load_scripts(self, scripts: Sequence[Any]) -> None:
+        """SCRIPT LOAD the registered Lua scripts into the node, in one round trip"""
+        pipe = self.client.pipeline(transaction=False)
+        for script in scripts:
+            pipe.script_load(script.script)
+        pipe.execute()
+
+
+class ShardedPipeline:
+    """
+    One pipeline per node, opened on first use and executed together.
+
+    Scripts are called by plain EVALSHA, so no pipeline pays a SCRIPT EXISTS round trip. A node
+    that answers NOSCRIPT (restarted or flushed) gets `scripts` loaded and its pipeline replayed
+    once; a transaction stops its scripts there, and the other commands queued next to them
+    must be safe to repeat.
+    """
+
+    def __init__(self, clients: Dict[str, Any], transaction: bool = True, scripts: Sequence[Any] = ()) -> None:
+        self._clients = clients
+        self._transaction = transaction
+        self._scripts = scripts
+        self._pipes: Dict[str, Any] = {}
+
+    def __getitem__(self, node: str):
+        pipe = self._pipes.get(node)
+        if pipe is None:
+            pipe = self._pipes[node] = self._clients[node].pipeline(transaction=self._transaction)
+        return pipe
+
+    def execute(self) -> Dict[str, List[Any]]:
+        return {node: self._execute_node(node) for node in self._pipes}
+
+    async def aexecute(self) -> Dict[str, List[Any]]:
+        nodes = list(self._pipes)
+        replies = await asyncio.gather(*[self._aexecute_node(node) for node in nodes])
+        return dict(zip(nodes, replies))
+
+    def _execute_node(self, node: str) -> List[Any]:
+        pipe = self._pipes[node]
+        commands = list(pipe.command_stack)
+        try:
+            return pipe.execute()
+        except NoScriptError:
+            if not self._scripts:
+                raise
+        for script in self._scripts:
+            self._clients[node].script_load(script.script)
+        pipe.command_stack = commands
+        return pipe.execute()
+
+    async def _aexecute_node(self, node: str) -> List[Any]:
+        pipe = self._pipes[node]
+        commands = list(pipe.command_stack)
+        try:
+            return await pipe.execute()
+        except NoScriptError:
+            if not self._scripts:
+                raise
+        for script in self._scripts:
+            await self._clients[node].script_load(script.script)
+        pipe.command_stack = commands
+        return await pipe.execute()
+
+
+def group_by_node(ring: ConsistentHashRing, keys: Iterable[str]) -> Dict[str, List[str]]:
+    """Bucket keys by owning node, preserving their order"""
+    groups: Dict[str, List[str]] = {}
+    for key in keys:
+        groups.setdefault(ring.get_node(key), []).append(key)
+    return groups
@@ -0,0 +1,130 @@
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+import redis
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from anomaly_detection.core.StatisticalAnomalyDetector import StatisticalAnomalyDetector  # noqa: E402
+from anomaly_detection.core.context_processor import AlarmContextProcessor  # noqa: E402
+from anomaly_detection.core.model_registry import ModelRegistry, fold_pipeline  # noqa: E402
+from anomaly_detection.integrations.llm import LLM  # noqa: E402
+from anomaly_detection.models.schemas import SensorData  # noqa: E402
+from anomaly_detection.utils import redis_pool  # noqa: E402
+
+"""
+Shared fixtures: throwaway redis-server processes on free local ports, statistical detectors
+wired to them with the LLM disabled, and an ML model registry fitted on the fixture sensors.
+Tests needing Redis are skipped when redis-server is not installed.
+"""
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# Mean and standard deviation of the sensors in fixtures/backfill_history.csv
+FIXTURE_SENSORS = {"TI-101": (80.0, 4.0), "PI-202": (12.0, 0.8), "FI-303": (250.0, 15.0), "LI-404": (55.0, 6.0)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def redis_ports():
+    """Start `count` empty redis-server processes; returns their ports"""
+    if shutil.which("redis-server") is None:
+        pytest.skip("redis-server is not installed")
+    processes = []
+
+    def start(count: int = 1):
+        ports = []
+        for _ in range(count):
+            port = _free_port()
+            processes.append(subprocess.Popen(
+                ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            client = redis.Redis(port=port)
+            for _ in range(100):
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    time.sleep(0.05)
+            ports.append(port)
+        return ports
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait()
+    # Async pools are bound to the event loop of the test that opened them
+    for key in [key for key in redis_pool._pools if key[0] == "async"]:
+        del redis_pool._pools[key]
+
+
+@pytest.fixture
+def make_detector():
+    """Build a StatisticalAnomalyDetector on local nodes, LLM disabled"""
+    def make(ports, **kwargs):
+        options = dict(window_size=20, min_data_points=5, eval_mode="local", window_encoding="json")
+        options.update(kwargs)
+        return StatisticalAnomalyDetector(
+            redis_host="127.0.0.1",
+            redis_port=ports[0],
+            redis_db=0,
+            key_prefix="anomaly",
+            context_processor=AlarmContextProcessor(),
+            llm=LLM(enabled=False),
+            redis_nodes=[f"127.0.0.1:{port}/0" for port in ports],
+            **options,
+        )
+    return make
+
+
+@pytest.fixture
+def sensor_records():
+    """Reproducible multi-sensor records, one second apart, with occasional spikes"""
+    def make(count: int, sensors: int = 6, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        start = datetime(2026, 1, 1)
+        records = []
+        for i in range(count):
+            values = rng.normal(50.0, 5.0, sensors)
+            values[rng.random(sensors) < 0.05] += 60.0
+            records.append(SensorData(
+                timestamp=start + timedelta(seconds=i),
+                data={f"sensor_{j}": round(float(v), 3) for j, v in enumerate(values)},
+            ))
+        return records
+    return make
+
+
+@pytest.fixture
+def ml_model_path(tmp_path):
+    """Registry with an active scaler + PCA model fitted on normal readings of the fixture sensors"""
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+    import pandas as pd
+
+    features = list(FIXTURE_SENSORS)
+    rng = np.random.default_rng(1)
+    means, scales = np.array(list(FIXTURE_SENSORS.values())).T
+    X = pd.DataFrame(rng.normal(means, scales, (2000, len(features))), columns=features)
+    scaler = StandardScaler().fit(X)
+    pca = PCA(n_components=2).fit(scaler.transform(X))
+    weights, bias = fold_pipeline(scaler, pca, features)
+    residual = X.to_numpy() @ weights + bias
+    threshold = float(np.percentile(np.mean(residual**2, axis=1), 95))
+
+    registry = ModelRegistry(str(tmp_path / "models"))
+    registry.promote(registry.publish(weights, bias, threshold, features, source="test"))
+    return str(tmp_path / "models")
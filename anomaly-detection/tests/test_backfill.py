@@ -0,0 +1,135 @@
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+from anomaly_detection.core.HeuristicAnomalyDetector import HeuristicAnomalyDetector
+from anomaly_detection.core.MLAnomalyDetector import MLAnomalyDetector
+from anomaly_detection.core.context_processor import AlarmContextProcessor
+from anomaly_detection.core.model_registry import ModelRegistry
+from anomaly_detection.integrations.llm import LLM
+from anomaly_detection.models.schemas import SensorData
+from anomaly_detection.config.settings import settings
+from anomaly_detection.services.backfill import BackfillEngine, backfill, build_engine
+
+from conftest import FIXTURES, FIXTURE_SENSORS
+
+"""
+Offline backfill of fixtures/backfill_history.csv equals posting its rows one by one to the
+online detectors, statistical windows starting empty, with chunks smaller than the file.
+"""
+
+HISTORY = FIXTURES / "backfill_history.csv"
+THRESHOLDS = {
+    "TI-101": {"Low-Low": 66.0, "Low": 72.0, "High": 88.0, "High-High": 94.0},
+    "PI-202": {"Low-Low": 9.5, "Low": 10.5, "High": 13.5, "High-High": 14.5},
+    "FI-303": {"Low-Low": 200.0, "Low": 220.0, "High": 280.0, "High-High": 300.0},
+    "LI-404": {"Low-Low": 35.0, "Low": 43.0, "High": 67.0, "High-High": 75.0},
+}
+WINDOW_SIZE, MIN_DATA_POINTS = 20, 5
+
+
+def _records():
+    frame = pd.read_csv(HISTORY)
+    records = []
+    for row in frame.to_dict("records"):
+        timestamp = row.pop("timestamp")
+        data = {sensor: value for sensor, value in row.items() if not np.isnan(value)}
+        records.append(SensorData(timestamp=timestamp, data=data))
+    return records
+
+
+def _engine(ml_model_path):
+    return BackfillEngine(
+        thresholds=THRESHOLDS,
+        window_size=WINDOW_SIZE,
+        min_data_points=MIN_DATA_POINTS,
+        ml_detector=MLAnomalyDetector(model_path=ml_model_path),
+    )
+
+
+def _backfilled(tmp_path, engine, workers=1):
+    output = tmp_path / "results.csv"
+    summary = backfill(str(HISTORY), str(output), engine=engine, chunk_size=40, workers=workers)
+    return summary, pd.read_csv(output)
+
+
+def _column(frame, name):
+    return [None if pd.isna(value) else value for value in frame[name]]
+
+
+@pytest.fixture
+def online(redis_ports, make_detector, ml_model_path):
+    """Per-record results of the three online detectors"""
+    port, = redis_ports(1)
+    heuristic = HeuristicAnomalyDetector(thresholds=THRESHOLDS, context_processor=AlarmContextProcessor(),
+                                         llm=LLM(enabled=False))
+    statistical = make_detector([port], window_size=WINDOW_SIZE, min_data_points=MIN_DATA_POINTS)
+    ml = MLAnomalyDetector(model_path=ml_model_path)
+    records = _records()
+    return records, {
+        "heuristic": [heuristic.evaluate_anomaly(record) for record in records],
+        "statistical": [statistical.evaluate_anomaly(record) for record in records],
+        "ml": [ml.evaluate_anomaly(record) for record in records],
+    }
+
+
+def test_backfill_matches_online_detectors(tmp_path, ml_model_path, online):
+    records, expected = online
+    summary, results = _backfilled(tmp_path, _engine(ml_model_path))
+    assert summary["rows"] == len(records)
+
+    for method in ("heuristic", "statistical"):
+        for sensor in THRESHOLDS:
+            assert _column(results, f"{sensor}.{method}") == [
+                result[sensor].alarm_type if sensor in result else None for result in expected[method]
+            ], f"{sensor}.{method}"
+
+    assert list(results["ml.status"]) == [result.status for result in expected["ml"]]
+    errors = [np.nan if result.reconstruction_error is None else result.reconstruction_error for result in expected["ml"]]
+    np.testing.assert_allclose(results["ml.reconstruction_error"], errors, rtol=1e-12, equal_nan=True)
+
+    anomalies = sum(result.status == "Anomaly" for result in expected["ml"])
+    assert 0 < anomalies < len(records)
+    assert summary["anomalies"]["ml"] == anomalies
+
+
+def test_backfill_in_worker_processes(tmp_path, ml_model_path):
+    engine = _engine(ml_model_path)
+    # A used enrichment pool must not keep the engine from being shipped to the workers
+    engine.heuristic.enrichment.run([("TI-101", "High"), ("PI-202", "Low")],
+                                    lambda *key: ("", True), lambda *key: ("", False))
+    assert engine.heuristic.enrichment._executor is not None
+
+    summary, results = _backfilled(tmp_path, engine)
+    (tmp_path / "parallel").mkdir()
+    parallel_summary, parallel = _backfilled(tmp_path / "parallel", engine, workers=2)
+
+    pd.testing.assert_frame_equal(parallel, results)
+    assert parallel_summary["anomalies"] == summary["anomalies"]
+
+
+def test_backfill_engine_leaves_registry_untouched(ml_model_path, monkeypatch):
+    # Legacy artifacts the online service would import and promote
+    features = list(FIXTURE_SENSORS)
+    X = pd.DataFrame(np.random.default_rng(2).normal(50.0, 5.0, (200, len(features))), columns=features)
+    scaler = StandardScaler().fit(X)
+    joblib.dump(scaler, f"{ml_model_path}/scaler.pkl")
+    joblib.dump(PCA(n_components=2).fit(scaler.transform(X)), f"{ml_model_path}/pca.pkl")
+    joblib.dump(0.5, f"{ml_model_path}/threshold.pkl")
+    with open(f"{ml_model_path}/features.json", "w") as f:
+        json.dump(features, f)
+    monkeypatch.setattr(settings, "ml_model_path", ml_model_path)
+
+    registry = ModelRegistry(ml_model_path)
+    active, versions = (registry.root / registry.POINTER).read_text(), registry.versions()
+    engine = build_engine(methods=["ml"])
+
+    assert engine.ml_detector.version == registry.active_version()
+    assert engine.ml_detector.metadata["source"] == "test"
+    assert (registry.root / registry.POINTER).read_text() == active
+    assert registry.versions() == versions
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from anomaly_detection.api import main
+from anomaly_detection.models.schemas import (
+    CombinedDetectionResponse, DetectionMethod, DetectionResponse, MLAnomalyResult, MLDetectionResponse
+)
+
+"""
+The /ws/detect channel answers every frame in order, including the records of a batch whose
+evaluation failed, and closes with 1011 if its evaluation worker dies.
+"""
+
+
+def _frame(i):
+    return {"timestamp": f"2026-01-01T00:00:{i:02d}", "data": {"TI-101": 80.0 + i}}
+
+
+def _response(record):
+    def detection(method):
+        return DetectionResponse(timestamp=record.timestamp, method=method, results={}, processing_time_ms=0.0)
+
+    ml = MLDetectionResponse(timestamp=record.timestamp, method=DetectionMethod.ML,
+                             results=MLAnomalyResult(values=record.data, status="Normal"), processing_time_ms=0.0)
+    return CombinedDetectionResponse(timestamp=record.timestamp, heuristic=detection(DetectionMethod.HEURISTIC),
+                                     statistical=detection(DetectionMethod.STATISTICAL), ml=ml,
+                                     processing_time_ms=0.0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # No lifespan: the detectors are replaced below
+    return TestClient(main.app)
+
+
+def test_failed_batch_is_answered_with_errors(client, monkeypatch):
+    calls = []
+
+    async def adetect_all_batch(records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise RuntimeError("Redis unavailable")
+        return [_response(record) for record in records]
+
+    monkeypatch.setattr(main.anomaly_service, "adetect_all_batch", adetect_all_batch)
+    with client.websocket_connect("/ws/detect") as websocket:
+        websocket.send_json(_frame(0))
+        first = websocket.receive_json()
+        for i in range(1, 4):
+            websocket.send_json(_frame(i))
+        rest = [websocket.receive_json() for _ in range(3)]
+
+    assert first["error"] == "Detection failed" and "Redis unavailable" in first["detail"]
+    assert [datetime.fromisoformat(frame["timestamp"]).second for frame in rest] == [1, 2, 3]
+    assert sum(calls) == 4
+
+
+def test_worker_failure_closes_with_internal_error(client, monkeypatch):
+    async def adetect_all_batch(records):
+        return []  # fewer results than records: the worker cannot answer them
+
+    monkeypatch.setattr(main.anomaly_service, "adetect_all_batch", adetect_all_batch)
+    with client.websocket_connect("/ws/detect") as websocket:
+        websocket.send_json(_frame(0))
+        with pytest.raises(WebSocketDisconnect) as closed:
+            for i in range(1, 50):
+                websocket.send_json(_frame(i))
+            websocket.receive_json()
+    assert closed.value.code == 1011
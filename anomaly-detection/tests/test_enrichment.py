@@ -0,0 +1,29 @@
+import pickle
+
+from anomaly_detection.core.enrichment import EnrichmentRunner
+
+"""
+EnrichmentRunner travels with the detectors into backfill worker processes, so it must pickle
+after its thread pool has been started and work again on the other side.
+"""
+
+
+def _summarize(var, alarm_type):
+    return f"{var} {alarm_type}", True
+
+
+def _fallback(var, alarm_type):
+    return "fallback", False
+
+
+def test_runner_pickles_after_use():
+    runner = EnrichmentRunner(deadline=5.0, max_workers=2)
+    keys = [("TI-101", "High"), ("PI-202", "Low")]
+    assert runner.run(keys, _summarize, _fallback) == {key: _summarize(*key) for key in keys}
+    assert runner._executor is not None
+
+    copy = pickle.loads(pickle.dumps(runner))
+    assert copy._executor is None
+    assert (copy.deadline, copy.max_workers, copy.stats) == (5.0, 2, runner.stats)
+    assert copy.run(keys, _summarize, _fallback) == {key: _summarize(*key) for key in keys}
+    assert copy.stats["summaries"] == 4
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from anomaly_detection.config.settings import settings
+from anomaly_detection.integrations.llm import LLM
+from anomaly_detection.integrations.llm_gateway import GatewayRejected, LLMGateway
+
+"""
+LLMGateway in front of a local OpenAI-compatible stub (llm_base_url): the circuit breaker,
+the per-minute budget and the concurrency limit, seen from the requests the stub receives.
+"""
+
+CONTEXT = {"Cause": "Cooling water valve stuck", "Actions": "Check the valve positioner"}
+USAGE_TOKENS = 120
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))))
+        with server.lock:
+            server.hits += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        if server.failing:
+            payload, status = {"error": {"message": "upstream down"}}, 503
+        else:
+            payload, status = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "stub summary"}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": USAGE_TOKENS},
+            }, 200
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletions)
+    server.lock = threading.Lock()
+    server.hits = server.in_flight = server.max_in_flight = 0
+    server.delay, server.failing = 0.0, False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "llm_base_url", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(settings, "azure_openai_deployment", "stub-model")
+    monkeypatch.setattr(settings, "llm_max_retries", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _summarize(llm):
+    return llm.summarize("TI-101", "High", CONTEXT)
+
+
+def test_circuit_opens_then_half_opens_after_cooldown(stub):
+    gateway = LLMGateway(failure_threshold=3, reset_timeout=0.3)
+    llm = LLM(gateway=gateway)
+    stub.failing = True
+
+    assert [_summarize(llm) for _ in range(3)] == [None] * 3
+    assert stub.hits == 3
+    assert gateway.get_stats()["state"] == LLMGateway.OPEN
+
+    # Open: shed without touching the network
+    assert _summarize(llm) is None
+    assert stub.hits == 3
+    assert gateway.get_stats()["rejected_open"] == 1
+
+    # Half-open after the cooldown: one failed trial opens the circuit again at once
+    time.sleep(0.35)
+    assert _summarize(llm) is None
+    assert _summarize(llm) is None
+    assert stub.hits == 4
+    assert gateway.get_stats()["circuit_opened"] == 2
+
+    # A successful trial closes it
+    stub.failing = False
+    time.sleep(0.35)
+    assert _summarize(llm) == "stub summary"
+    assert _summarize(llm) == "stub summary"
+    assert stub.hits == 6
+    assert gateway.get_stats()["state"] == LLMGateway.CLOSED
+
+
+def _fail():
+    raise RuntimeError("upstream down")
+
+
+def test_only_the_trial_call_leaves_half_open():
+    gateway = LLMGateway(failure_threshold=2, reset_timeout=0.2)
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "late"
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # Started while the circuit was closed, finishes after it opened
+        old = pool.submit(gateway.call, slow)
+        time.sleep(0.05)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                gateway.call(_fail)
+        assert gateway.get_stats()["state"] == LLMGateway.OPEN
+
+        time.sleep(0.25)
+        trial_started, finish_trial = threading.Event(), threading.Event()
+
+        def trial():
+            trial_started.set()
+            finish_trial.wait(5)
+            return "trial"
+
+        pending_trial = pool.submit(gateway.call, trial)
+        trial_started.wait(5)
+        release.set()
+        assert old.result(5) == "late"
+
+        # The old call neither closed the circuit nor ended the trial
+        assert gateway.get_stats()["state"] == LLMGateway.HALF_OPEN
+        with pytest.raises(GatewayRejected):
+            gateway.call(lambda: "second trial")
+
+        finish_trial.set()
+        assert pending_trial.result(5) == "trial"
+    assert gateway.get_stats()["state"] == LLMGateway.CLOSED
+    assert gateway.call(lambda: "closed") == "closed"
+
+
+def test_request_budget_per_minute(stub):
+    gateway = LLMGateway(requests_per_minute=3)
+    llm = LLM(gateway=gateway)
+
+    assert [_summarize(llm) for _ in range(5)] == ["stub summary"] * 3 + [None] * 2
+    assert stub.hits == 3
+    assert gateway.get_stats()["rejected_rate"] == 2
+
+
+def test_token_budget_per_minute(stub):
+    llm = LLM()
+    estimate = llm.estimate_tokens(llm._messages("TI-101", "High", CONTEXT))
+    # Room for the estimate of one call on top of the actual usage of one finished call
+    gateway = llm.gateway = LLMGateway(tokens_per_minute=estimate + USAGE_TOKENS)
+
+    assert [_summarize(llm) for _ in range(3)] == ["stub summary"] * 2 + [None]
+    assert stub.hits == 2
+    stats = gateway.get_stats()
+    assert (stats["rejected_tokens"], stats["tokens_last_minute"]) == (1, 2 * USAGE_TOKENS)
+
+
+def test_concurrency_limit(stub):
+    stub.delay = 0.2
+    llm = LLM(gateway=LLMGateway(max_concurrency=2, acquire_timeout=5.0))
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        summaries = list(pool.map(lambda _: _summarize(llm), range(6)))
+    assert summaries == ["stub summary"] * 6
+    assert stub.max_in_flight == 2
+
+
+def test_concurrency_limit_sheds_after_acquire_timeout(stub):
+    stub.delay = 0.5
+    gateway = LLMGateway(max_concurrency=2, acquire_timeout=0.1)
+    llm = LLM(gateway=gateway)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        summaries = list(pool.map(lambda _: _summarize(llm), range(4)))
+    assert sorted(summaries, key=str) == [None] * 2 + ["stub summary"] * 2
+    assert stub.hits == 2
+    assert gateway.get_stats()["rejected_concurrency"] == 2
+
+
+def test_async_concurrency_limit(stub):
+    stub.delay = 0.2
+    llm = LLM(gateway=LLMGateway(max_concurrency=2, acquire_timeout=5.0))
+
+    async def summarize_all():
+        return await asyncio.gather(*[llm.asummarize("TI-101", "High", CONTEXT) for _ in range(6)])
+
+    assert asyncio.run(summarize_all()) == ["stub summary"] * 6
+    assert stub.max_in_flight == 2
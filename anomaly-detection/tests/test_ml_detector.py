@@ -0,0 +1,49 @@
+import math
+
+from anomaly_detection.core.MLAnomalyDetector import MLAnomalyDetector
+from anomaly_detection.models.schemas import SensorData
+from anomaly_detection.services.anomaly_service import AnomalyDetectionService
+from anomaly_detection.services.ml_retraining import TrainingFeed
+
+from conftest import FIXTURE_SENSORS
+
+"""
+Records the ML model cannot score (missing features, NaN or Infinity readings) get status Error
+and never reach the training feed as Normal samples.
+"""
+
+NORMAL = {sensor: mean for sensor, (mean, _) in FIXTURE_SENSORS.items()}
+
+
+def _record(**values):
+    return SensorData(timestamp="2026-01-01T00:00:00", data={**NORMAL, **values})
+
+
+def test_non_finite_readings_are_errors(ml_model_path):
+    detector = MLAnomalyDetector(model_path=ml_model_path)
+    parsed = SensorData.model_validate_json(
+        '{"timestamp": "2026-01-01T00:00:00", "data": {"TI-101": NaN, "PI-202": 12.0, "FI-303": Infinity, "LI-404": 55.0}}'
+    )
+    records = [_record(), parsed, _record(**{"PI-202": math.inf}), _record(**{"LI-404": -math.inf})]
+
+    results = detector.evaluate_batch(records)
+    assert [result.status for result in results] == ["Normal", "Error", "Error", "Error"]
+    assert results[0].reconstruction_error is not None
+    assert all(result.reconstruction_error is None for result in results[1:])
+    assert detector.evaluate_anomaly(parsed).status == "Error"
+
+
+def test_only_scored_normal_records_are_fed_to_training(ml_model_path):
+    service = AnomalyDetectionService()
+    service._initialized = True
+    service.ml_detector = MLAnomalyDetector(model_path=ml_model_path)
+    service.training_feed = TrainingFeed(redis_client=None)
+    records = [_record(), _record(**{"TI-101": math.nan}), _record(**{"FI-303": math.inf}), _record()]
+
+    batch = service.detect_ml_batch(records)
+    assert [result.results.status for result in batch.results] == ["Normal", "Error", "Error", "Normal"]
+    for record in records:
+        service.detect_ml_anomalies(record)
+
+    assert service.training_feed.get_stats()["offered"] == 4
+    assert all(math.isfinite(value) for values in service.training_feed._buffer for value in values.values())
@@ -0,0 +1,37 @@
+import numpy as np
+
+from anomaly_detection.services.ml_retraining import StreamingPCATrainer
+
+"""
+StreamingPCATrainer sets the threshold at `threshold_quantile` of the reconstruction errors of
+the Normal records it trained on.
+"""
+
+
+def _normal_records(rng, count):
+    latent = rng.standard_normal((count, 2))
+    mixing = np.array([[1.0, 0.5, -0.8, 0.2, 0.0], [0.0, 1.0, 0.4, -1.2, 0.7]])
+    X = latent @ mixing + 0.2 * rng.standard_normal((count, 5))
+    return X * [5.0, 0.5, 20.0, 2.0, 1.0] + [80.0, 12.0, 250.0, 55.0, 3.0]
+
+
+def test_threshold_at_quantile_of_training_errors():
+    rng = np.random.default_rng(0)
+    trainer = StreamingPCATrainer([f"f{i}" for i in range(5)], n_components=2, half_life=0,
+                                  threshold_quantile=0.99, warmup=1000)
+    errors = []
+    for _ in range(60):
+        batch = _normal_records(rng, 500)
+        if trainer.seen >= trainer.warmup:
+            # Scored with the model before the batch, as the trainer does
+            weights, bias = trainer.fold()
+            errors.append(np.mean((batch @ weights + bias)**2, axis=1))
+        trainer.update(batch)
+
+    threshold = trainer.threshold()
+    errors = np.concatenate(errors)
+    assert 0.005 < np.mean(errors > threshold) < 0.02
+
+    weights, bias = trainer.fold()
+    fresh = _normal_records(rng, 20000)
+    assert 0.005 < np.mean(np.mean((fresh @ weights + bias)**2, axis=1) > threshold) < 0.02
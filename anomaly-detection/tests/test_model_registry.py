@@ -0,0 +1,92 @@
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+
+from anomaly_detection.core.MLAnomalyDetector import MLAnomalyDetector
+from anomaly_detection.core.model_registry import ModelRegistry, fold_pipeline
+
+"""
+The scaler and PCA folded into one affine map give the reconstruction errors of the sklearn
+pipeline, so models can be served without sklearn.
+"""
+
+FEATURES = [f"f{i}" for i in range(6)]
+
+
+def _training_data(seed=0):
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((500, 2))
+    mixing = rng.standard_normal((2, len(FEATURES)))
+    X = latent @ mixing + 0.1 * rng.standard_normal((500, len(FEATURES)))
+    return pd.DataFrame(X * rng.uniform(1, 50, len(FEATURES)) + rng.uniform(-100, 100, len(FEATURES)),
+                        columns=FEATURES)
+
+
+def _sklearn_errors(scaler, pca, X):
+    X_scaled = scaler.transform(pd.DataFrame(X, columns=FEATURES))
+    return np.mean((X_scaled - pca.inverse_transform(pca.transform(X_scaled)))**2, axis=1)
+
+
+@pytest.mark.parametrize("scaler_type", [StandardScaler, MinMaxScaler, RobustScaler])
+@pytest.mark.parametrize("whiten", [False, True])
+def test_folded_pipeline_matches_sklearn(scaler_type, whiten):
+    train = _training_data()
+    scaler = scaler_type().fit(train)
+    pca = PCA(n_components=2, whiten=whiten).fit(scaler.transform(train))
+    weights, bias = fold_pipeline(scaler, pca, FEATURES)
+
+    # Training points and points well outside their distribution
+    X = np.vstack([train.to_numpy(), _training_data(seed=1).to_numpy() * 3])
+    folded = np.mean((X @ weights + bias)**2, axis=1)
+    assert np.allclose(folded, _sklearn_errors(scaler, pca, X), rtol=1e-9, atol=1e-12)
+
+
+def _write_legacy_artifacts(path):
+    train = _training_data()
+    scaler = StandardScaler().fit(train)
+    pca = PCA(n_components=3).fit(scaler.transform(train))
+    joblib.dump(scaler, path / "scaler.pkl")
+    joblib.dump(pca, path / "pca.pkl")
+    joblib.dump(0.05, path / "threshold.pkl")
+    (path / "features.json").write_text(json.dumps(FEATURES))
+    return scaler, pca
+
+
+def test_legacy_artifacts_served_by_detector(tmp_path):
+    scaler, pca = _write_legacy_artifacts(tmp_path)
+
+    detector = MLAnomalyDetector(model_path=str(tmp_path))
+    assert ModelRegistry(str(tmp_path)).active_version() == detector.version
+
+    X = _training_data(seed=2).to_numpy()
+    assert np.allclose(detector.reconstruction_errors(X), _sklearn_errors(scaler, pca, X), rtol=1e-9, atol=1e-12)
+
+
+def test_pruned_legacy_version_is_not_imported_again(tmp_path):
+    _write_legacy_artifacts(tmp_path)
+    legacy = MLAnomalyDetector(model_path=str(tmp_path)).version
+
+    # The retrainer publishes, promotes and prunes until the legacy version is gone
+    registry = ModelRegistry(str(tmp_path))
+    rng = np.random.default_rng(3)
+    for i in range(25):
+        weights, bias = rng.standard_normal((len(FEATURES), len(FEATURES))), rng.standard_normal(len(FEATURES))
+        retrained = registry.publish(weights, bias, 1.0, FEATURES, source="retrainer")
+        registry.promote(retrained)
+        registry.prune(20)
+    assert legacy not in [meta["version"] for meta in registry.versions()]
+
+    # Reloads keep the retrained model
+    assert MLAnomalyDetector(model_path=str(tmp_path)).version == retrained
+    assert registry.active_version() == retrained
+    assert all(meta["source"] == "retrainer" for meta in registry.versions())
+
+    # Changed legacy artifacts are still imported and promoted
+    joblib.dump(0.07, tmp_path / "threshold.pkl")
+    detector = MLAnomalyDetector(model_path=str(tmp_path))
+    assert detector.metadata["source"] == "legacy" and detector.threshold == 0.07
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+"""
+The window scripts are loaded once per node and called by plain EVALSHA: no pipeline pays a
+SCRIPT EXISTS round trip, and a node that lost its scripts is reloaded on NOSCRIPT.
+"""
+
+
+def _calls(client, command: str) -> int:
+    return client.info("commandstats").get(f"cmdstat_{command}", {}).get("calls", 0)
+
+
+def _script_calls(client) -> int:
+    # Redis 7 counts SCRIPT subcommands separately, Redis 6 under "script"
+    return _calls(client, "script") + _calls(client, "script|exists") + _calls(client, "script|load")
+
+
+def _alarm_types(results):
+    return [{name: result.alarm_type for name, result in record.items()} for record in results]
+
+
+@pytest.mark.parametrize("eval_mode,window_encoding", [("lua", "json"), ("lua", "binary"), ("local", "binary")])
+def test_no_script_exists_round_trips(redis_ports, make_detector, sensor_records, eval_mode, window_encoding):
+    port, = redis_ports(1)
+    detector = make_detector([port], eval_mode=eval_mode, window_encoding=window_encoding)
+    client = detector.shards[f"127.0.0.1:{port}/0"].client
+
+    loaded = _script_calls(client)
+    records = sensor_records(40)
+    detector.evaluate_batch(records[:20])
+    asyncio.run(detector.aevaluate_batch(records[20:]))
+
+    assert _script_calls(client) == loaded
+    assert _calls(client, "evalsha") >= 40
+
+
+def test_scripts_reloaded_after_flush(redis_ports, make_detector, sensor_records):
+    port, = redis_ports(1)
+    records = sensor_records(30)
+    expected = _alarm_types(make_detector([port], eval_mode="lua").evaluate_batch(records))
+
+    other, = redis_ports(1)
+    detector = make_detector([other], eval_mode="lua")
+    client = detector.shards[f"127.0.0.1:{other}/0"].client
+    results = detector.evaluate_batch(records[:10])
+    loaded = _script_calls(client)
+    client.script_flush()
+    results += detector.evaluate_batch(records[10:20])
+    client.script_flush()
+    results += asyncio.run(detector.aevaluate_batch(records[20:]))
+
+    assert _alarm_types(results) == expected
+    # Two flushes, each followed by one reload of the two scripts
+    assert _script_calls(client) == loaded + 2 + 2 * 2
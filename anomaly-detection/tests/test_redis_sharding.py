@@ -0,0 +1,60 @@
+import pytest
+
+from anomaly_detection.utils.redis_sharding import ConsistentHashRing, group_by_node
+
+"""
+Consistent hashing of sensors over Redis nodes: placement is stable, adding a node only moves
+keys onto it, and a sharded detector classifies exactly like a single-node one.
+"""
+
+NODES = ["10.0.0.1:6379/0", "10.0.0.2:6379/0", "10.0.0.3:6379/0"]
+KEYS = [f"sensor_{i}" for i in range(2000)]
+
+
+def test_placement_is_stable():
+    ring = ConsistentHashRing(NODES)
+    placement = {key: ring.get_node(key) for key in KEYS}
+
+    assert {key: ConsistentHashRing(reversed(NODES)).get_node(key) for key in KEYS} == placement
+    assert {key: ring.get_node(key) for key in KEYS} == placement
+    # Every node gets a fair share
+    counts = {node: len(keys) for node, keys in group_by_node(ring, KEYS).items()}
+    assert set(counts) == set(NODES)
+    assert min(counts.values()) > len(KEYS) / len(NODES) / 2
+
+
+def test_keys_move_only_to_added_node():
+    ring = ConsistentHashRing(NODES[:2])
+    before = {key: ring.get_node(key) for key in KEYS}
+    ring.add_node(NODES[2])
+    after = {key: ring.get_node(key) for key in KEYS}
+
+    moved = [key for key in KEYS if after[key] != before[key]]
+    assert moved
+    assert all(after[key] == NODES[2] for key in moved)
+
+    ring.remove_node(NODES[2])
+    assert {key: ring.get_node(key) for key in KEYS} == before
+
+
+def _alarm_types(results):
+    return [{name: result.alarm_type for name, result in record.items()} for record in results]
+
+
+@pytest.mark.parametrize("eval_mode,window_encoding", [("local", "json"), ("local", "binary"), ("lua", "json"), ("lua", "binary")])
+def test_sharded_detector_matches_single_node(redis_ports, make_detector, sensor_records, eval_mode, window_encoding):
+    single_port, *ports = redis_ports(4)
+    records = sensor_records(80, sensors=24)
+    options = dict(eval_mode=eval_mode, window_encoding=window_encoding)
+    expected = _alarm_types(make_detector([single_port], **options).evaluate_batch(records))
+
+    # Start on two nodes, add the third half-way and keep evaluating on the moved state
+    detector = make_detector(ports[:2], **options)
+    results = detector.evaluate_batch(records[:40])
+    assert detector.add_node(f"127.0.0.1:{ports[2]}/0") > 0
+    results += detector.evaluate_batch(records[40:])
+
+    assert _alarm_types(results) == expected
+    for node, sensor_names in detector._registered_by_node().items():
+        assert sensor_names
+        assert all(detector.ring.get_node(sensor_name) == node for sensor_name in sensor_names)
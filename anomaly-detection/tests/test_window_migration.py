@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+"""
+Binary windows take over sensors that still have a legacy JSON queue, without the startup
+migration: the sensors are classified exactly as if the JSON windows had been kept.
+"""
+
+
+def _alarm_types(results):
+    return [{name: result.alarm_type for name, result in record.items()} for record in results]
+
+
+@pytest.mark.parametrize("eval_mode", ["lua", "local"])
+@pytest.mark.parametrize("use_async", [False, True])
+def test_binary_windows_fall_back_to_legacy_queues(redis_ports, make_detector, sensor_records, eval_mode, use_async):
+    baseline_port, port = redis_ports(2)
+    records = sensor_records(60)
+    baseline = make_detector([baseline_port], eval_mode=eval_mode)
+    expected = _alarm_types(baseline.evaluate_batch(records))
+
+    make_detector([port], eval_mode=eval_mode).evaluate_batch(records[:30])
+    detector = make_detector([port], eval_mode=eval_mode, window_encoding="binary")
+    if use_async:
+        results = asyncio.run(detector.aevaluate_batch(records[30:]))
+    else:
+        results = detector.evaluate_batch(records[30:])
+
+    assert _alarm_types(results) == expected[30:]
+    client = detector.shards[f"127.0.0.1:{port}/0"].client
+    assert list(client.scan_iter(match="*:queue")) == []